@@ -10,10 +10,29 @@ import requests
 from requests.auth import HTTPBasicAuth
 import base64
 import json
+from urllib.parse import quote
 
 import warnings
 warnings.filterwarnings("ignore")
 
+#Valores por página al leer recorded data
+MAX_COUNT = 10000
+
+PIWEBAPI = "https://swplpglpapl15/piwebapi/"
+DATA_ARCHIVE = "\\\\PIRLP\\"
+
+#WebIds por consulta de streamsets (limita el largo de la URL)
+WEBIDS_POR_REQUEST = 50
+
+#Sesión compartida por todas las lecturas y escrituras (reutiliza la conexión)
+#Las credenciales se leen del entorno: PI_WEB_API_USER y PI_WEB_API_PASSWORD
+session = requests.Session()
+session.auth = HTTPBasicAuth(os.environ["PI_WEB_API_USER"], os.environ["PI_WEB_API_PASSWORD"])
+session.verify = False
+
+#WebIds de los tags ya consultados: no cambian entre ciclos
+webids = {}
+
 
 
 def call_headers(include_content_type):
@@ -37,15 +56,12 @@ def call_headers(include_content_type):
 
 def read_PI(tag, start_date, end_date, mode):
  
-    security_auth = HTTPBasicAuth("YS01480","2gY7akMz")
-    x = "https://swplpglpapl15/piwebapi/attributes?path=" #PIWEBAPI
-    y = "\\\\PIRLP\\" #DataArchive
+    x = PIWEBAPI+"attributes?path=" #PIWEBAPI
+    y = DATA_ARCHIVE #DataArchive
     z = tag #Tag
 
-    df_out = pd.DataFrame()
-
     getWebId= x+y+z 
-    response = requests.get(getWebId, auth=security_auth, verify=False)
+    response = session.get(getWebId)
     convertido_json = response.json()
 
     if response.status_code == 200:
@@ -58,38 +74,29 @@ def read_PI(tag, start_date, end_date, mode):
             
     else:
         print(response.status_code)
-    concat = '?startTime='+start_date+'&endTime='+end_date #depende de fechas literales o relativas
-    
-    #Incluir fechas si estamos pidiendo recorded data; caso contrario no considerar el tiempo
-    if mode == 'recorded_data':
-        salida = RecordedData+concat
-    elif mode == 'current_value':
-        salida = RecordedData
 
-    response = requests.get(salida, auth=security_auth,verify=False, timeout=(120, 120))
-    data_json = response.json()
-    cantElem= str(data_json.items()).count('Value')
-    
     if mode == 'recorded_data':
-        df_aux = pd.DataFrame(data_json['Items'])
-        df_aux = df_aux[['Timestamp','Value']]
-        df_out = pd.concat([df_out,df_aux],ignore_index=True)
-
-        while cantElem > 999:
-            start_date = df_aux['Timestamp'].iat[-1] #Ultimo TimeStamp
-            concat= '?startTime='+start_date+'&endTime='+end_date #depende de fechas literales o relativas
-            salida = RecordedData+concat
-            response = requests.get(salida, auth=security_auth,verify=False, timeout=(120, 120))
-            data_json = response.json()
-            cantElem= str(data_json.items()).count('Value')
-            df_aux = pd.DataFrame(data_json['Items'])
-            df_aux = df_aux[['Timestamp','Value']]
-            df_out = pd.concat([df_out,df_aux],ignore_index=True)
-            
+        #Se lee por páginas de MAX_COUNT valores: cada página empieza en el último timestamp de la anterior
+        #(inicio inclusivo), así que se descartan los valores de ese timestamp ya leídos
         df_out1 = []
-        for s in df_out['Value']:
-            if type(s) == float:
-                df_out1.append(s)
+        ultimo, repetidos = None, 0
+        while True:
+            concat = '?startTime='+start_date+'&endTime='+end_date+'&maxCount='+str(MAX_COUNT) #depende de fechas literales o relativas
+            response = session.get(RecordedData+concat, timeout=(120, 120))
+            items = response.json()['Items']
+
+            salto = 0
+            while salto < min(repetidos, len(items)) and items[salto]['Timestamp'] == ultimo:
+                salto += 1
+            nuevos = items[salto:]
+            df_out1.extend(item['Value'] for item in nuevos if type(item['Value']) == float)
+
+            if len(items) < MAX_COUNT or not nuevos:
+                break
+            ts = nuevos[-1]['Timestamp'] #Ultimo TimeStamp
+            iguales = next((i for i, item in enumerate(reversed(nuevos)) if item['Timestamp'] != ts), len(nuevos))
+            repetidos = iguales + (repetidos if ts == ultimo else 0)
+            ultimo = start_date = ts
 
         if len(df_out1) > 0:
             val = np.mean(df_out1)
@@ -97,6 +104,8 @@ def read_PI(tag, start_date, end_date, mode):
             val = 1
             
     elif mode == 'current_value':
+        response = session.get(RecordedData, timeout=(120, 120))
+        data_json = response.json()
         if type(data_json['Value']) == float:       
             val = data_json['Value'] #ya tiene el current value
             
@@ -112,19 +121,127 @@ def read_PI(tag, start_date, end_date, mode):
     return val
 
 
+def batch_PI(consultas):
+    """ Ejecuta varias llamadas en un solo request al endpoint batch
+        @consultas dict: id -> {'Method': ..., 'Resource': ...}
+        Devuelve id -> {'Status': ..., 'Content': ...}
+    """
+    response = session.post(PIWEBAPI+'batch', json=consultas, headers=call_headers(True), timeout=(120, 120))
+    response.raise_for_status()
+
+    return response.json()
+
+
+def get_webids(tags):
+    """ WebIds de los tags (None si no existe). Los que no están en el cache
+        se buscan todos juntos en un solo batch
+    """
+    faltantes = [tag for tag in dict.fromkeys(tags) if tag not in webids]
+    if len(faltantes) > 0:
+        consultas = {}
+        for i, tag in enumerate(faltantes):
+            consultas[str(i)] = {'Method': 'GET', 'Resource': PIWEBAPI+'attributes?selectedFields=WebId&path='+quote(DATA_ARCHIVE+tag, safe='')}
+        resultado = batch_PI(consultas)
+        for i, tag in enumerate(faltantes):
+            if resultado[str(i)]['Status'] == 200:
+                webids[tag] = resultado[str(i)]['Content']['WebId']
+            else:
+                print(tag, resultado[str(i)]['Status'], resultado[str(i)].get('Content'))
+                if resultado[str(i)]['Status'] == 404:
+                    webids[tag] = None #No existe: no se vuelve a buscar
+
+    return [webids.get(tag) for tag in tags]
+
+
+def valor_default(tag):
+    #Mismo valor que read_PI cuando no hay ningún valor numérico
+    if tag[-3:] == 'Err':
+        return 1e+12
+    return 1
+
+
+def read_PI_batch(lecturas):
+    """ Lee varios grupos de tags en un solo request al endpoint batch, con streamsets
+        (recorded o value) de hasta WEBIDS_POR_REQUEST tags por consulta
+        @lecturas list: (tags, start_date, end_date, mode) por grupo, con mode como en read_PI
+        Devuelve un array de valores por grupo, en el orden de los tags (mismo criterio que read_PI)
+    """
+    consultas = {}
+    partes = []
+    ids = [get_webids(tags) for tags, _, _, _ in lecturas]
+    for g, (tags, start_date, end_date, mode) in enumerate(lecturas):
+        validos = [(tag, webid) for tag, webid in zip(tags, ids[g]) if webid is not None]
+        for p in range(0, len(validos), WEBIDS_POR_REQUEST):
+            parte = validos[p:p+WEBIDS_POR_REQUEST]
+            query = '&'.join('webId='+webid for _, webid in parte)
+            if mode == 'recorded_data':
+                resource = PIWEBAPI+'streamsets/recorded?'+query+'&startTime='+quote(start_date)+'&endTime='+quote(end_date)+'&maxCount='+str(MAX_COUNT)+'&selectedFields=Items.WebId;Items.Items.Value'
+            elif mode == 'current_value':
+                resource = PIWEBAPI+'streamsets/value?'+query+'&selectedFields=Items.WebId;Items.Value.Value'
+            consultas[str(g)+'-'+str(p)] = {'Method': 'GET', 'Resource': resource}
+            partes.append((str(g)+'-'+str(p), g, parte))
+
+    resultado = batch_PI(consultas) if len(consultas) > 0 else {}
+
+    #Items de cada WebId por grupo
+    items = [{} for _ in lecturas]
+    for clave, g, parte in partes:
+        if resultado[clave]['Status'] in (200, 207):
+            for item in resultado[clave]['Content']['Items']:
+                items[g][item['WebId']] = item
+        else:
+            print([tag for tag, _ in parte], resultado[clave]['Status'], resultado[clave].get('Content'))
+
+    valores = []
+    for g, (tags, start_date, end_date, mode) in enumerate(lecturas):
+        val = np.zeros(len(tags))
+        for i, (tag, webid) in enumerate(zip(tags, ids[g])):
+            item = items[g].get(webid)
+            if item is None:
+                val[i] = valor_default(tag) if mode == 'current_value' else 1
+            elif mode == 'recorded_data':
+                if len(item.get('Items', [])) >= MAX_COUNT:
+                    #Página completa: el tag se lee solo, por páginas
+                    val[i] = read_PI(tag, start_date, end_date, mode)
+                else:
+                    df_out1 = [v['Value'] for v in item.get('Items', []) if type(v['Value']) == float]
+                    val[i] = np.mean(df_out1) if len(df_out1) > 0 else 1
+            elif mode == 'current_value':
+                v = item.get('Value', {}).get('Value')
+                val[i] = v if type(v) == float else valor_default(tag)
+        valores.append(val)
+
+    return valores
+
+
+def write_PI_batch(tags, vals):
+    """ Escribe un valor por tag en un solo request (streamsets/value)
+    """
+    body = []
+    for tag, webid, val in zip(tags, get_webids(tags), vals):
+        if webid is not None:
+            body.append({'WebId': webid, 'Value': {'Value': val.item() if hasattr(val, 'item') else val}})
+
+    response = session.post(PIWEBAPI+'streamsets/value', json=body, headers=call_headers(True), timeout=(120, 120))
+
+    if response.status_code == 202:
+        print('Valores escritos: ' + str(len(body)))
+    else:
+        print(response.status_code, response.reason, response.text)
+
+    return response.status_code
+
+
 def write_PI(tag, val):
     
-    x = "https://swplpglpapl15/piwebapi/attributes?path=" #PIWEBAPI
-    y = "\\\\PIRLP\\" #DataArchive
+    x = PIWEBAPI+"attributes?path=" #PIWEBAPI
+    y = DATA_ARCHIVE #DataArchive
     z = tag #Tag
    
     getWebId= x+y+z 
-    
-    #  create security method - basic or kerberos
-    security_method = HTTPBasicAuth("YS01480","2gY7akMz")
 
-    #  Get the sample tag
-    response = requests.get(getWebId, auth=security_method, verify=False) #verify=False
+    #  Get the sample tag (la sesión del módulo ya tiene las credenciales)
+    response = session.get(getWebId)
 
     #  Only continue if the first request was successful
     if response.status_code == 200:
@@ -141,8 +258,7 @@ def write_PI(tag, val):
         header = call_headers(True)
 
         #  Write the single value to the tag
-        response = requests.post(data['Links']['Value'], auth=security_method,
-                                 verify=False, json=request_body, headers=header)
+        response = session.post(data['Links']['Value'], json=request_body, headers=header)
 
         if response.status_code == 202:
             print('Attribute SampleTag write value ' + str(data_value))
@@ -176,53 +292,40 @@ dens_TC = df1.values[3,:]
 dens_TC = dens_TC.astype(np.float64)
 dens_TC = dens_TC.reshape(1,dens_TC.shape[0])
 
+#Tags con valor fijo (inferencias): no se leen de PI
+i_xm = [i for i, tag in enumerate(tags_TC) if tag not in ['Inferencia', 'Finf_GOL', 'Tinf_crudo2', 'Tinf_crudo1', 'Tinf_crudo4', 'Tinf_CR', 'Tinf_crudo3']]
+i_err = [i for i, tag in enumerate(tags_desvTC) if tag not in ['Inferencia_Err', 'TC-GOLDA803_Err', 'TC-CRUDOEA803_Err', 'TC-CRUDOEA825_Err', 'TC-CRUDOEA805_Err', 'TC-CRUDOEA801_Err', 'TC-CRUDOEA802_Err']]
+
+#Densidades de laboratorio: corrientes que se analizan esporádicamente (current value) y resto (promedio últimos 30 días)
+i_dlab_cv = [0, 3, 4, 5, 6]
+i_dlab_30d = [i for i in range(tags_dlabTC.shape[0]) if i not in i_dlab_cv]
+
+#Cargar TAGs para valores reconciliados. Ídem sigmas.
+tags_recTC = list(df1.values[0,:])
+tags_sigmaTC = list(df1.values[1,:])
+# MG reemplazo alias PIRLP por nombre del server
+
+#WebIds de todos los tags (lectura y escritura) en un solo batch; quedan en cache para los ciclos siguientes
+get_webids([str(tag) for tag in tags_TC + list(tags_desvTC) + list(tags_dlabTC) + tags_recTC + tags_sigmaTC + ['TC-RECDATOS_FO']])
+
 
 # Usando piwebapi
 t = 1
 while t < 10:
 
     #Inicializar vectores para datos de PI
-    xm_TC = np.zeros(len(tags_TC))
-    err_TC = np.zeros(len(tags_TC))
+    xm_TC = np.ones(len(tags_TC))
+    err_TC = np.full(len(tags_TC), 1e+12)
     dens_labTC = np.zeros(tags_dlabTC.shape[0])
 
 
-    #Leer datos medidos y almacenar en xm_TC
-    i = 0
-    for tag in tags_TC:
-
-        if tag == 'Inferencia' or tag == 'Finf_GOL' or tag == 'Tinf_crudo2' or tag == 'Tinf_crudo1' or tag == 'Tinf_crudo4' or tag == 'Tinf_CR' or tag == 'Tinf_crudo3':
-            xm_TC[i] = 1
-        else:
-            xm_TC[i] = read_PI(str(tag), '*-1h', '*', 'recorded_data')
-
-        i = i + 1
-
-
-    #Leer errores instrumentales
-    i = 0
-    for tag in list(tags_desvTC):
-
-        if tag == 'Inferencia_Err' or tag == 'TC-GOLDA803_Err' or tag == 'TC-CRUDOEA803_Err' or tag == 'TC-CRUDOEA825_Err' or tag == 'TC-CRUDOEA805_Err' or tag == 'TC-CRUDOEA801_Err' or tag == 'TC-CRUDOEA802_Err':
-            err_TC[i] = 1e+12
-        else:
-            err_TC[i] = read_PI(str(tag), '*-1h', '*', 'current_value')
-
-        i = i + 1
-
-
-
-    #Leer densidades de laboratorio
-    i = 0
-    for tag in list(tags_dlabTC):
-
-        if i != 0 and i != 3 and i != 4 and i != 5 and i != 6:
-            dens_labTC[i] = read_PI(str(tag), '*-30d', '*', 'recorded_data')#Promedio últimos 30 días
-
-        else: #Corrientes que se analizan esporádicamente
-            dens_labTC[i] = read_PI(str(tag), '*-1h', '*', 'current_value')#Current Value
-
-        i = i + 1
+    #Leer datos medidos, errores instrumentales y densidades de laboratorio en un solo batch
+    xm_TC[i_xm], err_TC[i_err], dens_labTC[i_dlab_30d], dens_labTC[i_dlab_cv] = read_PI_batch([
+        ([str(tags_TC[i]) for i in i_xm], '*-1h', '*', 'recorded_data'),
+        ([str(tags_desvTC[i]) for i in i_err], '*-1h', '*', 'current_value'),
+        ([str(tags_dlabTC[i]) for i in i_dlab_30d], '*-30d', '*', 'recorded_data'),
+        ([str(tags_dlabTC[i]) for i in i_dlab_cv], '*-1h', '*', 'current_value'),
+    ])
 
 
 
@@ -448,28 +551,6 @@ while t < 10:
 #sigma_TC = sigma_TC.tolist()
 #FO_TC = FO_TC.tolist()
 
-#Cargar TAGs para valores reconciliados. Ídem sigmas.
-tags_recTC = list(df1.values[0,:])
-tags_sigmaTC = list(df1.values[1,:])
-# MG reemplazo alias PIRLP por nombre del server
-
-
-
-#Escribir datos reconciliados en PI
-i = 0
-for tag in tags_recTC:
-    print(tag)
-    write_PI(str(tag), recdata_TC[0][i])
-    i = i + 1
-    
-    
-#Escribir valores de sigma en PI
-i = 0
-for tag in tags_sigmaTC:
-    print(tag)
-    write_PI(str(tag), sigma_TC[0][i])
-    i = i + 1
-    
-    
-#Escribir función objetivo en PI
-write_PI('TC-RECDATOS_FO', FO_TC[0])
\ No newline at end of file
+#Escribir datos reconciliados, valores de sigma y función objetivo en PI, en un solo request
+write_PI_batch([str(tag) for tag in tags_recTC + tags_sigmaTC] + ['TC-RECDATOS_FO'],
+               list(recdata_TC[0][:len(tags_recTC)]) + list(sigma_TC[0][:len(tags_sigmaTC)]) + [FO_TC[0]])
\ No newline at end of file
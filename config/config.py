@@ -1,6 +1,8 @@
 import logging
 import logging.config
+import os
 import sys
+from contextvars import ContextVar
 from pathlib import Path
 
 from rich.logging import RichHandler
@@ -20,6 +22,9 @@ FLAG_FILE = BASE_DIR.joinpath("fflag.txt")
 # Stores
 MODEL_REGISTRY = Path(STORES_DIR, "model")
 BLOB_STORE = Path(STORES_DIR, "blob")
+BLOB_MANIFEST = Path(STORES_DIR, "blob_manifest.json")
+LAS_CACHE_DIR = Path(STORES_DIR, "las")
+JOBS_DB = Path(STORES_DIR, "jobs.db")
 
 # Crear directorios
 DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -32,14 +37,28 @@ LOGS_DIR.mkdir(parents=True, exist_ok=True)
 BLOB_STORE.mkdir(parents=True, exist_ok=True)
 
 # Logger
+# Id del trabajo en ejecución (src/jobs.py), "-" fuera de un trabajo. Se agrega a cada
+# registro del log para poder filtrarlo (ver src/log_tail.py)
+TRABAJO_ACTUAL: ContextVar[str] = ContextVar("trabajo", default="-")
+
+
+class FiltroTrabajo(logging.Filter):
+    """Agrega a cada registro el id del trabajo en ejecución (atributo trabajo)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trabajo = TRABAJO_ACTUAL.get()
+        return True
+
+
 logging_config = {
     "version": 1,
     "disable_existing_loggers": False,
+    "filters": {"trabajo": {"()": FiltroTrabajo}},
     "formatters": {
         "minimal": {"format": "%(message)s"},
         "detailed": {
             "format": "%(levelname)s %(asctime)s [%(name)s:%(filename)s:%(funcName)s"
-            ":%(lineno)d]\n%(message)s\n"
+            ":%(lineno)d] [trabajo=%(trabajo)s]\n%(message)s\n"
         },
     },
     "handlers": {
@@ -55,6 +74,7 @@ logging_config = {
             "maxBytes": 10485760,  # 1 MB
             "backupCount": 10,
             "formatter": "detailed",
+            "filters": ["trabajo"],
             "level": logging.INFO,
         },
         "error": {
@@ -63,6 +83,7 @@ logging_config = {
             "maxBytes": 10485760,  # 1 MB
             "backupCount": 10,
             "formatter": "detailed",
+            "filters": ["trabajo"],
             "level": logging.ERROR,
         },
     },
@@ -81,6 +102,18 @@ STORAGE_ACCOUNT_NAME = "teczdstacoe004"
 CONTAINER_NAME = "mineralogia"
 STORAGE_ACCOUNT_KEY = "DefaultEndpointsProtocol=https;AccountName=teczdstacoe004;AccountKey=5Gujy0/2hOx4v3AaBpk8N9J1vUah6IAhr/bSH7LEq/JbhDQHGEfMvilnC/dXw3DmilnCSGrd1YKEa2NbQBUMdA==;EndpointSuffix=core.windows.net"
 
+# Transferencias con el Blob Storage
+# "azure" o "local" (carpeta config.BLOB_STORE como container, para pruebas sin conexión)
+BLOB_BACKEND = os.environ.get("BLOB_BACKEND", "azure")
+# Descarga incremental de input usando el manifiesto config.BLOB_MANIFEST
+SYNC_INCREMENTAL = os.environ.get("SYNC_INCREMENTAL", "0") == "1"
+# Tamaño de bloque de las descargas/subidas: acota la memoria usada por transferencia
+BLOB_CHUNK_SIZE = int(os.environ.get("BLOB_CHUNK_SIZE", str(4 * 1024 * 1024)))
+# Conexiones en paralelo para transferir los bloques de un mismo blob
+BLOB_MAX_CONCURRENCY = int(os.environ.get("BLOB_MAX_CONCURRENCY", "2"))
+# Blobs que se transfieren en paralelo
+BLOB_TRANSFER_WORKERS = int(os.environ.get("BLOB_TRANSFER_WORKERS", "8"))
+
 # Configuración del modelo
 OBJETIVO = "TOC"
 MODELO = "model_toc_gpr_densidad.joblib"
@@ -88,3 +121,63 @@ IC_CLASS = "ic_class_intervalo_confianza.pkl"
 # Este es el orden en que debe recibir las variables el modelo
 MODEL_TOC_GPR_DENSIDAD = ["DEPTH", "RHOZ"]
 MODEL_TOC_CUERVO = ["DEPTH", "RHOZ", "AT90", "DTCO"]
+
+# Registro de modelos de mineralogía (model_with_IC.ModelwithMaronnaIC)
+MODELOS_MINERALES = {
+    "ANKERITE": Path(MODELS_DIR, "ANKERITE_with_IC.joblib"),
+    "DOLOMITE": Path(MODELS_DIR, "DOLOMITE_with_IC.joblib"),
+    "KEROGEN": Path(MODELS_DIR, "KEROGEN_with_IC.joblib"),
+}
+# Este es el orden en que debe recibir las variables cada modelo
+MODEL_FEATURES = {
+    "ANKERITE": ["RHOZ", "AT90", "DTCO", "NPHI"],
+    "DOLOMITE": ["NPHI", "RHOZ", "DTCO"],
+    "KEROGEN": ["AT90", "NPHI", "DTCO", "RHOZ"],
+}
+# Minerales a predecir separados por coma (vacío = ninguno). Solo se cargan los modelos
+# cuyas features están en el perfil
+MINERALES = [m for m in os.environ.get("MINERALES", ",".join(MODELOS_MINERALES)).split(",") if m]
+
+# Curvas que se leen del perfil .las (el resto no se convierte)
+LAS_COLUMNAS = list(
+    dict.fromkeys(
+        MODEL_TOC_GPR_DENSIDAD
+        + MODEL_TOC_CUERVO
+        + [f for mineral in MINERALES for f in MODEL_FEATURES.get(mineral, [])]
+    )
+)
+# Caché de perfiles ya leídos (por hash del contenido) en LAS_CACHE_DIR
+LAS_CACHE = os.environ.get("LAS_CACHE", "1") == "1"
+LAS_CACHE_MAX_BYTES = int(os.environ.get("LAS_CACHE_MAX_BYTES", str(2 * 1024**3)))
+
+# Ejecución por lotes
+# Cantidad de procesos para predecir archivos en paralelo (1 = secuencial)
+N_WORKERS = int(os.environ.get("N_WORKERS", "1"))
+# Máximo de procesos que puede pedir un trabajo (opción workers de /submit)
+N_WORKERS_MAX = int(os.environ.get("N_WORKERS_MAX", str(os.cpu_count() or 1)))
+# "lote": descarga todo y luego predice. "pipeline": descarga, predicción y subida concurrentes
+MODO_LOTE = os.environ.get("MODO_LOTE", "lote")
+# Archivos que pueden esperar entre etapas del pipeline
+TAMANO_COLA_PIPELINE = int(os.environ.get("TAMANO_COLA_PIPELINE", "4"))
+
+# Predicción por bloques: filas por llamada a model.predict (0 = todo el perfil de una vez)
+PREDICT_CHUNK_SIZE = int(os.environ.get("PREDICT_CHUNK_SIZE", "50000"))
+# Hilos que predicen bloques en paralelo (se multiplica por N_WORKERS)
+PREDICT_N_JOBS = int(os.environ.get("PREDICT_N_JOBS", "1"))
+
+# Formatos de las tablas de salida separados por coma: parquet, csv, xlsx (xlsx solo a pedido)
+FORMATOS_SALIDA = os.environ.get("FORMATOS_SALIDA", "csv")
+
+# Trabajos (src/jobs.py)
+# Segundos que un trabajo queda asignado a un proceso sin heartbeat antes de reasignarse
+JOBS_LEASE_S = int(os.environ.get("JOBS_LEASE_S", "60"))
+# Veces que se reintenta un trabajo cuyo proceso dejó de dar señales
+JOBS_MAX_INTENTOS = int(os.environ.get("JOBS_MAX_INTENTOS", "3"))
+# Lotes que se ejecutan a la vez. Solo se admite 1: los lotes comparten las carpetas
+# input/output, el listado de blobs de input (clean_data borra todos los listados) y
+# las opciones que cada trabajo aplica sobre este módulo
+JOBS_CONCURRENTES = int(os.environ.get("JOBS_CONCURRENTES", "1"))
+if JOBS_CONCURRENTES != 1:
+    raise ValueError(
+        f"JOBS_CONCURRENTES={JOBS_CONCURRENTES} no soportado: los lotes se ejecutan de a uno"
+    )
@@ -1,18 +1,76 @@
 """Módulo de funciones para interactuar con PI"""
 import base64
-import json
 import logging as log
 import traceback
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 import datetime
 
+import numpy as np
 import pandas as pd
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
 
 cfgs: Dict[str, str] = {}
 
+PROXIES = {
+    "http": "http://proxy-ypf.grupo.ypf.com",
+    "https": "http://proxy-ypf.grupo.ypf.com",
+}
+
+# WebIds por request a los endpoints streamsets (acota el largo de la URL)
+WEBIDS_POR_REQUEST = 50
+
+# Códigos HTTP transitorios que se reintentan con backoff exponencial
+STATUS_REINTENTO = (429, 500, 502, 503, 504)
+
+# Valores por página de recorded (máximo por defecto de la PI Web API)
+MAX_COUNT = 10000
+
+
+def items_a_arrays(items: Sequence[Dict], estados: bool = False) -> Tuple[np.ndarray, ...]:
+    """
+    Convierte los Items de una respuesta recorded en arrays
+
+    Args:
+        items (Sequence[Dict]): valores con Timestamp y Value
+        estados (bool, optional): devuelve también el estado de los valores no numéricos.
+            Valor default es False.
+
+    Returns:
+        Tuple[np.ndarray, ...]: timestamps (datetime64[ns] en UTC, sin zona) y
+            valores (float64; los no numéricos, ej.: estados digitales, como NaN). Con
+            estados, además Value.Name (str, "" en los numéricos), Value.Value (float64,
+            NaN en los numéricos) y Value.IsSystem (bool) de cada valor
+    """
+    timestamps = (
+        pd.to_datetime([item["Timestamp"] for item in items], utc=True)
+        .tz_convert(None)
+        .to_numpy()
+    )
+    valores = np.array(
+        [
+            item["Value"]
+            if isinstance(item["Value"], (int, float)) and not isinstance(item["Value"], bool)
+            else np.nan
+            for item in items
+        ],
+        dtype=np.float64,
+    )
+    if not estados:
+        return timestamps, valores
+
+    # Los estados digitales y de sistema llegan como {"Name", "Value", "IsSystem"}
+    detalles = [item["Value"] if isinstance(item["Value"], dict) else {} for item in items]
+    nombres = np.array([str(d.get("Name", "")) for d in detalles], dtype=np.str_)
+    codigos = np.array([d.get("Value", np.nan) for d in detalles], dtype=np.float64)
+    sistema = np.array([bool(d.get("IsSystem", False)) for d in detalles], dtype=np.bool_)
+
+    return timestamps, valores, nombres, codigos, sistema
+
 
 class PiWebapi:
     """
@@ -27,16 +85,65 @@ class PiWebapi:
         verify_ssl: bool,
         webapi_user: str,
         webapi_password: str,
+        proxies: Optional[Dict[str, str]] = PROXIES,
+        max_conexiones: int = 8,
+        reintentos: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 60,
     ):
+        """
+        Args:
+            proxies (Optional[Dict[str, str]], optional): proxies de las requests (None
+                para conectarse directo, ej.: a un servidor PI local de prueba).
+                Valor default es PROXIES.
+            max_conexiones (int, optional): conexiones keep-alive del pool, y requests
+                simultáneas de los métodos *_multiple. Valor default es 8.
+            reintentos (int, optional): reintentos ante errores de conexión o STATUS_REINTENTO.
+                Valor default es 3.
+            backoff (float, optional): factor del backoff exponencial entre reintentos (s).
+                Valor default es 0.5.
+            timeout (float, optional): timeout de cada request (s). Valor default es 60.
+        """
         self._webapi_url = webapi_url
         self._path = path
         self._webapi_security_method = webapi_security_method
         self._verify_ssl = verify_ssl
         self._webapi_user = webapi_user
         self._webapi_password = webapi_password
+        self.max_conexiones = max_conexiones
+        self.timeout = timeout
+
+        # Sesión compartida: reutiliza las conexiones (TCP + TLS a través del proxy)
+        # entre requests en lugar de abrir una por llamada
+        retry = Retry(
+            total=reintentos,
+            backoff_factor=backoff,
+            status_forcelist=STATUS_REINTENTO,
+            allowed_methods=frozenset(["GET", "POST"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=max_conexiones, pool_maxsize=max_conexiones, max_retries=retry
+        )
+        self._session = requests.Session()
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        self._session.proxies = dict(proxies or {})
+        self._session.verify = verify_ssl
 
         urllib3.disable_warnings()
 
+    def close(self):
+        """Cierra las conexiones del pool"""
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     @property
     def web_api_url(self) -> str:
         """
@@ -84,6 +191,7 @@ class PiWebapi:
     @verify_ssl.setter
     def verify_ssl(self, value):
         self._verify_ssl = value
+        self._session.verify = value
 
     @property
     def webapi_user(self) -> str:
@@ -163,6 +271,97 @@ class PiWebapi:
 
         return webid
 
+    def _get(self, nombre: str, request_url: str, security_auth, params=None) -> list:
+        """
+        GET con la sesión compartida
+
+        Args:
+            nombre (str): nombre del método que llama (para el log)
+            request_url (str): URL
+            security_auth: Referencia securityAuth
+            params (optional): parámetros de la query. Valor default es None.
+
+        Returns:
+            list: [status, data] con data el JSON de la respuesta ("" si hubo error)
+        """
+        p_logger = log.getLogger(cfgs["logger_name"])
+
+        data = ""
+        status = 0
+
+        try:
+            p_logger.debug("request_url: %s", request_url)
+            respuesta = self._session.get(
+                request_url, params=params, auth=security_auth, timeout=self.timeout
+            )
+            status = respuesta.status_code
+
+            # 207: streamsets con errores en algunos streams (se informan por stream)
+            if status in (200, 207):
+                data = respuesta.json()
+            else:
+                p_logger.error(
+                    "[%s] Se produjo un error al tratar de obtener los datos de PI. "
+                    "Error: %s",
+                    nombre,
+                    respuesta,
+                )
+
+        except (requests.RequestException, ValueError) as e:
+            p_logger.error(
+                "[%s] Se produjo un error al tratar de obtener los datos de PI: %s.",
+                nombre,
+                str(e),
+            )
+            p_logger.error("Error: %s", traceback.format_exc())
+
+        return [status, data]
+
+    def _get_streamsets(
+        self, nombre: str, endpoint: str, security_auth, webids: Sequence[str], params: Dict
+    ) -> Dict[str, list]:
+        """
+        Lee muchos streams con los endpoints streamsets: WEBIDS_POR_REQUEST WebIds por
+        request y hasta max_conexiones requests simultáneas
+
+        Args:
+            nombre (str): nombre del método que llama (para el log)
+            endpoint (str): "recorded" o "summary"
+            security_auth: Referencia securityAuth
+            webids (Sequence[str]): WebIds a leer
+            params (Dict): parámetros de la query (sin webId)
+
+        Returns:
+            Dict[str, list]: WebId -> [status, {"Items": valores}], el mismo formato que
+                devuelven los métodos de un stream
+        """
+        p_logger = log.getLogger(cfgs["logger_name"])
+        request_url = f"{self.web_api_url}/streamsets/{endpoint}"
+        lotes = [
+            list(webids[i : i + WEBIDS_POR_REQUEST])
+            for i in range(0, len(webids), WEBIDS_POR_REQUEST)
+        ]
+
+        def leer_lote(lote: List[str]) -> list:
+            return self._get(nombre, request_url, security_auth, {**params, "webId": lote})
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_conexiones)) as executor:
+            respuestas = list(executor.map(leer_lote, lotes))
+
+        resultado = {}
+        for lote, (status, data) in zip(lotes, respuestas):
+            streams = {item.get("WebId"): item for item in (data or {}).get("Items", [])}
+            for webid in lote:
+                stream = streams.get(webid)
+                if stream is None:
+                    resultado[webid] = [status if not data else 404, ""]
+                    continue
+                if stream.get("Errors"):
+                    p_logger.error("[%s] WebId %s: %s", nombre, webid, stream["Errors"])
+                resultado[webid] = [status, {"Items": stream.get("Items", [])}]
+
+        return resultado
+
     def check_url(self, url: str) -> str:
         """
         Función para verificar si tenemos llegado a una determinada URL
@@ -217,7 +416,8 @@ class PiWebapi:
         verifySSL bool: Si se realizará la verificación del certificado
 
         Ejemplo:
-        https://swpnqntaspi23.grupo.ypf.com/piwebapi/streams/I1DPaYSBql4duEeKhGnk4sJJsw044AAA/summary?
+        https://swpnqntaspi23.grupo.ypf.com/piwebapi/streams/
+            I1DPaYSBql4duEeKhGnk4sJJsw044AAA/summary?
             summaryType=Average&startTime=%222020-12-17%2012:49:00.000%22&
             endTime=%222020-12-17%2015:40:00.000%22&summaryDuration=5m&
             selectedfields=items.value.timestamp;items.value.value
@@ -226,56 +426,58 @@ class PiWebapi:
         p_logger = log.getLogger(cfgs["logger_name"])
         p_logger.debug("[getSummaryData] Inicia")
 
-        data = ""
-        status = 0
-
-        proxies = {
-            "http": "http://proxy-ypf.grupo.ypf.com",
-            "https": "http://proxy-ypf.grupo.ypf.com",
-        }
-
-        try:
-            #  armo la URL y obtengo los datos del Stream para los parámetros especificados
-            request_url = (
-                f"{self.web_api_url}/streams/{webid}/summary?summaryType={summary_type}&"
-                f"startTime=%22{start_time}%22&endTime=%22{end_time}%22&summaryDuration={duration}&"
-                "selectedfields=items.value.timestamp;items.value.value"
-            )
+        #  armo la URL y obtengo los datos del Stream para los parámetros especificados
+        request_url = (
+            f"{self.web_api_url}/streams/{webid}/summary?summaryType={summary_type}&"
+            f"startTime=%22{start_time}%22&endTime=%22{end_time}%22&summaryDuration={duration}&"
+            "selectedfields=items.value.timestamp;items.value.value"
+        )
 
-            p_logger.debug("request_url: %s", request_url)
+        # Leer el conjunto de valores
+        resultado = self._get("getSummaryData", request_url, security_auth)
 
-            # respuesta = self.check_url(request_url)
-            # p_logger.info(respuesta)
+        p_logger.debug("[getSummaryData] Finaliza")
 
-            # Leer el conjunto de valores
-            respuesta = requests.get(
-                request_url,
-                auth=security_auth,
-                verify=self.verify_ssl,
-                timeout=60,
-                proxies=proxies,
-            )
-            status = respuesta.status_code
+        return resultado
 
-            if status == 200:
-                data = json.loads(respuesta.text)
-            else:
-                p_logger.error(
-                    "Se produjo un error al tratar de obtener los datos de PI. "
-                    "Error: %s",
-                    respuesta,
-                )
-
-            p_logger.debug("[getSummaryData] Finaliza")
-
-        except requests.RequestException as e:
-            p_logger.error(
-                "Se produjo un error al tratar de obtener los datos de PI: %s.", str(e)
-            )
-            p_logger.error("Error: %s", traceback.format_exc())
-
-        return [status, data]
+    def get_summary_data_multiple(
+        self,
+        security_auth,
+        webids: Sequence[str],
+        start_time="-1d",
+        end_time="*",
+        summary_type="Average",
+        duration="5m",
+    ) -> Dict[str, list]:
+        """Como get_summary_data para muchos WebIds, con el endpoint streamsets/summary
+        (WEBIDS_POR_REQUEST WebIds por request, hasta max_conexiones requests a la vez)
+        @param webids list: IDs de los Streams
+        Devuelve un diccionario WebId -> [status, data] con data en el formato de
+        get_summary_data
+        """
 
+        p_logger = log.getLogger(cfgs["logger_name"])
+        p_logger.debug("[get_summary_data_multiple] Inicia: %s streams", len(webids))
+
+        resultado = self._get_streamsets(
+            "get_summary_data_multiple",
+            "summary",
+            security_auth,
+            webids,
+            {
+                "summaryType": summary_type,
+                "startTime": start_time,
+                "endTime": end_time,
+                "summaryDuration": duration,
+                "selectedFields": (
+                    "Items.WebId;Items.Items.Value.Timestamp;Items.Items.Value.Value"
+                ),
+            },
+        )
+
+        p_logger.debug("[get_summary_data_multiple] Finaliza")
+
+        return resultado
 
     def get_recorded_data(
         self,
@@ -295,7 +497,8 @@ class PiWebapi:
         verifySSL bool: Si se realizará la verificación del certificado
 
         Ejemplo:
-        https://swpnqntaspi23.grupo.ypf.com/piwebapi/streams/I1DPaYSBql4duEeKhGnk4sJJsw044AAA/summary?
+        https://swpnqntaspi23.grupo.ypf.com/piwebapi/streams/
+            I1DPaYSBql4duEeKhGnk4sJJsw044AAA/summary?
             summaryType=Average&startTime=%222020-12-17%2012:49:00.000%22&
             endTime=%222020-12-17%2015:40:00.000%22&summaryDuration=5m&
             selectedfields=items.value.timestamp;items.value.value
@@ -304,51 +507,170 @@ class PiWebapi:
         p_logger = log.getLogger(cfgs["logger_name"])
         p_logger.debug("[get_recorded_data] Inicia")
 
-        data = ""
-        status = 0
+        #  armo la URL y obtengo los datos del Stream para los parámetros especificados
+        request_url = (
+            f"{self.web_api_url}/streams/{webid}/recorded?startTime=%22{start_time}%22&"
+            f"endTime=%22{end_time}%22&maxCount=10000&selectedfields=items.timestamp;items.value"
+        )
+
+        # Leer el conjunto de valores
+        resultado = self._get("get_recorded_data", request_url, security_auth)
+        if resultado[1] and len(resultado[1].get("Items", [])) >= 10000:
+            p_logger.warning(
+                "[get_recorded_data] %s: la respuesta se truncó en 10000 valores "
+                "(usar iter_recorded_data para leer el intervalo completo)",
+                webid,
+            )
 
-        proxies = {
-            "http": "http://proxy-ypf.grupo.ypf.com",
-            "https": "http://proxy-ypf.grupo.ypf.com",
-        }
+        p_logger.debug("[get_recorded_data] Finaliza")
 
-        try:
-            #  armo la URL y obtengo los datos del Stream para los parámetros especificados
-            request_url = (
-                f"{self.web_api_url}/streams/{webid}/recorded?startTime=%22{start_time}%22&endTime=%22{end_time}%22&"
-                "maxCount=10000&selectedfields=items.timestamp;items.value"
-            )
+        return resultado
 
-            p_logger.debug("request_url: %s", request_url)
+    def iter_recorded_data(
+        self,
+        security_auth,
+        webid,
+        start_time="-1d",
+        end_time="*",
+        max_count=MAX_COUNT,
+        estados=False,
+    ) -> Iterator[Tuple[np.ndarray, ...]]:
+        """Lee el intervalo completo de un stream por páginas de max_count valores: cada
+        página empieza en el último timestamp de la anterior. Como el inicio es inclusivo,
+        se descartan los valores de ese timestamp que ya se devolvieron
+        @param security_auth: Referencia securityAuth
+        @param webid string: ID del Stream
+        @param start_time string: Inicio del Stream (default -1d)
+        @param end_time string: Fin del Stream (default *, es decir, hasta el último valor)
+        @param max_count int: valores por página (default MAX_COUNT)
+        @param estados bool: incluye el estado de los valores no numéricos (default False)
+        Devuelve un iterador de (timestamps, valores) por página, más los estados si se
+        piden (ver items_a_arrays), así un intervalo largo se procesa por partes de
+        memoria acotada
+        Lanza requests.HTTPError si falla la lectura de una página
+        """
 
-            # Leer el conjunto de valores
-            respuesta = requests.get(
-                request_url,
-                auth=security_auth,
-                verify=self.verify_ssl,
-                timeout=60,
-                proxies=proxies,
+        p_logger = log.getLogger(cfgs["logger_name"])
+        p_logger.debug("[iter_recorded_data] Inicia")
+
+        inicio = start_time
+        ultimo_timestamp = None
+        # valores con ultimo_timestamp ya devueltos
+        repetidos = 0
+        paginas = 0
+        while True:
+            request_url = (
+                f"{self.web_api_url}/streams/{webid}/recorded?startTime=%22{inicio}%22&"
+                f"endTime=%22{end_time}%22&maxCount={max_count}&"
+                "selectedfields=items.timestamp;items.value"
             )
-            status = respuesta.status_code
-
-            if status == 200:
-                data = json.loads(respuesta.text)
-            else:
-                p_logger.error(
-                    "Se produjo un error al tratar de obtener los datos de PI. "
-                    "Error: %s",
-                    respuesta,
+            status, data = self._get("iter_recorded_data", request_url, security_auth)
+            if status != 200:
+                raise requests.HTTPError(
+                    f"[iter_recorded_data] Error {status} leyendo {webid} desde {inicio}"
+                )
+            items = data.get("Items", [])
+            paginas += 1
+
+            salto = 0
+            while (
+                salto < min(repetidos, len(items))
+                and items[salto]["Timestamp"] == ultimo_timestamp
+            ):
+                salto += 1
+            nuevos = items[salto:]
+            if nuevos:
+                yield items_a_arrays(nuevos, estados=estados)
+
+            if len(items) < max_count:
+                break
+            if not nuevos:
+                # página completa con valores ya devueltos: no se puede avanzar
+                p_logger.warning(
+                    "[iter_recorded_data] %s: más de %s valores en %s, se corta la lectura",
+                    webid,
+                    max_count,
+                    ultimo_timestamp,
                 )
+                break
 
-            p_logger.debug("[get_recorded_data] Finaliza")
+            timestamp = nuevos[-1]["Timestamp"]
+            iguales = 0
+            for item in reversed(nuevos):
+                if item["Timestamp"] != timestamp:
+                    break
+                iguales += 1
+            repetidos = iguales + (repetidos if timestamp == ultimo_timestamp else 0)
+            ultimo_timestamp = inicio = timestamp
 
-        except requests.RequestException as e:
-            p_logger.error(
-                "Se produjo un error al tratar de obtener los datos de PI: %s.", str(e)
+        p_logger.debug("[iter_recorded_data] Finaliza: %s páginas", paginas)
+
+    def get_recorded_dataframe(
+        self,
+        security_auth,
+        webid,
+        start_time="-1d",
+        end_time="*",
+        max_count=MAX_COUNT,
+    ) -> pd.DataFrame:
+        """Lee el intervalo completo de un stream con iter_recorded_data y lo devuelve en
+        un DataFrame (Timestamp en UTC sin zona, Value float), armado con una sola
+        concatenación de las páginas
+        """
+
+        paginas = list(
+            self.iter_recorded_data(security_auth, webid, start_time, end_time, max_count)
+        )
+        if not paginas:
+            return pd.DataFrame(
+                {
+                    "Timestamp": np.array([], dtype="datetime64[ns]"),
+                    "Value": np.array([], dtype=np.float64),
+                }
             )
-            p_logger.error("Error: %s", traceback.format_exc())
 
-        return [status, data]
+        return pd.DataFrame(
+            {
+                "Timestamp": np.concatenate([timestamps for timestamps, _ in paginas]),
+                "Value": np.concatenate([valores for _, valores in paginas]),
+            }
+        )
+
+    def get_recorded_data_multiple(
+        self,
+        security_auth,
+        webids: Sequence[str],
+        start_time="-1d",
+        end_time="*",
+        max_count=10000,
+    ) -> Dict[str, list]:
+        """Como get_recorded_data para muchos WebIds, con el endpoint streamsets/recorded
+        (WEBIDS_POR_REQUEST WebIds por request, hasta max_conexiones requests a la vez)
+        @param webids list: IDs de los Streams
+        @param max_count int: valores máximos por stream (default 10000)
+        Devuelve un diccionario WebId -> [status, data] con data en el formato de
+        get_recorded_data
+        """
+
+        p_logger = log.getLogger(cfgs["logger_name"])
+        p_logger.debug("[get_recorded_data_multiple] Inicia: %s streams", len(webids))
+
+        resultado = self._get_streamsets(
+            "get_recorded_data_multiple",
+            "recorded",
+            security_auth,
+            webids,
+            {
+                "startTime": start_time,
+                "endTime": end_time,
+                "maxCount": max_count,
+                "selectedFields": "Items.WebId;Items.Items.Timestamp;Items.Items.Value",
+            },
+        )
+
+        p_logger.debug("[get_recorded_data_multiple] Finaliza")
+
+        return resultado
 
 
 if __name__ == "__main__":
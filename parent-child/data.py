@@ -4,26 +4,67 @@ import datetime
 import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
 
-import cmlapi
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from great_expectations.checkpoint.types.checkpoint_result import CheckpointResult
 from great_expectations.data_context import DataContext
 
+try:
+    import cmlapi
+except ImportError:  # solo se necesita para crear el cliente y el request reales de CML
+    cmlapi = None
+
 from config import config
 from config.config import logger
+from src import pi_cache, validation
 from src.shared import blob_storage as blob
 from src.shared import pi
 
+# Las fechas de las novedades y las presiones están en hora local (UTC-3); PI y su caché en UTC
+DESFASE_UTC = datetime.timedelta(hours=3)
+
+# Validación de las novedades: "great_expectations" o "vectorizado" (src/validation.py)
+VALIDATION_ENGINE = os.environ.get("VALIDATION_ENGINE", "great_expectations")
+# Con el engine vectorizado, valida además que FIN_FRAC no sea anterior a INICIO_FRAC
+VALIDAR_ORDEN_FECHAS = os.environ.get("VALIDAR_ORDEN_FECHAS", "0") == "1"
+
+# Eventos cuyas presiones se consultan a PI a la vez
+PI_WORKERS = int(os.environ.get("PI_WORKERS", "8"))
 
-def validate_input() -> bool:
+# Job de CML que extrae las horas de paro de Teradata
+JOB_TIMEOUT = float(os.environ.get("JOB_TIMEOUT", "3600"))
+ESTADOS_JOB_ERROR = {"ENGINE_FAILED", "ENGINE_STOPPED", "ENGINE_TIMEDOUT"}
+
+
+def validate_input(engine: str = VALIDATION_ENGINE) -> bool:
     """Valida los datos de entrada ejecutando la suite de GE
 
+    Args:
+        engine (str, optional): "great_expectations" (checkpoint de GE) o "vectorizado"
+            (misma suite con src.validation, sin levantar el DataContext; con
+            VALIDAR_ORDEN_FECHAS agrega el orden de las fechas de fractura).
+            Valor default es VALIDATION_ENGINE.
+
+    Raises:
+        ValueError: si el engine no existe
+
     Returns:
         bool: Si los datos son validos o no
     """
 
+    if engine == "vectorizado":
+        resultado = validation.validar_csv(
+            config.DATA_INPUT_DIR.joinpath("NOVEDADES_GIDI.csv"), orden_fechas=VALIDAR_ORDEN_FECHAS
+        )
+        logger.info("Validación de novedades: %s", resultado["statistics"])
+        return resultado["success"]
+    if engine != "great_expectations":
+        raise ValueError(f"Engine de validación desconocido: {engine}")
+
     data_context: DataContext = DataContext(context_root_dir="./tests/great_expectations")
 
     result: CheckpointResult = data_context.run_checkpoint(
@@ -35,11 +76,54 @@ def validate_input() -> bool:
     return result.success
 
 
-def get_presiones() -> pd.DataFrame:
-    """Obtención de las presiones para cada nuevo evento
+def _presiones_evento(
+    pi_webapi: pi.PiWebapi, security_auth, pozo: str, desde: str, hasta: str
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Presiones de cabeza del pozo padre durante un evento
+
+    Args:
+        pi_webapi (pi.PiWebapi): cliente de PI
+        security_auth: autenticación de PI
+        pozo (str): pozo padre
+        desde (str): inicio de la fractura (hora local)
+        hasta (str): fin de la fractura (hora local)
 
     Returns:
-        pd.DataFrame: DataFrame con las presiones obtenidas de PI
+        Tuple[np.ndarray, Dict[str, np.ndarray]]: timestamps (datetime64[ns] UTC) y
+            columnas de cada valor (ver pi_cache.leer)
+    """
+
+    tag = pozo + "_PT:CABEZA.PV"
+    webid = pi_webapi.generate_webid_from_path(rf"{pi_webapi.path}\{tag}")
+
+    # Solo se leen de PI los tramos del intervalo que no están en la caché local
+    return pi_cache.leer(
+        pi_webapi.path,
+        tag,
+        pd.Timestamp(desde) + DESFASE_UTC,
+        pd.Timestamp(hasta) + DESFASE_UTC,
+        leer_pi=lambda inicio, fin: pi_webapi.iter_recorded_data(
+            security_auth=security_auth,
+            webid=webid,
+            start_time=inicio,
+            end_time=fin,
+            estados=True,
+        ),
+    )
+
+
+def get_presiones(max_workers: int = PI_WORKERS) -> pd.DataFrame:
+    """Obtención de las presiones para cada nuevo evento.
+    Los eventos se consultan en paralelo (hasta max_workers a la vez) y el DataFrame
+    se arma con una sola concatenación al final. Un evento que falla no interrumpe
+    al resto: se registra en el log y en df.attrs["errores"].
+
+    Args:
+        max_workers (int, optional): eventos consultados a la vez. Valor default es PI_WORKERS.
+
+    Returns:
+        pd.DataFrame: DataFrame con las presiones obtenidas de PI. attrs["errores"] tiene
+            Evento, Pozo y Error de los eventos que no se pudieron obtener
     """
 
     load_dotenv()
@@ -51,6 +135,7 @@ def get_presiones() -> pd.DataFrame:
         False,
         os.environ.get("PI_WEB_API_USER"),
         os.environ.get("PI_WEB_API_PASSWORD"),
+        max_conexiones=max_workers,
     )
 
     blob.download_data_from_blob_storage(
@@ -62,70 +147,165 @@ def get_presiones() -> pd.DataFrame:
     novedades_fp = config.DATA_INPUT_DIR.joinpath("NOVEDADES_GIDI.csv")
     df_novedades = pd.read_csv(novedades_fp)
 
-    df_presiones = pd.DataFrame(
-        columns=["Evento", "Timestamp", "Value", "Value.Name", "Value.Value", "Value.IsSystem"]
-    )
     security_auth = pi_webapi.call_security_method()
-    for id_evento, pozo, desde, hasta in zip(
-        df_novedades["ID_EVENTO"],
-        df_novedades["PADRE"],
-        df_novedades["INICIO_FRAC"],
-        df_novedades["FIN_FRAC"],
-    ):
-        tag = pozo + "_PT:CABEZA.PV"
-        webid = pi_webapi.generate_webid_from_path(rf"{pi_webapi.path}\{tag}")
-
-        presiones = pi_webapi.get_recorded_data(
-            security_auth=security_auth, webid=webid, start_time=desde, end_time=hasta
+    eventos = list(
+        zip(
+            df_novedades["ID_EVENTO"],
+            df_novedades["PADRE"],
+            df_novedades["INICIO_FRAC"],
+            df_novedades["FIN_FRAC"],
         )
+    )
+    with pi_webapi, ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [
+            executor.submit(_presiones_evento, pi_webapi, security_auth, pozo, desde, hasta)
+            for _, pozo, desde, hasta in eventos
+        ]
+
+        ids, series, errores = [], [], []
+        for (id_evento, pozo, _, _), future in zip(eventos, futures):
+            try:
+                series.append(future.result())
+                ids.append(id_evento)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error(
+                    "Error obteniendo las presiones del evento %s (pozo %s): %s",
+                    id_evento,
+                    pozo,
+                    e,
+                )
+                errores.append({"Evento": id_evento, "Pozo": pozo, "Error": str(e)})
+
+    cantidades = [len(timestamps) for timestamps, _ in series]
+    timestamps = np.concatenate(
+        [t for t, _ in series] or [np.empty(0, dtype="datetime64[ns]")]
+    ).astype("datetime64[ns]")
+    columnas = {
+        columna: np.concatenate([c[columna] for _, c in series] or [np.empty(0, dtype=dtype)])
+        for columna, dtype in pi_cache.COLUMNAS.items()
+    }
+    # Los estados digitales y de sistema (valores no numéricos) se devuelven como los
+    # devuelve PI: Value.Name, Value.Value y Value.IsSystem, vacíos en los numéricos
+    numericos = columnas["nombres"] == ""
+    df_presiones = pd.DataFrame(
+        {
+            "Evento": np.repeat(np.asarray(ids), cantidades),
+            # las presiones se devuelven en hora local, como las novedades
+            "Timestamp": timestamps - np.timedelta64(DESFASE_UTC),
+            "Value": columnas["valores"],
+            "Value.Name": np.where(numericos, None, columnas["nombres"].astype(object)),
+            "Value.Value": columnas["codigos"],
+            "Value.IsSystem": np.where(numericos, None, columnas["sistema"].astype(object)),
+        }
+    )
+    df_presiones.attrs["errores"] = errores
+    if errores:
+        logger.error("Eventos sin presiones: %s de %s", len(errores), len(eventos))
 
-        list_data = list(presiones[1].values())
-        df_data = pd.json_normalize(list_data[0])
-
-        df_data["Timestamp"] = pd.to_datetime(
-            df_data["Timestamp"], format="%Y-%m-%d %H:%M:%S"
-        ).to_numpy()
-        df_data["Timestamp"] = df_data["Timestamp"] - datetime.timedelta(hours=3)
-        df_data["Timestamp"] = pd.to_datetime(df_data["Timestamp"]).dt.tz_convert(None)
+    return df_presiones
 
-        df_data = df_data.reindex(
-            columns=["Evento", "Timestamp", "Value", "Value.Name", "Value.Value", "Value.IsSystem"]
-        )
-        df_data["Evento"] = id_evento
 
-        df_presiones = pd.concat([df_presiones, df_data], ignore_index=True)
-
-    return df_presiones
+def esperar_job(
+    api_client,
+    project_id: str,
+    job_id: str,
+    run_id: str,
+    timeout: float = JOB_TIMEOUT,
+    intervalo: float = 2.0,
+    intervalo_max: float = 60.0,
+    dormir: Callable[[float], None] = time.sleep,
+    reloj: Callable[[], float] = time.monotonic,
+) -> str:
+    """Espera a que termine una ejecución de un job de CML.
+    El estado se consulta con backoff exponencial (intervalo, 2*intervalo, ... hasta
+    intervalo_max), así un job corto se detecta enseguida y uno largo no satura la API.
+
+    Args:
+        api_client: cliente de CML (cmlapi o uno equivalente con get_job_run)
+        project_id (str): id del proyecto
+        job_id (str): id del job
+        run_id (str): id de la ejecución
+        timeout (float, optional): segundos máximos de espera. Valor default es JOB_TIMEOUT.
+        intervalo (float, optional): primer intervalo entre consultas. Valor default es 2.0.
+        intervalo_max (float, optional): intervalo máximo entre consultas. Valor default es 60.0.
+        dormir (Callable[[float], None], optional): espera entre consultas.
+            Valor default es time.sleep.
+        reloj (Callable[[], float], optional): reloj para el timeout. Valor default es
+            time.monotonic.
+
+    Raises:
+        RuntimeError: si la ejecución termina en un estado de error
+        TimeoutError: si la ejecución no termina antes del timeout
 
+    Returns:
+        str: estado final (ENGINE_SUCCEEDED)
+    """
 
-def run_job_estados() -> pd.DataFrame:
+    limite = reloj() + timeout
+    status = None
+    while True:
+        anterior, status = status, api_client.get_job_run(project_id, job_id, run_id).status
+        if status != anterior:
+            logger.info("Job %s, ejecución %s: %s", job_id, run_id, status)
+        if status == "ENGINE_SUCCEEDED":
+            return status
+        if status in ESTADOS_JOB_ERROR:
+            raise RuntimeError(
+                f"El job {job_id} (ejecución {run_id}) terminó con estado {status}"
+            )
+
+        restante = limite - reloj()
+        if restante <= 0:
+            raise TimeoutError(
+                f"El job {job_id} (ejecución {run_id}) no terminó en {timeout} s: {status}"
+            )
+        dormir(min(intervalo, restante))
+        intervalo = min(intervalo * 2, intervalo_max)
+
+
+def run_job_estados(
+    api_client=None,
+    timeout: float = JOB_TIMEOUT,
+    crear_request: Optional[Callable[[str, str], Any]] = None,
+) -> pd.DataFrame:
     """Obtención de los datos de horas de paro.
     Se ejecuta un job en CDP, ya que los datos están en Teradata
 
+    Args:
+        api_client (optional): cliente de CML. Valor default es None (se crea con
+            CML_API_URL y CML_API_KEY).
+        timeout (float, optional): segundos máximos de espera del job. Valor default es
+            JOB_TIMEOUT.
+        crear_request (Optional[Callable[[str, str], Any]], optional): arma el cuerpo de
+            create_job_run a partir de project_id y job_id. Valor default es None
+            (cmlapi.CreateJobRunRequest). Con un cliente falso no hace falta cmlapi.
+
+    Raises:
+        RuntimeError: si el job termina en un estado de error
+        TimeoutError: si el job no termina antes del timeout
+
     Returns:
         pd.DataFrame: DataFrame con las horas de paro obtenidas de Teradata
     """
 
     load_dotenv()
 
-    api_url = os.environ.get("CML_API_URL")
-    api_key = os.environ.get("CML_API_KEY")
-    api_client = cmlapi.default_client(url=api_url, cml_api_key=api_key)
+    if api_client is None:
+        api_url = os.environ.get("CML_API_URL")
+        api_key = os.environ.get("CML_API_KEY")
+        api_client = cmlapi.default_client(url=api_url, cml_api_key=api_key)
     projects = api_client.list_projects(search_filter=json.dumps({"name": "parent-child"}))
     project = projects.projects[0]
 
     project_id = project.id
     job_id = "k9yi-cww6-iw3w-buq0"
-    jobrun_body = cmlapi.CreateJobRunRequest(project_id, job_id)
+    if crear_request is None:
+        crear_request = cmlapi.CreateJobRunRequest
+    jobrun_body = crear_request(project_id, job_id)
     job_run = api_client.create_job_run(jobrun_body, project_id, job_id)
     run_id = job_run.id
 
-    status = ""
-    while status != "ENGINE_SUCCEEDED":
-        api_response = api_client.get_job_run(project_id, job_id, run_id)
-        status = api_response.status
-        print(status)
-        time.sleep(10)
+    esperar_job(api_client, project_id, job_id, run_id, timeout=timeout)
 
     blob.download_data_from_blob_storage(
         storage_account_key=config.STORAGE_ACCOUNT_KEY,
@@ -139,5 +319,40 @@ def run_job_estados() -> pd.DataFrame:
     return df_estados
 
 
+def get_presiones_y_estados(
+    max_workers: int = PI_WORKERS,
+    api_client=None,
+    timeout: float = JOB_TIMEOUT,
+    crear_request: Optional[Callable[[str, str], Any]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Obtiene las presiones y las horas de paro a la vez: el job de Teradata corre
+    en CDP mientras se leen las presiones de PI
+
+    Args:
+        max_workers (int, optional): eventos consultados a la vez. Valor default es PI_WORKERS.
+        api_client (optional): cliente de CML. Valor default es None.
+        timeout (float, optional): segundos máximos de espera del job. Valor default es
+            JOB_TIMEOUT.
+        crear_request (Optional[Callable[[str, str], Any]], optional): ver
+            run_job_estados. Valor default es None.
+
+    Raises:
+        RuntimeError: si el job termina en un estado de error
+        TimeoutError: si el job no termina antes del timeout
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: presiones y horas de paro
+    """
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        estados = executor.submit(
+            run_job_estados, api_client=api_client, timeout=timeout, crear_request=crear_request
+        )
+        df_presiones = get_presiones(max_workers=max_workers)
+        df_estados = estados.result()
+
+    return df_presiones, df_estados
+
+
 # if __name__ == "__main__":
 #    validate_input()
@@ -0,0 +1,237 @@
+"""caché local de series de tiempo de PI con lectura de los tramos faltantes"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import config
+from config.config import logger
+
+CACHE_DIR = Path(config.STORES_DIR, "pi")
+
+# Los datos más nuevos que este margen no se marcan como cubiertos: PI todavía
+# puede recibir valores atrasados y se vuelven a leer en la próxima consulta
+MARGEN_RECIENTE = np.timedelta64(10, "m")
+
+# Columnas de cada valor de la serie además del timestamp: el valor numérico (NaN si no lo
+# es) y el estado digital o de sistema de PI (Value.Name, Value.Value y Value.IsSystem)
+COLUMNAS = {
+    "valores": np.float64,
+    "nombres": np.str_,
+    "codigos": np.float64,
+    "sistema": np.bool_,
+}
+
+# Lectura de un tramo en PI: (desde, hasta) en ISO UTC -> bloques de (timestamps, valores,
+# nombres, codigos, sistema), ej.: PiWebapi.iter_recorded_data con estados=True
+LectorPI = Callable[[str, str], Iterator[Tuple[np.ndarray, ...]]]
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def _clave(path: str, tag: str) -> str:
+    """
+    Clave de una serie en la caché
+
+    Args:
+        path (str): servidor / path de PI
+        tag (str): tag
+
+    Returns:
+        str: hash del path + tag (PI no distingue mayúsculas)
+    """
+
+    return hashlib.blake2b(rf"{path}\{tag}".upper().encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _lock(clave: str) -> threading.Lock:
+    """Lock por serie: los hilos que leen el mismo tag no escriben la entrada a la vez"""
+
+    with _locks_lock:
+        return _locks.setdefault(clave, threading.Lock())
+
+
+def _a_ns(valor) -> int:
+    """Convierte un instante (str, datetime, np.datetime64) sin zona, en UTC, a ns"""
+
+    return int(pd.Timestamp(valor).value)
+
+
+def _iso(ns: int) -> str:
+    """Instante en ns a ISO UTC para PI"""
+
+    return np.datetime_as_string(np.datetime64(ns, "ns"), unit="ms") + "Z"
+
+
+def _vacias() -> Dict[str, np.ndarray]:
+    """Columnas de una serie sin valores"""
+
+    return {columna: np.empty(0, dtype=dtype) for columna, dtype in COLUMNAS.items()}
+
+
+def _cargar(archivo: Path) -> Tuple[np.ndarray, Dict[str, np.ndarray], np.ndarray]:
+    """
+    Lee una entrada de la caché. Una entrada ilegible o de un formato anterior (sin
+    las columnas de estado) se descarta y la serie se vuelve a leer de PI.
+
+    Args:
+        archivo (Path): archivo .npz de la serie
+
+    Returns:
+        Tuple[np.ndarray, Dict[str, np.ndarray], np.ndarray]: timestamps (int64 ns UTC,
+            ordenados), COLUMNAS de cada valor e intervalos cubiertos (int64 [n, 2],
+            ordenados y disjuntos)
+    """
+
+    try:
+        with np.load(archivo) as datos:
+            columnas = {columna: datos[columna] for columna in COLUMNAS}
+            return datos["timestamps"], columnas, datos["intervalos"]
+    except (OSError, ValueError, KeyError):
+        return np.empty(0, dtype=np.int64), _vacias(), np.empty((0, 2), dtype=np.int64)
+
+
+def _guardar(
+    archivo: Path, timestamps: np.ndarray, columnas: Dict[str, np.ndarray], intervalos: np.ndarray
+):
+    """Escribe una entrada de forma atómica"""
+
+    archivo.parent.mkdir(parents=True, exist_ok=True)
+    temporal = archivo.with_name(archivo.name + ".tmp")
+    with open(temporal, "wb") as f:
+        np.savez(f, timestamps=timestamps, intervalos=intervalos, **columnas)
+    os.replace(temporal, archivo)
+
+
+def faltantes(intervalos: np.ndarray, desde: int, hasta: int) -> List[Tuple[int, int]]:
+    """
+    Tramos de [desde, hasta] que no están cubiertos por los intervalos
+
+    Args:
+        intervalos (np.ndarray): intervalos cubiertos [n, 2], ordenados y disjuntos
+        desde (int): inicio (ns)
+        hasta (int): fin (ns)
+
+    Returns:
+        List[Tuple[int, int]]: tramos faltantes, ordenados
+    """
+
+    tramos = []
+    inicio = desde
+    for a, b in intervalos:
+        if b < inicio:
+            continue
+        if a > hasta:
+            break
+        if a > inicio:
+            tramos.append((inicio, int(a)))
+        inicio = max(inicio, int(b))
+    if inicio < hasta:
+        tramos.append((inicio, hasta))
+
+    return tramos
+
+
+def _unir(intervalos: np.ndarray, nuevos: List[Tuple[int, int]]) -> np.ndarray:
+    """Une intervalos (los que se tocan o se solapan quedan en uno)"""
+
+    todos = sorted([tuple(i) for i in intervalos.tolist()] + list(nuevos))
+    unidos: List[List[int]] = []
+    for a, b in todos:
+        if unidos and a <= unidos[-1][1]:
+            unidos[-1][1] = max(unidos[-1][1], b)
+        else:
+            unidos.append([a, b])
+
+    return np.array(unidos, dtype=np.int64).reshape(-1, 2)
+
+
+def leer(
+    path: str,
+    tag: str,
+    desde,
+    hasta,
+    leer_pi: LectorPI,
+    cache_dir: Path = CACHE_DIR,
+    ahora: Optional[np.datetime64] = None,
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Devuelve la serie de un tag entre desde y hasta (inclusive). Solo se consultan a PI
+    los tramos que no están en la caché; se agregan a la entrada y quedan disponibles
+    para las próximas consultas (ej.: ventanas de fractura solapadas del mismo pozo).
+
+    Args:
+        path (str): servidor / path de PI
+        tag (str): tag
+        desde: inicio en UTC sin zona (str, datetime o np.datetime64)
+        hasta: fin en UTC sin zona (str, datetime o np.datetime64)
+        leer_pi (LectorPI): lectura de un tramo en PI (ej.: PiWebapi.iter_recorded_data)
+        cache_dir (Path, optional): carpeta de la caché. Valor default es CACHE_DIR.
+        ahora (Optional[np.datetime64], optional): instante actual en UTC.
+            Valor default es None (el reloj del sistema).
+
+    Returns:
+        Tuple[np.ndarray, Dict[str, np.ndarray]]: timestamps (datetime64[ns] UTC) y
+            COLUMNAS de cada valor: valores (float64) y el estado de los no numéricos,
+            nombres (str, "" en los numéricos), codigos (float64) y sistema (bool)
+    """
+
+    desde_ns, hasta_ns = _a_ns(desde), _a_ns(hasta)
+    ahora_ns = _a_ns(ahora if ahora is not None else pd.Timestamp.now(tz="UTC").tz_convert(None))
+    # lo reciente se lee pero no se marca como cubierto
+    limite_ns = ahora_ns - int(MARGEN_RECIENTE / np.timedelta64(1, "ns"))
+
+    clave = _clave(path, tag)
+    archivo = Path(cache_dir, clave + ".npz")
+    with _lock(clave):
+        timestamps, columnas, intervalos = _cargar(archivo)
+        tramos = faltantes(intervalos, desde_ns, hasta_ns)
+        if tramos:
+            logger.info("[pi_cache] %s: %s tramos a leer de PI", tag, len(tramos))
+
+        cubiertos = []
+        try:
+            for a, b in tramos:
+                bloques = list(leer_pi(_iso(a), _iso(b)))
+                nuevos_ts = np.concatenate(
+                    [
+                        np.asarray(bloque[0], dtype="datetime64[ns]").view(np.int64)
+                        for bloque in bloques
+                    ]
+                    or [np.empty(0, dtype=np.int64)]
+                )
+                # La lectura del tramo reemplaza lo que había en [a, b]: los extremos
+                # ya estaban como borde de los intervalos vecinos
+                izquierda = np.searchsorted(timestamps, a, side="left")
+                derecha = np.searchsorted(timestamps, b, side="right")
+                timestamps = np.concatenate(
+                    [timestamps[:izquierda], nuevos_ts, timestamps[derecha:]]
+                )
+                for i, (columna, dtype) in enumerate(COLUMNAS.items(), start=1):
+                    nuevos = [np.asarray(bloque[i], dtype=dtype) for bloque in bloques]
+                    actual = columnas[columna]
+                    columnas[columna] = np.concatenate(
+                        [actual[:izquierda], *nuevos, actual[derecha:]]
+                    )
+                if a < limite_ns:
+                    cubiertos.append((a, min(b, limite_ns)))
+        finally:
+            if tramos:
+                orden = np.argsort(timestamps, kind="stable")
+                timestamps = timestamps[orden]
+                columnas = {columna: valores[orden] for columna, valores in columnas.items()}
+                intervalos = _unir(intervalos, cubiertos)
+                _guardar(archivo, timestamps, columnas, intervalos)
+
+    izquierda = np.searchsorted(timestamps, desde_ns, side="left")
+    derecha = np.searchsorted(timestamps, hasta_ns, side="right")
+
+    return timestamps[izquierda:derecha].view("datetime64[ns]"), {
+        columna: valores[izquierda:derecha] for columna, valores in columnas.items()
+    }
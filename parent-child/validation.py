@@ -0,0 +1,368 @@
+"""validación vectorizada de las novedades (misma suite que el checkpoint de GE)"""
+
+import json
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.config import logger
+
+# Filas por bloque al leer el CSV
+CHUNKSIZE = 100_000
+
+# Suite de GE que usa el checkpoint novedades_gidi (relativa al directorio de ejecución,
+# como el DataContext de data.validate_input)
+SUITE_FP = Path("tests/great_expectations/expectations/novedades_gidi.json")
+
+# Copia de la suite novedades_gidi, para cuando no está SUITE_FP. Mismos tipos y kwargs
+# que GE, así el resumen se compara con el del checkpoint
+NOVEDADES_GIDI: List[Tuple[str, Dict]] = [
+    (
+        "expect_table_columns_to_match_ordered_list",
+        {
+            "column_list": [
+                "ID_EVENTO",
+                "CAMPO",
+                "FLUIDO",
+                "PAD_HIJO",
+                "HIJO",
+                "UWI_HIJO",
+                "ETAPA_HIJO",
+                "RIG",
+                "INICIO_FRAC",
+                "FIN_FRAC",
+                "X_HIJO",
+                "Y_HIJO",
+                "Z_HIJO",
+                "LATITUD_HIJO",
+                "LONGITUD_HIJO",
+                "PADRE",
+                "UWI_PADRE",
+                "X_PADRE",
+                "Y_PADRE",
+                "Z_PADRE",
+                "D3D",
+                "D2D",
+                "DZ",
+                "AZ",
+                "#_BARRERAS",
+                "POZOS_BARRERA",
+                "LINEAMIENTO",
+                "INICIO_PERTURBACION",
+                "WHP_i",
+                "delta_WHP",
+                "FIN_PERTURBACION",
+                "ESTADO",
+                "TIPO_DE_PADRE",
+                "CUADRANTE_PADRE",
+                "FECHA_ACTUALIZACION_OW",
+            ]
+        },
+    ),
+    ("expect_column_values_to_be_unique", {"column": "ID_EVENTO"}),
+    ("expect_column_values_to_not_be_null", {"column": "PAD_HIJO"}),
+    ("expect_column_values_to_be_of_type", {"column": "PAD_HIJO", "type_": "str"}),
+    ("expect_column_values_to_not_be_null", {"column": "HIJO"}),
+    ("expect_column_values_to_be_of_type", {"column": "HIJO", "type_": "str"}),
+    ("expect_column_values_to_not_be_null", {"column": "ETAPA_HIJO"}),
+    ("expect_column_values_to_be_of_type", {"column": "ETAPA_HIJO", "type_": "int64"}),
+    (
+        "expect_column_mean_to_be_between",
+        {"column": "ETAPA_HIJO", "min_value": 12, "max_value": 32},
+    ),
+    ("expect_column_values_to_not_be_null", {"column": "PADRE"}),
+    ("expect_column_values_to_be_of_type", {"column": "PADRE", "type_": "str"}),
+    ("expect_column_values_to_not_be_null", {"column": "INICIO_FRAC"}),
+    (
+        "expect_column_values_to_match_strftime_format",
+        {"column": "INICIO_FRAC", "strftime_format": "%Y-%m-%d %H:%M:%S"},
+    ),
+    ("expect_column_values_to_not_be_null", {"column": "FIN_FRAC"}),
+    (
+        "expect_column_values_to_match_strftime_format",
+        {"column": "FIN_FRAC", "strftime_format": "%Y-%m-%d %H:%M:%S"},
+    ),
+    (
+        "expect_column_values_to_match_strftime_format",
+        {"column": "INICIO_PERTURBACION", "strftime_format": "%Y-%m-%d %H:%M:%S.%f"},
+    ),
+    ("expect_column_values_to_be_null", {"column": "INICIO_PERTURBACION", "mostly": 0.98}),
+    (
+        "expect_column_values_to_match_strftime_format",
+        {"column": "FIN_PERTURBACION", "strftime_format": "%Y-%m-%d %H:%M:%S.%f"},
+    ),
+    ("expect_column_values_to_be_null", {"column": "FIN_PERTURBACION", "mostly": 0.98}),
+    ("expect_column_values_to_be_of_type", {"column": "WHP_i", "type_": "float"}),
+    (
+        "expect_column_values_to_be_between",
+        {"column": "WHP_i", "min_value": -0.4, "max_value": 999.0},
+    ),
+    ("expect_column_values_to_be_null", {"column": "WHP_i", "mostly": 0.78}),
+    ("expect_column_values_to_be_of_type", {"column": "delta_WHP", "type_": "float"}),
+    (
+        "expect_column_values_to_be_between",
+        {"column": "delta_WHP", "min_value": -100.0, "max_value": 999.0},
+    ),
+    ("expect_column_values_to_be_null", {"column": "delta_WHP", "mostly": 0.63}),
+]
+
+# Chequeo opcional, fuera de la suite de GE: la fractura no termina antes de empezar
+ORDEN_FECHAS_FRAC: List[Tuple[str, Dict]] = [
+    (
+        "expect_column_pair_values_a_to_be_greater_than_b",
+        {"column_A": "FIN_FRAC", "column_B": "INICIO_FRAC", "or_equal": True},
+    ),
+]
+
+# Kernel de una expectativa sobre un bloque: (bloque, kwargs) -> (evaluados, inesperados)
+Kernel = Callable[[pd.DataFrame, Dict], Tuple[int, int]]
+
+
+def _no_nulo(bloque: pd.DataFrame, kwargs: Dict) -> Tuple[int, int]:
+    """Valores nulos"""
+
+    col = bloque[kwargs["column"]]
+    return len(col), int(col.isna().sum())
+
+
+def _nulo(bloque: pd.DataFrame, kwargs: Dict) -> Tuple[int, int]:
+    """Valores no nulos"""
+
+    col = bloque[kwargs["column"]]
+    return len(col), int(col.notna().sum())
+
+
+def _tipo(bloque: pd.DataFrame, kwargs: Dict) -> Tuple[int, int]:
+    """Valores (no nulos) de otro tipo"""
+
+    col = bloque[kwargs["column"]].dropna()
+    if kwargs["type_"] == "str":
+        if pd.api.types.infer_dtype(col, skipna=True) in ("string", "empty"):
+            return len(col), 0
+        return len(col), int((~col.map(lambda valor: isinstance(valor, str))).sum())
+
+    # los tipos numéricos se validan por el dtype de la columna, como hace GE
+    return len(col), 0 if col.dtype == np.dtype(kwargs["type_"]) else len(col)
+
+
+def _entre(bloque: pd.DataFrame, kwargs: Dict) -> Tuple[int, int]:
+    """Valores (no nulos) fuera del rango"""
+
+    col = pd.to_numeric(bloque[kwargs["column"]], errors="coerce")
+    valores = col.to_numpy(dtype=np.float64)
+    valores = valores[~np.isnan(valores)]
+    fuera = np.zeros(len(valores), dtype=bool)
+    if kwargs.get("min_value") is not None:
+        fuera |= valores < kwargs["min_value"]
+    if kwargs.get("max_value") is not None:
+        fuera |= valores > kwargs["max_value"]
+    # los no numéricos cuentan como inesperados
+    no_numericos = int(bloque[kwargs["column"]].notna().sum()) - len(valores)
+    return len(valores) + no_numericos, int(fuera.sum()) + no_numericos
+
+
+def _formato(bloque: pd.DataFrame, kwargs: Dict) -> Tuple[int, int]:
+    """Valores (no nulos) que no respetan el formato de fecha"""
+
+    col = bloque[kwargs["column"]].dropna().astype(str)
+    fechas = pd.to_datetime(col, format=kwargs["strftime_format"], errors="coerce")
+    return len(col), int(fechas.isna().sum())
+
+
+def _a_mayor_que_b(bloque: pd.DataFrame, kwargs: Dict) -> Tuple[int, int]:
+    """Filas (con ambos valores) donde A no es mayor (o igual) que B"""
+
+    a = pd.to_datetime(bloque[kwargs["column_A"]], errors="coerce")
+    b = pd.to_datetime(bloque[kwargs["column_B"]], errors="coerce")
+    ambos = a.notna() & b.notna()
+    a, b = a[ambos], b[ambos]
+    correctos = a >= b if kwargs.get("or_equal") else a > b
+    return len(a), int((~correctos).sum())
+
+
+_KERNELS: Dict[str, Kernel] = {
+    "expect_column_values_to_not_be_null": _no_nulo,
+    "expect_column_values_to_be_null": _nulo,
+    "expect_column_values_to_be_of_type": _tipo,
+    "expect_column_values_to_be_between": _entre,
+    "expect_column_values_to_match_strftime_format": _formato,
+    "expect_column_pair_values_a_to_be_greater_than_b": _a_mayor_que_b,
+}
+
+# Expectativas que se acumulan en _Expectativa en lugar de con un kernel
+_AGREGADAS = {
+    "expect_table_columns_to_match_ordered_list",
+    "expect_column_values_to_be_unique",
+    "expect_column_mean_to_be_between",
+}
+
+
+def cargar_suite(path: Path = SUITE_FP) -> List[Tuple[str, Dict]]:
+    """
+    Lee una suite de expectativas de GE. Las expectativas sin implementación vectorizada
+    se omiten (quedan registradas en el log).
+
+    Args:
+        path (Path, optional): JSON de la suite. Valor default es SUITE_FP.
+
+    Returns:
+        List[Tuple[str, Dict]]: tipo y kwargs de cada expectativa, o NOVEDADES_GIDI si
+            el archivo no existe
+    """
+
+    if not path.exists():
+        return NOVEDADES_GIDI
+
+    with open(path, encoding="utf-8") as f:
+        expectativas = json.load(f)["expectations"]
+
+    suite = []
+    for expectativa in expectativas:
+        tipo = expectativa["expectation_type"]
+        if tipo not in _KERNELS and tipo not in _AGREGADAS:
+            logger.warning("Expectativa sin implementación vectorizada, se omite: %s", tipo)
+            continue
+        suite.append((tipo, expectativa.get("kwargs", {})))
+
+    return suite
+
+
+class _Expectativa:
+    """Estado de una expectativa a lo largo de los bloques del CSV"""
+
+    def __init__(self, tipo: str, kwargs: Dict):
+
+        self.tipo = tipo
+        self.kwargs = kwargs
+        self.evaluados = 0
+        self.inesperados = 0
+        self.elementos = 0
+        self.suma = 0.0
+        self.cantidad = 0
+        self.columnas: Optional[List[str]] = None
+        self.valores: List[np.ndarray] = []
+        self.error: Optional[str] = None
+
+    def actualizar(self, bloque: pd.DataFrame):
+        """Acumula el resultado de un bloque"""
+
+        self.elementos += len(bloque)
+        try:
+            self._actualizar(bloque)
+        except KeyError as e:
+            # como en GE, una columna inexistente hace fallar la expectativa
+            self.error = f"Columna inexistente: {e}"
+
+    def _actualizar(self, bloque: pd.DataFrame):
+        """Acumula el resultado de un bloque (según el tipo de expectativa)"""
+
+        if self.tipo == "expect_table_columns_to_match_ordered_list":
+            if self.columnas is None:
+                self.columnas = list(bloque.columns)
+        elif self.tipo == "expect_column_values_to_be_unique":
+            # los duplicados pueden estar en bloques distintos: se comparan al final
+            self.valores.append(bloque[self.kwargs["column"]].dropna().to_numpy())
+        elif self.tipo == "expect_column_mean_to_be_between":
+            col = pd.to_numeric(bloque[self.kwargs["column"]], errors="coerce").dropna()
+            self.suma += float(col.sum())
+            self.cantidad += len(col)
+        else:
+            evaluados, inesperados = _KERNELS[self.tipo](bloque, self.kwargs)
+            self.evaluados += evaluados
+            self.inesperados += inesperados
+
+    def resultado(self) -> Dict:
+        """Resultado con la forma del de GE (expectation_config, success, result)"""
+
+        if self.error is not None:
+            exito = False
+            result: Dict = {"exception_message": self.error}
+        elif self.tipo == "expect_table_columns_to_match_ordered_list":
+            exito = self.columnas == self.kwargs["column_list"]
+            result = {"observed_value": self.columnas}
+        elif self.tipo == "expect_column_mean_to_be_between":
+            media = self.suma / self.cantidad if self.cantidad else None
+            minimo, maximo = self.kwargs.get("min_value"), self.kwargs.get("max_value")
+            exito = (
+                media is not None
+                and (minimo is None or media >= minimo)
+                and (maximo is None or media <= maximo)
+            )
+            result = {"observed_value": media}
+        else:
+            if self.tipo == "expect_column_values_to_be_unique":
+                valores = pd.Series(np.concatenate(self.valores) if self.valores else [])
+                self.evaluados = len(valores)
+                self.inesperados = int(valores.duplicated(keep=False).sum())
+            porcentaje = 100 * self.inesperados / self.evaluados if self.evaluados else 0.0
+            if self.tipo == "expect_column_values_to_be_null":
+                # GE calcula el mostly de esta expectativa sobre todas las filas
+                correctos = 1 - self.inesperados / self.elementos if self.elementos else 1.0
+            else:
+                correctos = 1 - porcentaje / 100
+            exito = correctos >= self.kwargs.get("mostly", 1)
+            result = {
+                "element_count": self.elementos,
+                "unexpected_count": self.inesperados,
+                "unexpected_percent": porcentaje,
+            }
+
+        return {
+            "expectation_config": {"expectation_type": self.tipo, "kwargs": self.kwargs},
+            "success": bool(exito),
+            "result": result,
+        }
+
+
+def validar_csv(
+    path: Path,
+    suite: Optional[List[Tuple[str, Dict]]] = None,
+    chunksize: int = CHUNKSIZE,
+    orden_fechas: bool = False,
+) -> Dict:
+    """
+    Valida un CSV por bloques, sin cargarlo completo en memoria
+
+    Args:
+        path (Path): CSV a validar
+        suite (Optional[List[Tuple[str, Dict]]], optional): expectativas (tipo y kwargs
+            de GE). Valor default es None (cargar_suite()).
+        chunksize (int, optional): filas por bloque. Valor default es CHUNKSIZE.
+        orden_fechas (bool, optional): agrega ORDEN_FECHAS_FRAC a la suite.
+            Valor default es False.
+
+    Returns:
+        Dict: success, statistics y results, como el resultado de validación de GE
+    """
+
+    suite = cargar_suite() if suite is None else suite
+    if orden_fechas:
+        suite = suite + ORDEN_FECHAS_FRAC
+    expectativas = [_Expectativa(tipo, kwargs) for tipo, kwargs in suite]
+    for bloque in pd.read_csv(path, chunksize=chunksize):
+        for expectativa in expectativas:
+            expectativa.actualizar(bloque)
+
+    results = [expectativa.resultado() for expectativa in expectativas]
+    exitosas = sum(r["success"] for r in results)
+    for r in results:
+        if not r["success"]:
+            logger.warning(
+                "Validación fallida: %s %s %s",
+                r["expectation_config"]["expectation_type"],
+                r["expectation_config"]["kwargs"].get("column", ""),
+                r["result"],
+            )
+
+    return {
+        "success": exitosas == len(results),
+        "statistics": {
+            "evaluated_expectations": len(results),
+            "successful_expectations": exitosas,
+            "unsuccessful_expectations": len(results) - exitosas,
+            "success_percent": 100 * exitosas / len(results) if results else None,
+        },
+        "results": results,
+    }
@@ -2,67 +2,33 @@
     - Importación de librerías
     - Inicializacion de variables de configuracion
     - Inicialización del logger
-    - Cambio de status a PROCESANDO
-    - Obtención de parámetros de entrada enviados por consola
-    - Llamado al proceso principal
+    - Obtención del id del trabajo enviado por consola (si no hay, se encola uno nuevo;
+      con --cola solo se atienden los trabajos pendientes)
+    - Ejecución de los trabajos en cola (src/jobs.py) hasta vaciarla
+    - Carga de los artefactos del modelo
+    - Llamado al proceso principal (secuencial, en paralelo o en pipeline según config)
 """
-from config import config
-from config.config import logger
-from main import predict
-from src import data as data_process
-from src import utils
-
-CTE_STATUS_PROCESANDO = "PROCESANDO"
-CTE_STATUS_STANDBY = "STANDBY"
-
-status = utils.read_fflag_status()
-if status == CTE_STATUS_PROCESANDO:
-    logger.info("La API ya se se estaba ejecutando.")
-
-else:
-
-    # Cambio de status de la API a PROCESANDO. El cliente monitorea este estado
-    # para saber si la API sigue procesando
-    utils.change_fflag_status(CTE_STATUS_PROCESANDO)
-
-    # Copia de datos desde el Blob Storage a la carpetas local
-    files = data_process.download_data_from_blob_storage(
-        storage_account_key=config.STORAGE_ACCOUNT_KEY,
-        container_name=config.CONTAINER_NAME,
-        local_fp=config.DATA_INPUT_DIR,
-        blob_name=None,
-    )
-    logger.info("Archivos descargados: %s", files)
-
-    for fileName in files:
-        logger.info("[__init__] archivo: %s", fileName)
+import sys
 
-        # Llamado a la función principal
-        predict(fileName)
-
-        # Comprime el directorio generado por la predicción para enviarlo al usuario
-        output_path = config.DATA_OUTPUT_DIR.joinpath(fileName)
-        logger.info("[__init__] comprimir_directorio: %s", output_path)
-        utils.comprimir_directorio(output_path, output_path)
-
-        # Copia de datos desde la carpeta local al Blob Storage
-        data_process.upload_data_to_blob_storage(
-            storage_account_key=config.STORAGE_ACCOUNT_KEY,
-            container_name=config.CONTAINER_NAME,
-            output_fp=config.DATA_OUTPUT_DIR,
-            processed_fp=config.DATA_PROCESSED_DIR,
-        )
-
-    # Cambio de status de la API a STANDBY. El cliente monitorea este estado
-    # para saber si la API terminó el proceso
-    utils.change_fflag_status(CTE_STATUS_STANDBY)
-
-    # Almacenamiento del log en el Blob Storage
-    data_process.upload_log_to_blob_storage(
-        storage_account_key=config.STORAGE_ACCOUNT_KEY, container_name=config.CONTAINER_NAME
-    )
-    data_process.clean_data(
-        storage_account_key=config.STORAGE_ACCOUNT_KEY, container_name=config.CONTAINER_NAME
-    )
-
-logger.info("[__init__] Finaliza")
+from config.config import logger
+from src import batch
+from src import jobs
+
+# El lote solo se ejecuta cuando se llama como script. Importar el paquete src
+# (por ejemplo desde los procesos del pool) no debe disparar otra ejecución.
+if __name__ == "__main__":
+    # /submit encola el trabajo y pasa su id; /check y /kill pasan --cola para atender
+    # los pendientes sin encolar otro; ejecutado a mano se encola uno nuevo
+    trabajo_id = sys.argv[1] if len(sys.argv) > 1 else jobs.crear()
+    if trabajo_id == "--cola":
+        logger.info("[__init__] Atiende los trabajos pendientes")
+    else:
+        logger.info("[__init__] Trabajo: %s", trabajo_id)
+
+    # Toma trabajos de la cola (el pedido u otros pendientes) mientras haya lugar según
+    # config.JOBS_CONCURRENTES. Si no lo hay, el trabajo queda en cola y lo toma el
+    # proceso que está en ejecución al terminar el suyo
+    ejecutados = batch.atender_trabajos()
+    logger.info("[__init__] Trabajos ejecutados: %s", ejecutados)
+
+    logger.info("[__init__] Finaliza")
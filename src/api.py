@@ -2,16 +2,24 @@
 
 import json
 import os
+import shutil
+import signal
+import socket
 import subprocess
+import tempfile
+import threading
 import time
 import traceback
-import uuid
+from collections import deque
 
-from flask import Flask, request
+from flask import Flask, Response, request
+from werkzeug.exceptions import HTTPException
+
+from config import config
+from src import jobs
+from src import log_tail
 
 PROYECTO = "Mineralogia"
-flag_file = f"""/{PROYECTO}/fflag.txt"""
-pid_file = f"""/{PROYECTO}/pidfile.txt"""
 
 COMANDO = "python3"
 pScriptPython = f"""/{PROYECTO}/src/__init__.py"""
@@ -21,6 +29,104 @@ log_dir = os.path.join(cur_dir, "logs")
 os.makedirs(log_dir, exist_ok=True)
 
 api = Flask(__name__)
+# Tamaño máximo del cuerpo de /predict: Flask responde 413 si se supera
+api.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("PREDICT_MAX_BYTES", str(256 * 1024**2)))
+
+# Predicciones sincrónicas simultáneas en /predict: el resto recibe 429
+PREDICT_MAX_CONCURRENTES = int(os.environ.get("PREDICT_MAX_CONCURRENTES", "2"))
+predicciones_en_curso = threading.BoundedSemaphore(PREDICT_MAX_CONCURRENTES)
+
+
+class MetricasLatencia:
+    """Latencias de las últimas peticiones y contadores por resultado"""
+
+    def __init__(self, maximo: int = 1000):
+
+        self._latencias = deque(maxlen=maximo)
+        self._contadores = {"ok": 0, "error": 0, "rechazadas": 0}
+        self._lock = threading.Lock()
+
+    def registrar(self, resultado: str, latencia: float = None):
+        """Registra una petición (la latencia solo se guarda si se procesó)"""
+
+        with self._lock:
+            self._contadores[resultado] += 1
+            if latencia is not None:
+                self._latencias.append(latencia)
+
+    def resumen(self) -> dict:
+        """Contadores y percentiles p50/p99 de latencia en milisegundos"""
+
+        with self._lock:
+            latencias = sorted(self._latencias)
+            contadores = dict(self._contadores)
+
+        def percentil(p):
+            if not latencias:
+                return None
+            return round(1000 * latencias[min(len(latencias) - 1, int(p * len(latencias)))], 1)
+
+        return {**contadores, "p50_ms": percentil(0.5), "p99_ms": percentil(0.99)}
+
+
+metricas_predict = MetricasLatencia()
+
+# Los lotes se encolan en src/jobs.py. "subproceso": cada /submit lanza src/__init__.py
+# en un proceso nuevo que atiende la cola. "proceso": los atiende un servicio dentro de
+# este proceso, con los artefactos del modelo ya cargados (sin arranque de intérprete
+# ni imports por submit)
+MODO_API = os.environ.get("MODO_API", "subproceso")
+servicio = None
+if MODO_API == "proceso":
+    from src.servicio import ServicioPrediccion  # pylint: disable=import-outside-toplevel
+
+    servicio = ServicioPrediccion()
+    servicio.iniciar()
+
+# Último lanzamiento de un proceso que atiende la cola (MODO_API=subproceso)
+ultimo_lanzamiento = 0.0
+lock_lanzamiento = threading.Lock()
+
+
+def lanzar_runner(trabajo: str = "--cola") -> int:
+    """Lanza src/__init__.py en un proceso nuevo que atiende la cola.
+    Parámetros:
+    - trabajo: id del trabajo recién encolado, o "--cola" para atender los pendientes
+    Retorno :
+    - pid del proceso lanzado
+    """
+    global ultimo_lanzamiento  # pylint: disable=global-statement
+
+    print("Ejecutar: ", COMANDO, " ", pScriptPython, " ", trabajo)
+    pid = subprocess.Popen([COMANDO, pScriptPython, trabajo], cwd=f"""/{PROYECTO}/src/ds""").pid
+    print("PID: ", pid)
+    with lock_lanzamiento:
+        ultimo_lanzamiento = time.monotonic()
+    return pid
+
+
+def relanzar_si_hay_pendientes(resumen: dict, forzar: bool = False) -> bool:
+    """Con MODO_API=subproceso ningún proceso espera la cola: si hay trabajos en cola
+    o con el lease vencido y lugar según JOBS_CONCURRENTES, lanza un proceso que los
+    atienda. Sin forzar no se relanza mientras el último lanzamiento tenga menos de
+    JOBS_LEASE_S segundos (todavía puede estar arrancando).
+    Parámetros:
+    - resumen: estado de la cola (jobs.resumen)
+    - forzar: Opcional - ignora el último lanzamiento (ej.: después de /kill)
+    Retorno :
+    - True si se lanzó un proceso
+    """
+    if servicio is not None:
+        return False
+    if not (resumen["en_cola"] or resumen["vencidos"]):
+        return False
+    if len(resumen["en_ejecucion"]) >= config.JOBS_CONCURRENTES:
+        return False
+    with lock_lanzamiento:
+        if not forzar and time.monotonic() - ultimo_lanzamiento < config.JOBS_LEASE_S:
+            return False
+    lanzar_runner()
+    return True
 
 
 @api.route("/")
@@ -37,15 +143,20 @@ def init():
 
 @api.route("/submit")
 def submit():
-    """endpoint (/submit) - Ejecución del proceso que ejecuta el modelo.
-    Chequea que no haya otro proceso en ejecución. En ese caso, inicia la ejecución.
-    Retorna "OK" como status si no hay errores en el submit.
+    """endpoint (/submit) - Encola un lote del proceso que ejecuta el modelo.
+    Los lotes se ejecutan en orden, de a uno (JOBS_CONCURRENTES = 1).
+    Retorna "OK" como status y el id del trabajo si no hay errores en el submit.
     Parámetros:
     - ambiente: DEV, TEST o PRD (para que el Blob Storage apunte al ambiente correspondiente)
     - fecha_ejecucion: Opcional - se utiliza para asegurar que los datos de entrada
     son capturados desde el mismo momento para todos los pozos.
+    - workers: Opcional - cantidad de procesos para predecir los archivos en paralelo
+    (hasta N_WORKERS_MAX; con MODO_API=proceso los archivos se predicen de a uno).
+    - modo: Opcional - "lote" o "pipeline" (descarga, predicción y subida solapadas).
+    - formatos: Opcional - formatos de las tablas de salida separados por coma
+    (parquet, csv, xlsx). Valor default: csv.
     Retorno :
-    - JSON con el estado del submit y el timestamp
+    - JSON con el estado del submit, el timestamp y el id del trabajo
     """
     ambiente = request.args.get("ambiente")
     if ambiente == "":
@@ -55,100 +166,228 @@ def submit():
     # seteo la variable de ambiente para que la usen los procesos posteriores
     os.environ["AMBIENTE"] = ambiente
 
-    out = ""
-    hora = ""
-    status = ""
+    # workers, modo y formatos se guardan con el trabajo y se aplican al ejecutarlo
+    opciones = {
+        "workers": request.args.get("workers"),
+        "modo": request.args.get("modo"),
+        "formatos": request.args.get("formatos"),
+    }
 
-    try:
-        with open(flag_file, "r", encoding="utf-8") as fflag:
-            status = fflag.read()
-            hora = time.ctime(os.path.getmtime(flag_file))
-            if status == "PROCESANDO":
-                out = f"""API de {PROYECTO} ya se estaba ejecutando. \
-                    Consultar status utilizando /check"""
-    except OSError:
-        out = "Error. No se pudo hacer submit()"
-        print(f"""Error : {traceback.format_exc()}""")
-        out = traceback.format_exc()
+    if servicio is not None:
+        trabajo = servicio.encolar(opciones)
+        return json.dumps({"status": "OK", "hora": time.ctime(), "trabajo": trabajo})
 
-    # si out está vacío: no hubo errores y la API no se estaba ejecutando, continuo con el submit
-    if out == "":
-        _id = uuid.uuid4()
+    try:
+        trabajo = jobs.crear({k: v for k, v in opciones.items() if v})
 
-        log_file = "{}.log".format(id)
+        log_file = "{}.log".format(trabajo)
         open(os.path.join(log_dir, log_file), "w", encoding="utf-8")
-        print("Ejecutar: ", COMANDO, " ", pScriptPython)
-        pid = subprocess.Popen([COMANDO, pScriptPython], cwd=f"""/{PROYECTO}/src/ds""").pid
-        print("PID: ", pid)
-
-        with open(pid_file, "w", encoding="utf-8") as fpid:
-            fpid.write(str(pid))
-        out = "OK"
-        # tomo el horario de modificación del archivo pid_file (horario en que se disparó la API)
-        hora = time.ctime(os.path.getmtime(pid_file))
+        # El proceso toma este trabajo (o lo deja en cola si ya hay JOBS_CONCURRENTES en
+        # ejecución: lo toma el proceso en curso al terminar el suyo)
+        lanzar_runner(trabajo)
+    except (OSError, ValueError):
+        print(f"""Error : {traceback.format_exc()}""")
+        return json.dumps({"status": traceback.format_exc(), "hora": time.ctime()})
 
-    return json.dumps({"status": "".join(out), "hora": "".join(hora)})
+    return json.dumps({"status": "OK", "hora": time.ctime(), "trabajo": trabajo})
 
 
 @api.route("/check")
 def check():
     """endpoint (/check) - Chequeo del status de la API
-    Devuelve el status que esta guardado en el archivo flag_file
+    El status es PROCESANDO mientras haya trabajos en ejecución con lease vigente
+    (un proceso caído deja de renovarlo y su trabajo vuelve a asignarse), si no STANDBY.
+    Si hay trabajos en cola o con el lease vencido y ningún proceso que los atienda,
+    lanza uno (MODO_API=subproceso).
+    Parámetros:
+    - trabajo: Opcional - id devuelto por /submit
     Retorno :
-    - JSON con el estado de la API y el timestamp
+    - JSON con el estado de la API, el timestamp, los trabajos en cola y con el lease
+    vencido, el avance de los trabajos en ejecución (archivos hechos y total), si se
+    lanzó un proceso para la cola (relanzado) y el estado del trabajo pedido
     """
-    out = "Ha ocurrido un error en el check()"
-    hora = ""
     try:
-        with open(flag_file, "r", encoding="utf-8") as fflag:
-            out = fflag.read()
-            hora = time.ctime(os.path.getmtime(flag_file))
-    except OSError:
-        pass
+        respuesta = jobs.resumen()
+        respuesta["relanzado"] = relanzar_si_hay_pendientes(respuesta)
+    except Exception:  # pylint: disable=broad-except
+        return json.dumps(
+            {"status": "Ha ocurrido un error en el check()", "error": traceback.format_exc()}
+        )
 
-    return json.dumps({"status": "".join(out), "hora": "".join(hora)})
+    respuesta["hora"] = time.ctime()
+    trabajo = request.args.get("trabajo")
+    if trabajo:
+        respuesta["trabajo"] = jobs.obtener(trabajo)
+
+    return json.dumps(respuesta)
 
 
 @api.route("/kill")
 def kill():
-    """endpoint (/check) - Detiene el proceso que se está ejecutando y
-    escribe el status de la api en flag_file en "STANDBY"
+    """endpoint (/kill) - Detiene los procesos que están ejecutando trabajos y marca
+    esos trabajos como ERROR. Con MODO_API=proceso no se detiene ningún proceso (el
+    lote corre dentro de la API): se marcan los trabajos y el lote se interrumpe antes
+    del próximo archivo (pierde el lease). Los trabajos que siguen
+    en cola los atiende un proceso nuevo (MODO_API=subproceso).
     Retorno :
-    - JSON con el estado de la API y el timestamp
+    - JSON con el estado de la API, el timestamp, los trabajos cancelados y si se
+    lanzó un proceso para la cola (relanzado)
     """
-    out = ""
-    hora = time.ctime(os.path.getmtime(flag_file))
+    out = "KILLED"
     try:
-        with open(pid_file, "r", encoding="utf-8") as fpid:
-            pid = fpid.read()
-        os.kill(int(pid), 9)
-        out = "KILLED"
-        try:
-            with open(flag_file, "w", encoding="utf-8") as fflag:
-                fflag.write("STANDBY")
-        except OSError:
-            out = "Error. Se pudo hacer el kill pero no se actualizo fflag"
-    except OSError:
-        out = " Error. No se pudo hacer el kill: " + str(pid)
+        activos = jobs.resumen()["en_ejecucion"]
+        if servicio is None:
+            for trabajo in activos:
+                # worker = host:pid:hilo (ver jobs.nuevo_worker)
+                host, pid, _ = trabajo["worker"].split(":")
+                if host == socket.gethostname():
+                    try:
+                        os.kill(int(pid), signal.SIGKILL)
+                    except OSError:
+                        out = " Error. No se pudo hacer el kill: " + pid
+        cancelados = jobs.cancelar_activos("Cancelado con /kill")
+        relanzado = relanzar_si_hay_pendientes(jobs.resumen(), forzar=True)
+    except Exception:  # pylint: disable=broad-except
+        return json.dumps({"status": "Error. No se pudo hacer el kill", "hora": time.ctime()})
+
+    return json.dumps(
+        {"status": out, "hora": time.ctime(), "cancelados": cancelados, "relanzado": relanzado}
+    )
+
+
+@api.route("/predict", methods=["POST"])
+def predict():
+    """endpoint (/predict) - Predicción sincrónica de un perfil LAS.
+    Recibe el perfil como archivo multipart ("file") o como cuerpo de la petición, lo
+    predice en memoria con los artefactos ya cargados y devuelve el resultado.
+    Parámetros:
+    - formato: Opcional - "json" (todos los modelos), "las" o "parquet". Valor default: json.
+    - modelo: Opcional - resultado a devolver en las/parquet (TOC_COE, TOC_Cuervo o un
+    mineral). Valor default: TOC_COE.
+    Retorno :
+    - Resultado en el formato pedido. 400 si el perfil no se puede predecir, 413 si
+    supera PREDICT_MAX_BYTES y 429 si ya hay PREDICT_MAX_CONCURRENTES en curso.
+    """
+    if not predicciones_en_curso.acquire(blocking=False):
+        metricas_predict.registrar("rechazadas")
+        return Response(
+            json.dumps({"error": "Demasiadas predicciones en curso"}),
+            status=429,
+            mimetype="application/json",
+        )
+
+    inicio = time.perf_counter()
+    try:
+        # cargo_las trabaja sobre un path: el cuerpo se copia por bloques a un temporal
+        with tempfile.NamedTemporaryFile(suffix=".las") as temporal:
+            origen = request.files["file"].stream if "file" in request.files else request.stream
+            shutil.copyfileobj(origen, temporal)
+            temporal.flush()
 
-    return json.dumps({"status": "".join(out), "hora": "".join(hora)})
+            from src.servicio import predecir_perfil  # pylint: disable=import-outside-toplevel
+
+            contenido, mimetype = predecir_perfil(
+                temporal.name,
+                formato=request.args.get("formato", "json"),
+                modelo=request.args.get("modelo", "TOC_COE"),
+            )
+    except HTTPException:
+        # ej.: 413 si el cuerpo supera MAX_CONTENT_LENGTH
+        metricas_predict.registrar("rechazadas")
+        raise
+    except ValueError as e:
+        metricas_predict.registrar("error", time.perf_counter() - inicio)
+        return Response(json.dumps({"error": str(e)}), status=400, mimetype="application/json")
+    except Exception:  # pylint: disable=broad-except
+        metricas_predict.registrar("error", time.perf_counter() - inicio)
+        print(f"""Error : {traceback.format_exc()}""")
+        return Response(
+            json.dumps({"error": traceback.format_exc()}), status=500, mimetype="application/json"
+        )
+    finally:
+        predicciones_en_curso.release()
+
+    metricas_predict.registrar("ok", time.perf_counter() - inicio)
+    return Response(contenido, mimetype=mimetype)
+
+
+@api.route("/metrics")
+def metrics():
+    """endpoint (/metrics) - Métricas de /predict
+    Retorno :
+    - JSON con peticiones ok, con error y rechazadas, y latencia p50/p99 (ms)
+    """
+    return json.dumps({"predict": metricas_predict.resumen()})
 
 
 @api.route("/getlogger")
 def getlogger():
-    """endpoint (/getlogger) - Permite ver el logueo que se está generando
+    """endpoint (/getlogger) - Permite ver el logueo que se está generando.
+    Devuelve solo los bytes nuevos desde el offset de la consulta anterior.
+    Parámetros:
+    - since: Opcional - offset devuelto por la consulta anterior. Sin since se
+    devuelve el final del log (los últimos `limite` bytes).
+    - limite: Opcional - bytes máximos por respuesta. Valor default: 1 MB.
+    - inodo: Opcional - inodo devuelto por la consulta anterior (detecta la rotación).
+    - trabajo: Opcional - id de trabajo: solo sus registros.
+    - incluir: Opcional - `incluir` devuelto por la consulta anterior con el mismo trabajo
+    (no se pierden las líneas de un registro cortado entre dos respuestas).
     Retorno :
-    - JSON con el contenido del log
+    - JSON con el contenido del log, el offset para la próxima consulta, el inodo,
+    si el log rotó, si se llegó al final (completo) y el estado del filtro (incluir)
     """
     try:
-        with open(f"""/{PROYECTO}/logs/info.log""", encoding="utf-8") as f:
-            contents = f.read()
-            print(contents)
-            return json.dumps({"logger": "".join(contents)})
+        since = request.args.get("since", type=int)
+        limite = request.args.get("limite", default=log_tail.LIMITE, type=int)
+        inodo = request.args.get("inodo", type=int)
+        return json.dumps(
+            log_tail.leer_desde(
+                since=since,
+                limite=max(1, limite),
+                trabajo=request.args.get("trabajo"),
+                inodo=inodo,
+                incluir=request.args.get("incluir", "").lower() in ("1", "true"),
+            )
+        )
     except OSError:
         contents = "Error. No se pudo abrir el archivo de log"
         return json.dumps({"logger": "".join(contents), "error": "".join(traceback.format_exc())})
 
 
+@api.route("/getlogger/stream")
+def getlogger_stream():
+    """endpoint (/getlogger/stream) - Stream (server-sent events) de las líneas nuevas
+    del log. El id de cada evento es el offset: al reconectar, el cliente lo envía en
+    Last-Event-ID y el stream sigue desde ahí.
+    Parámetros:
+    - since: Opcional - offset desde donde empezar. Valor default: el final del log.
+    - trabajo: Opcional - id de trabajo: solo sus registros.
+    Retorno :
+    - text/event-stream con un evento por bloque de líneas nuevas
+    """
+    since = request.args.get("since", type=int)
+    ultimo_evento = request.headers.get("Last-Event-ID", "")
+    if ultimo_evento.isdigit():
+        since = int(ultimo_evento)
+
+    def eventos(lineas):
+        # se envía algo de inmediato para que el cliente reciba los headers
+        yield ": conectado\n\n"
+        for offset, texto in lineas:
+            if not texto:
+                # comentario SSE: mantiene viva la conexión y detecta clientes desconectados
+                yield ": latido\n\n"
+                continue
+            datos = "".join(f"data: {linea}\n" for linea in texto.splitlines())
+            yield f"id: {offset}\n{datos}\n"
+
+    return Response(
+        eventos(log_tail.seguir(since=since, trabajo=request.args.get("trabajo"))),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
-    api.run(debug=True, host="0.0.0.0", port="443")
+    # El reloader de debug importaría el módulo dos veces (y cargaría dos servicios)
+    api.run(debug=True, host="0.0.0.0", port="443", use_reloader=servicio is None)
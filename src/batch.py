@@ -0,0 +1,749 @@
+"""utilidades de ejecución por lotes"""
+
+import contextvars
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import config
+from config.config import logger
+from main import load_artifacts, predict
+from src import data as data_process
+from src import jobs
+from src import utils
+
+# Marca de fin de stream entre las etapas del pipeline
+_FIN = None
+
+# Opciones de un trabajo que se aplican sobre config: opción -> (atributo de config, tipo)
+def _workers(valor: str) -> int:
+    """Procesos pedidos por un trabajo, acotados a [1, config.N_WORKERS_MAX]"""
+
+    return max(1, min(int(valor), config.N_WORKERS_MAX))
+
+
+OPCIONES = {
+    "workers": ("N_WORKERS", _workers),
+    "modo": ("MODO_LOTE", str),
+    "formatos": ("FORMATOS_SALIDA", str),
+}
+
+# Avance de un lote: archivos terminados y total (None si todavía no se conoce)
+Progreso = Callable[[int, Optional[int]], None]
+
+
+def procesar_archivo(file_name: str) -> Dict:
+    """
+    Ejecuta la predicción de un archivo y comprime su directorio de salida.
+    Los errores se capturan y se devuelven en el resultado para que el proceso
+    que coordina el lote los registre sin interrumpir el resto de los archivos.
+
+    Args:
+        file_name (str): nombre del archivo .las en la carpeta input
+
+    Returns:
+        Dict: resultado de la ejecución (archivo, ok, error, duracion)
+    """
+
+    inicio = time.perf_counter()
+    resultado = {"archivo": file_name, "ok": True, "error": None}
+    try:
+        # Llamado a la función principal
+        predict(file_name)
+
+        # Comprime el directorio generado por la predicción para enviarlo al usuario
+        output_path = config.DATA_OUTPUT_DIR.joinpath(file_name)
+        logger.info("[procesar_archivo] comprimir_directorio: %s", output_path)
+        utils.comprimir_directorio(output_path, output_path)
+
+    except Exception:  # pylint: disable=broad-except
+        resultado["ok"] = False
+        resultado["error"] = traceback.format_exc()
+
+    resultado["duracion"] = time.perf_counter() - inicio
+
+    return resultado
+
+
+def subir_resultado(file_name: str):
+    """
+    Sube al Blob Storage solo las salidas de un archivo: el .zip de output y
+    el perfil movido a processed. No toca los archivos de otras predicciones
+    que puedan estar escribiéndose en paralelo.
+
+    Args:
+        file_name (str): nombre del archivo .las procesado
+    """
+
+    destinos = [
+        (config.DATA_OUTPUT_DIR.joinpath(file_name + ".zip"), "output/" + file_name + ".zip"),
+        (config.DATA_PROCESSED_DIR.joinpath(file_name), "processed/" + file_name),
+    ]
+    for local_file, blob_name in destinos:
+        if local_file.is_file():
+            data_process.upload_file_to_blob_storage(
+                storage_account_key=config.STORAGE_ACCOUNT_KEY,
+                container_name=config.CONTAINER_NAME,
+                local_file=local_file,
+                blob_name=blob_name,
+            )
+
+
+def _registrar_resultado(resultado: Dict):
+    """
+    Registra en el log el resultado de un archivo
+
+    Args:
+        resultado (Dict): resultado devuelto por procesar_archivo
+    """
+
+    if resultado["ok"]:
+        logger.info(
+            "[ejecutar_lote] %s procesado en %.1f s", resultado["archivo"], resultado["duracion"]
+        )
+    else:
+        logger.error(
+            "[ejecutar_lote] Error procesando %s:\n%s", resultado["archivo"], resultado["error"]
+        )
+
+
+def crear_pool(n_workers: int) -> Optional[ProcessPoolExecutor]:
+    """
+    Crea el pool de procesos de predicción. Los artefactos del modelo se cargan antes
+    del fork, así los procesos hijos los heredan ya cargados, y todos los procesos se
+    crean en el momento: el fork ocurre antes de arrancar cualquier hilo (heartbeat del
+    trabajo, etapas del pipeline) que pueda tener locks tomados.
+
+    Args:
+        n_workers (int): cantidad de procesos
+
+    Returns:
+        Optional[ProcessPoolExecutor]: pool de procesos, o None si n_workers <= 1
+    """
+
+    if n_workers <= 1:
+        return None
+
+    load_artifacts()
+    executor = ProcessPoolExecutor(
+        max_workers=n_workers, mp_context=multiprocessing.get_context("fork")
+    )
+    # Con fork el pool crea todos sus procesos en el primer submit
+    executor.submit(int).result()
+    return executor
+
+
+def ejecutar_lote(
+    files: List[str],
+    n_workers: int = config.N_WORKERS,
+    progreso: Optional[Progreso] = None,
+    executor: Optional[ProcessPoolExecutor] = None,
+    perdido: Optional[threading.Event] = None,
+) -> List[Dict]:
+    """
+    Ejecuta la predicción de una lista de archivos.
+
+    Con n_workers > 1 los archivos se predicen en un pool de procesos. Los artefactos
+    del modelo se cargan antes de crear el pool, de modo que los procesos hijos
+    (fork) los heredan ya cargados. La subida de resultados al Blob Storage la hace
+    el proceso principal a medida que termina cada archivo.
+
+    Args:
+        files (List[str]): nombres de los archivos descargados en la carpeta input
+        n_workers (int, optional): cantidad de procesos. Valor default es config.N_WORKERS.
+        progreso (Optional[Progreso], optional): se llama al terminar cada archivo.
+            Valor default es None.
+        executor (Optional[ProcessPoolExecutor], optional): pool ya creado con crear_pool
+            (no se cierra al terminar). Valor default es None (se crea uno para el lote).
+        perdido (Optional[threading.Event], optional): se activa si el trabajo pierde su
+            lease (ver _verificar_lease). Valor default es None.
+
+    Raises:
+        jobs.LeasePerdido: si el trabajo perdió su lease (se verifica entre archivos)
+
+    Returns:
+        List[Dict]: resultado de cada archivo, en el orden en que terminaron
+    """
+
+    # Carga única de los artefactos del modelo. Cada llamado a predict() los
+    # reutiliza desde la caché del proceso mientras no cambien en disco
+    load_artifacts()
+
+    resultados = []
+    if n_workers <= 1 or len(files) <= 1:
+        for file_name in files:
+            _verificar_lease(perdido)
+            logger.info("[ejecutar_lote] archivo: %s", file_name)
+            resultado = procesar_archivo(file_name)
+            _registrar_resultado(resultado)
+            resultados.append(resultado)
+            if progreso is not None:
+                progreso(len(resultados), len(files))
+
+            # Copia de datos desde la carpeta local al Blob Storage
+            data_process.upload_data_to_blob_storage(
+                storage_account_key=config.STORAGE_ACCOUNT_KEY,
+                container_name=config.CONTAINER_NAME,
+                output_fp=config.DATA_OUTPUT_DIR,
+                processed_fp=config.DATA_PROCESSED_DIR,
+            )
+
+        return resultados
+
+    logger.info("[ejecutar_lote] %s archivos con %s procesos", len(files), n_workers)
+    propio = executor is None
+    if propio:
+        executor = crear_pool(n_workers)
+    try:
+        futures = {executor.submit(procesar_archivo, file_name): file_name for file_name in files}
+        for future in as_completed(futures):
+            file_name = futures[future]
+            try:
+                resultado = future.result()
+            except Exception:  # pylint: disable=broad-except
+                # el proceso hijo terminó de forma anormal
+                resultado = _resultado_error(file_name)
+            _registrar_resultado(resultado)
+            resultados.append(resultado)
+            subir_resultado(file_name)
+            if progreso is not None:
+                progreso(len(resultados), len(files))
+            if perdido is not None and perdido.is_set():
+                # los archivos que todavía no empezaron no se procesan
+                for pendiente in futures:
+                    pendiente.cancel()
+                _verificar_lease(perdido)
+    finally:
+        if propio:
+            executor.shutdown()
+
+    # Sube lo que haya quedado en las carpetas locales (ej.: perfiles con error de lectura)
+    data_process.upload_data_to_blob_storage(
+        storage_account_key=config.STORAGE_ACCOUNT_KEY,
+        container_name=config.CONTAINER_NAME,
+        output_fp=config.DATA_OUTPUT_DIR,
+        processed_fp=config.DATA_PROCESSED_DIR,
+    )
+
+    return resultados
+
+
+def _verificar_lease(perdido: Optional[threading.Event]):
+    """
+    Interrumpe el lote si el trabajo dejó de estar asignado a este worker
+
+    Args:
+        perdido (Optional[threading.Event]): jobs.Heartbeat.perdido o None
+
+    Raises:
+        jobs.LeasePerdido: si el evento está activo
+    """
+
+    if perdido is not None and perdido.is_set():
+        raise jobs.LeasePerdido("Se perdió el lease del trabajo: se interrumpe el lote")
+
+
+def _resultado_error(file_name: str) -> Dict:
+    """
+    Arma el resultado de un archivo que falló fuera de procesar_archivo
+
+    Args:
+        file_name (str): nombre del archivo
+
+    Returns:
+        Dict: resultado con la traza de la excepción en curso
+    """
+
+    return {"archivo": file_name, "ok": False, "error": traceback.format_exc(), "duracion": None}
+
+
+def _etapa_descarga(
+    cola_descargas: queue.Queue, descargados: List[str], errores: List[Dict], listado: list
+):
+    """
+    Etapa de descarga del pipeline: baja los blobs de input uno a uno y los
+    encola para la predicción apenas quedan en disco. Con config.SYNC_INCREMENTAL
+    no vuelve a descargar los blobs sin cambios y omite los ya procesados.
+
+    Args:
+        cola_descargas (queue.Queue): cola hacia la etapa de predicción
+        descargados (List[str]): archivos descargados (se completa en la etapa)
+        errores (List[Dict]): resultados de los archivos que no se pudieron descargar
+        listado (list): blobs de input listados (se completa en la etapa)
+    """
+
+    manifest = None
+    try:
+        container_client = data_process.get_container_client(
+            config.STORAGE_ACCOUNT_KEY, config.CONTAINER_NAME
+        )
+        listado.extend(
+            data_process.list_input_blob_properties(
+                storage_account_key=config.STORAGE_ACCOUNT_KEY,
+                container_name=config.CONTAINER_NAME,
+            )
+        )
+        logger.info("[pipeline] %s archivos en input", len(listado))
+        if config.SYNC_INCREMENTAL:
+            manifest = data_process.read_manifest(config.BLOB_MANIFEST)
+
+        for blob in listado:
+            file_name = blob.name.split("/")[1]
+            try:
+                if manifest is not None:
+                    procesar = data_process.sync_input_blob(
+                        container_client,
+                        blob,
+                        config.DATA_INPUT_DIR,
+                        manifest,
+                    )
+                    if not procesar:
+                        logger.info("[pipeline] %s ya fue procesado", file_name)
+                        continue
+                else:
+                    data_process.download_data_from_blob_storage(
+                        storage_account_key=config.STORAGE_ACCOUNT_KEY,
+                        container_name=config.CONTAINER_NAME,
+                        local_fp=config.DATA_INPUT_DIR,
+                        blob_name=file_name,
+                    )
+            except Exception:  # pylint: disable=broad-except
+                errores.append(_resultado_error(file_name))
+                continue
+            descargados.append(file_name)
+            cola_descargas.put(file_name)
+    except Exception:  # pylint: disable=broad-except
+        logger.error("[pipeline] Error listando los blobs de input:\n%s", traceback.format_exc())
+    finally:
+        if manifest is not None:
+            data_process.write_manifest(config.BLOB_MANIFEST, manifest)
+        cola_descargas.put(_FIN)
+
+
+def _etapa_subida(cola_subidas: queue.Queue):
+    """
+    Etapa de subida del pipeline: sube las salidas de cada archivo apenas termina su predicción
+
+    Args:
+        cola_subidas (queue.Queue): cola con los archivos ya procesados
+    """
+
+    while True:
+        file_name = cola_subidas.get()
+        if file_name is _FIN:
+            return
+        try:
+            subir_resultado(file_name)
+        except Exception:  # pylint: disable=broad-except
+            logger.error(
+                "[pipeline] Error subiendo las salidas de %s:\n%s",
+                file_name,
+                traceback.format_exc(),
+            )
+
+
+def _etapa_prediccion(
+    cola_descargas: queue.Queue,
+    cola_subidas: queue.Queue,
+    executor: Optional[ProcessPoolExecutor],
+    n_workers: int,
+    progreso: Optional[Progreso] = None,
+    perdido: Optional[threading.Event] = None,
+) -> List[Dict]:
+    """
+    Etapa de predicción del pipeline. Sin executor predice en el proceso actual;
+    con executor mantiene como máximo n_workers archivos en vuelo, de modo que la
+    cola de descargas acotada frena a la etapa de descarga.
+
+    Args:
+        cola_descargas (queue.Queue): archivos listos para predecir
+        cola_subidas (queue.Queue): archivos listos para subir
+        executor (Optional[ProcessPoolExecutor]): pool de procesos o None
+        n_workers (int): cantidad de procesos del pool
+        progreso (Optional[Progreso], optional): se llama al terminar cada archivo
+            (el total no se conoce mientras se descarga). Valor default es None.
+        perdido (Optional[threading.Event], optional): se activa si el trabajo pierde su
+            lease. Valor default es None.
+
+    Raises:
+        jobs.LeasePerdido: si el trabajo perdió su lease (no se envían más archivos)
+
+    Returns:
+        List[Dict]: resultado de cada archivo
+    """
+
+    resultados = []
+    if executor is None:
+        while True:
+            file_name = cola_descargas.get()
+            if file_name is _FIN:
+                return resultados
+            _verificar_lease(perdido)
+            logger.info("[pipeline] archivo: %s", file_name)
+            resultado = procesar_archivo(file_name)
+            _registrar_resultado(resultado)
+            resultados.append(resultado)
+            cola_subidas.put(file_name)
+            if progreso is not None:
+                progreso(len(resultados), None)
+
+    pendientes = {}
+    fin_descargas = False
+    while not fin_descargas or pendientes:
+        while not fin_descargas and len(pendientes) < n_workers:
+            try:
+                file_name = cola_descargas.get(block=not pendientes)
+            except queue.Empty:
+                break
+            if file_name is _FIN:
+                fin_descargas = True
+                break
+            _verificar_lease(perdido)
+            logger.info("[pipeline] archivo: %s", file_name)
+            pendientes[executor.submit(procesar_archivo, file_name)] = file_name
+
+        if pendientes:
+            terminados, _ = wait(pendientes, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in terminados:
+                file_name = pendientes.pop(future)
+                try:
+                    resultado = future.result()
+                except Exception:  # pylint: disable=broad-except
+                    resultado = _resultado_error(file_name)
+                _registrar_resultado(resultado)
+                resultados.append(resultado)
+                cola_subidas.put(file_name)
+                if progreso is not None:
+                    progreso(len(resultados), None)
+
+    return resultados
+
+
+def ejecutar_pipeline(
+    n_workers: int = config.N_WORKERS,
+    tamano_cola: int = config.TAMANO_COLA_PIPELINE,
+    progreso: Optional[Progreso] = None,
+    executor: Optional[ProcessPoolExecutor] = None,
+    perdido: Optional[threading.Event] = None,
+) -> Tuple[List[str], List[Dict], list]:
+    """
+    Ejecuta el lote como un pipeline de tres etapas concurrentes conectadas por
+    colas acotadas: descarga de blobs, predicción y subida de resultados. El primer
+    archivo se predice y se sube mientras los siguientes todavía se descargan.
+
+    Args:
+        n_workers (int, optional): procesos para la etapa de predicción.
+            Valor default es config.N_WORKERS.
+        tamano_cola (int, optional): archivos que pueden esperar entre etapas.
+            Valor default es config.TAMANO_COLA_PIPELINE.
+        progreso (Optional[Progreso], optional): se llama al terminar cada archivo.
+            Valor default es None.
+        executor (Optional[ProcessPoolExecutor], optional): pool ya creado con crear_pool
+            (no se cierra al terminar). Valor default es None (se crea uno para el lote).
+        perdido (Optional[threading.Event], optional): se activa si el trabajo pierde su
+            lease. Valor default es None.
+
+    Raises:
+        jobs.LeasePerdido: si el trabajo perdió su lease
+
+    Returns:
+        Tuple[List[str], List[Dict], list]: archivos descargados, resultado de cada archivo
+            y listado de blobs de input (para reutilizarlo en clean_data)
+    """
+
+    load_artifacts()
+
+    cola_descargas = queue.Queue(maxsize=tamano_cola)
+    cola_subidas = queue.Queue(maxsize=tamano_cola)
+    descargados = []
+    errores_descarga = []
+    listado = []
+
+    # El pool se crea antes de arrancar los hilos de descarga y subida
+    propio = executor is None
+    if propio:
+        executor = crear_pool(n_workers)
+
+    # Los hilos se ejecutan en una copia del contexto: sus registros del log llevan
+    # el id del trabajo (config.TRABAJO_ACTUAL)
+    hilo_descarga = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(_etapa_descarga, cola_descargas, descargados, errores_descarga, listado),
+        name="pipeline-descarga",
+    )
+    hilo_subida = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(_etapa_subida, cola_subidas),
+        name="pipeline-subida",
+    )
+    hilo_descarga.start()
+    hilo_subida.start()
+
+    try:
+        resultados = _etapa_prediccion(
+            cola_descargas, cola_subidas, executor, n_workers, progreso, perdido
+        )
+    finally:
+        cola_subidas.put(_FIN)
+        # Si la predicción se cortó, se vacía la cola para que la descarga no quede bloqueada
+        while hilo_descarga.is_alive():
+            try:
+                cola_descargas.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        hilo_descarga.join()
+        hilo_subida.join()
+        if propio and executor is not None:
+            executor.shutdown()
+
+    for resultado in errores_descarga:
+        _registrar_resultado(resultado)
+    resultados.extend(errores_descarga)
+    if progreso is not None:
+        progreso(len(resultados), len(resultados))
+
+    # Sube lo que haya quedado en las carpetas locales (ej.: perfiles con error de lectura)
+    data_process.upload_data_to_blob_storage(
+        storage_account_key=config.STORAGE_ACCOUNT_KEY,
+        container_name=config.CONTAINER_NAME,
+        output_fp=config.DATA_OUTPUT_DIR,
+        processed_fp=config.DATA_PROCESSED_DIR,
+    )
+
+    return descargados, resultados, listado
+
+
+def ejecutar_proceso(
+    n_workers: Optional[int] = None,
+    modo: Optional[str] = None,
+    progreso: Optional[Progreso] = None,
+    executor: Optional[ProcessPoolExecutor] = None,
+    perdido: Optional[threading.Event] = None,
+) -> Tuple[List[Dict], list]:
+    """
+    Ejecuta un lote completo: descarga de input, predicción, compresión y subida de
+    resultados, según config.MODO_LOTE y config.SYNC_INCREMENTAL. La configuración se
+    lee al momento de la llamada, así el servicio en proceso puede cambiarla por trabajo.
+
+    Args:
+        n_workers (Optional[int], optional): procesos de predicción.
+            Valor default es None (config.N_WORKERS).
+        modo (Optional[str], optional): "lote" o "pipeline".
+            Valor default es None (config.MODO_LOTE).
+        progreso (Optional[Progreso], optional): se llama al terminar cada archivo.
+            Valor default es None.
+        executor (Optional[ProcessPoolExecutor], optional): pool ya creado con crear_pool.
+            Valor default es None (cada etapa crea el suyo si n_workers > 1).
+        perdido (Optional[threading.Event], optional): se activa si el trabajo pierde su
+            lease: el lote se interrumpe entre archivos. Valor default es None.
+
+    Raises:
+        jobs.LeasePerdido: si el trabajo perdió su lease
+
+    Returns:
+        Tuple[List[Dict], list]: resultado de cada archivo y listado de blobs de input
+            (None si no se listó), para reutilizarlo en finalizar_proceso
+    """
+
+    n_workers = config.N_WORKERS if n_workers is None else n_workers
+    modo = config.MODO_LOTE if modo is None else modo
+
+    if modo == "pipeline":
+        # Descarga, predicción y subida de resultados solapadas
+        files, resultados, listado = ejecutar_pipeline(
+            n_workers=n_workers,
+            tamano_cola=config.TAMANO_COLA_PIPELINE,
+            progreso=progreso,
+            executor=executor,
+            perdido=perdido,
+        )
+        logger.info("Archivos descargados: %s", files)
+
+    elif config.SYNC_INCREMENTAL:
+        # Descarga solo los blobs nuevos o modificados (manifiesto local)
+        files, listado = data_process.sync_input_blobs(
+            storage_account_key=config.STORAGE_ACCOUNT_KEY,
+            container_name=config.CONTAINER_NAME,
+            local_fp=config.DATA_INPUT_DIR,
+        )
+        logger.info("Archivos a procesar: %s", files)
+
+        # Predicción, compresión y subida de resultados de cada archivo
+        resultados = ejecutar_lote(
+            files, n_workers=n_workers, progreso=progreso, executor=executor, perdido=perdido
+        )
+
+    else:
+        # Copia de datos desde el Blob Storage a la carpetas local
+        listado = None
+        files = data_process.download_data_from_blob_storage(
+            storage_account_key=config.STORAGE_ACCOUNT_KEY,
+            container_name=config.CONTAINER_NAME,
+            local_fp=config.DATA_INPUT_DIR,
+            blob_name=None,
+        )
+        logger.info("Archivos descargados: %s", files)
+
+        # Predicción, compresión y subida de resultados de cada archivo
+        resultados = ejecutar_lote(
+            files, n_workers=n_workers, progreso=progreso, executor=executor, perdido=perdido
+        )
+
+    # Un lease perdido durante el último archivo también interrumpe el cierre del lote
+    _verificar_lease(perdido)
+
+    if config.SYNC_INCREMENTAL:
+        # la próxima sincronización no vuelve a descargar los que terminaron bien
+        data_process.marcar_procesados(
+            config.BLOB_MANIFEST, [r["archivo"] for r in resultados if r["ok"]]
+        )
+
+    errores = [r["archivo"] for r in resultados if not r["ok"]]
+    logger.info(
+        "[ejecutar_proceso] Archivos procesados: %s, con error: %s", len(resultados), len(errores)
+    )
+    if errores:
+        logger.error("[ejecutar_proceso] Archivos con error: %s", errores)
+
+    return resultados, listado
+
+
+def finalizar_proceso(listado: Optional[list] = None):
+    """
+    Sube el log al Blob Storage y limpia los blobs de input ya procesados
+
+    Args:
+        listado (Optional[list], optional): listado de blobs de input devuelto por
+            ejecutar_proceso. Valor default es None (se lista el container).
+    """
+
+    # Almacenamiento del log en el Blob Storage
+    data_process.upload_log_to_blob_storage(
+        storage_account_key=config.STORAGE_ACCOUNT_KEY, container_name=config.CONTAINER_NAME
+    )
+    # Se reutiliza el listado de input (si lo hay) para no listar el container otra vez
+    data_process.clean_data(
+        storage_account_key=config.STORAGE_ACCOUNT_KEY,
+        container_name=config.CONTAINER_NAME,
+        blob_list=listado,
+    )
+
+
+def ejecutar_trabajo(trabajo: Dict, worker: str, procesos: bool = True):
+    """
+    Ejecuta un trabajo ya asignado al worker: aplica sus opciones sobre config
+    (se restauran al terminar), renueva su lease mientras dura el lote, registra el
+    avance por archivo y lo cierra como FINALIZADO o ERROR. Los registros del log
+    del trabajo llevan su id (config.TRABAJO_ACTUAL).
+
+    Args:
+        trabajo (Dict): trabajo devuelto por jobs.tomar
+        worker (str): identificador del worker que lo tomó
+        procesos (bool, optional): permite el pool de procesos (fork) si el trabajo
+            usa más de un worker. Valor default es True.
+    """
+
+    token = config.TRABAJO_ACTUAL.set(trabajo["id"])
+    try:
+        _ejecutar_trabajo(trabajo, worker, procesos)
+    finally:
+        config.TRABAJO_ACTUAL.reset(token)
+
+
+def _ejecutar_trabajo(trabajo: Dict, worker: str, procesos: bool):
+    """Cuerpo de ejecutar_trabajo"""
+
+    trabajo_id = trabajo["id"]
+    previas = {atributo: getattr(config, atributo) for atributo, _ in OPCIONES.values()}
+    logger.info("[ejecutar_trabajo] Trabajo %s (%s)", trabajo_id, trabajo["opciones"])
+
+    def progreso(hechos: int, total: Optional[int]):
+        try:
+            jobs.progreso(trabajo_id, hechos, total)
+        except Exception:  # pylint: disable=broad-except
+            logger.error(
+                "[ejecutar_trabajo] Error registrando el avance:\n%s", traceback.format_exc()
+            )
+
+    listado = None
+    executor = None
+    abortado = False
+    try:
+        for opcion, valor in trabajo["opciones"].items():
+            if opcion in OPCIONES and valor:
+                atributo, tipo = OPCIONES[opcion]
+                setattr(config, atributo, tipo(valor))
+
+        # Sin procesos (ej.: dentro de la API, con hilos de Flask) el lote es secuencial
+        n_workers = config.N_WORKERS if procesos else 1
+        # El pool se crea antes que el hilo del heartbeat: el fork no copia sus locks.
+        # Mientras tanto el trabajo conserva el lease que le dio jobs.tomar.
+        executor = crear_pool(n_workers)
+        with jobs.Heartbeat(trabajo_id, worker, lease_s=config.JOBS_LEASE_S) as latido:
+            resultados, listado = ejecutar_proceso(
+                n_workers=n_workers, progreso=progreso, executor=executor, perdido=latido.perdido
+            )
+        jobs.finalizar(
+            trabajo_id,
+            worker,
+            jobs.FINALIZADO,
+            errores=[r["archivo"] for r in resultados if not r["ok"]],
+        )
+    except jobs.LeasePerdido:
+        # El trabajo ya no es de este worker: no se cierra ni se limpia su input, que
+        # puede estar procesando el worker que lo tomó
+        logger.error("[ejecutar_trabajo] Trabajo %s interrumpido: perdió el lease", trabajo_id)
+        abortado = True
+    except Exception:  # pylint: disable=broad-except
+        error = traceback.format_exc()
+        logger.error("[ejecutar_trabajo] Error en el trabajo %s:\n%s", trabajo_id, error)
+        jobs.finalizar(trabajo_id, worker, jobs.ERROR, error=error)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        for atributo, valor in previas.items():
+            setattr(config, atributo, valor)
+
+    if abortado:
+        return
+
+    # Almacenamiento del log en el Blob Storage y limpieza del input procesado
+    try:
+        finalizar_proceso(listado)
+    except Exception:  # pylint: disable=broad-except
+        logger.error("[ejecutar_trabajo] Error subiendo el log:\n%s", traceback.format_exc())
+
+
+def atender_trabajos(worker: Optional[str] = None, procesos: bool = True) -> int:
+    """
+    Ejecuta trabajos de la cola hasta que no quede ninguno disponible (o se alcance
+    config.JOBS_CONCURRENTES: los que quedan en cola los toma el worker que está en
+    ejecución al terminar el suyo).
+
+    Args:
+        worker (Optional[str], optional): identificador del worker.
+            Valor default es None (jobs.nuevo_worker()).
+        procesos (bool, optional): permite el pool de procesos (ver ejecutar_trabajo).
+            Valor default es True.
+
+    Returns:
+        int: cantidad de trabajos ejecutados
+    """
+
+    worker = jobs.nuevo_worker() if worker is None else worker
+    ejecutados = 0
+    while True:
+        trabajo = jobs.tomar(
+            worker,
+            lease_s=config.JOBS_LEASE_S,
+            max_intentos=config.JOBS_MAX_INTENTOS,
+            concurrentes=config.JOBS_CONCURRENTES,
+        )
+        if trabajo is None:
+            return ejecutados
+        ejecutar_trabajo(trabajo, worker, procesos)
+        ejecutados += 1
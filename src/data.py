@@ -1,11 +1,195 @@
 """utilidades de procesamiento de datos"""
 
+import hashlib
+import json
 import os
+import shutil
 import urllib.parse as urlparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobServiceClient, ContainerClient
+
+from config import config
+
+# Un cliente por proceso y por cuenta de almacenamiento. La clave incluye el pid para
+# que un proceso hijo (fork) no reutilice las conexiones HTTP del proceso padre.
+_BLOB_SERVICE_CLIENTS: Dict[Tuple[int, str], BlobServiceClient] = {}
+
+
+class LocalBlobDownloader:
+    """Equivalente local de StorageStreamDownloader"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def readinto(self, stream) -> int:
+        """Copia el contenido del blob en el stream, en bloques"""
+        with open(self.path, "rb") as origen:
+            shutil.copyfileobj(origen, stream, config.BLOB_CHUNK_SIZE)
+        return os.path.getsize(self.path)
+
+
+class LocalBlobClient:
+    """Equivalente local de BlobClient"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def download_blob(self, **kwargs) -> LocalBlobDownloader:  # pylint: disable=unused-argument
+        """Devuelve el downloader del blob"""
+        if not self.path.is_file():
+            raise FileNotFoundError(self.path)
+        return LocalBlobDownloader(self.path)
+
+
+class LocalContainerClient:
+    """
+    Container de Blob Storage simulado sobre una carpeta local (config.BLOB_STORE).
+    Implementa solo las operaciones de ContainerClient que usa este módulo, para
+    poder ejecutar el proceso y sus pruebas sin conexión a Azure.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, blob_name: str) -> Path:
+        return self.root.joinpath(*str(blob_name).split("/"))
+
+    def list_blobs(self) -> List[SimpleNamespace]:
+        """Lista los blobs con las propiedades name, size, etag y content_settings"""
+        blobs = []
+        for path in sorted(self.root.rglob("*")):
+            if path.is_file():
+                stat = path.stat()
+                blobs.append(
+                    SimpleNamespace(
+                        name=path.relative_to(self.root).as_posix(),
+                        size=stat.st_size,
+                        etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+                        content_settings=SimpleNamespace(content_md5=None),
+                    )
+                )
+        return blobs
+
+    def get_blob_client(self, blob) -> LocalBlobClient:
+        """Devuelve el cliente de un blob a partir de su nombre o sus propiedades"""
+        return LocalBlobClient(self._path(getattr(blob, "name", blob)))
+
+    def upload_blob(self, name: str, data, overwrite: bool = False, **kwargs):
+        """Escribe el blob copiando el stream en bloques"""
+        # pylint: disable=unused-argument
+        destino = self._path(name)
+        if destino.exists() and not overwrite:
+            raise FileExistsError(destino)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        temporal = destino.with_name(destino.name + ".tmp")
+        with open(temporal, "wb") as archivo:
+            shutil.copyfileobj(data, archivo, config.BLOB_CHUNK_SIZE)
+        os.replace(temporal, destino)
+
+    def delete_blobs(self, *blobs):
+        """Elimina los blobs (los nombres pueden venir codificados como URL)"""
+        for blob in blobs:
+            path = self._path(urlparse.unquote(getattr(blob, "name", blob)))
+            if path.is_file():
+                path.unlink()
+
+
+def get_container_client(storage_account_key: str, container_name: str) -> ContainerClient:
+    """
+    Devuelve el cliente del container usando un BlobServiceClient compartido por el proceso.
+    Las transferencias se hacen en bloques de config.BLOB_CHUNK_SIZE bytes.
+    Con config.BLOB_BACKEND = "local" se usa una carpeta bajo config.BLOB_STORE.
+
+    Args:
+        storage_account_key (str): clave de la cuenta de almacenamiento Azure Blob Storage
+        container_name (str): nombre del container para los datos del proyecto
+
+    Returns:
+        ContainerClient: cliente del container
+    """
+
+    if config.BLOB_BACKEND == "local":
+        return LocalContainerClient(config.BLOB_STORE.joinpath(container_name))
+
+    key = (os.getpid(), storage_account_key)
+    blob_service_client = _BLOB_SERVICE_CLIENTS.get(key)
+    if blob_service_client is None:
+        blob_service_client = BlobServiceClient.from_connection_string(
+            storage_account_key,
+            max_single_get_size=config.BLOB_CHUNK_SIZE,
+            max_chunk_get_size=config.BLOB_CHUNK_SIZE,
+            max_single_put_size=config.BLOB_CHUNK_SIZE,
+            max_block_size=config.BLOB_CHUNK_SIZE,
+        )
+        _BLOB_SERVICE_CLIENTS[key] = blob_service_client
+
+    return blob_service_client.get_container_client(container_name)
+
+
+def _download_blob_to_file(container_client: ContainerClient, blob_name: str, local_file: Path):
+    """
+    Descarga un blob escribiendo los bloques directamente en el archivo local,
+    sin cargar el contenido completo en memoria
+
+    Args:
+        container_client (ContainerClient): cliente del container
+        blob_name (str): nombre del blob (ej.: "input/archivo.las")
+        local_file (Path): archivo local de destino
+    """
+
+    downloader = container_client.get_blob_client(blob_name).download_blob(
+        max_concurrency=config.BLOB_MAX_CONCURRENCY
+    )
+    with open(file=local_file, mode="wb") as file:
+        downloader.readinto(file)
+
+
+def _upload_file_to_blob(container_client: ContainerClient, local_file: Path, blob_name: str):
+    """
+    Sube un archivo local leyéndolo en bloques
+
+    Args:
+        container_client (ContainerClient): cliente del container
+        local_file (Path): archivo local de origen
+        blob_name (str): nombre del blob de destino
+    """
+
+    with open(local_file, "rb") as data:
+        container_client.upload_blob(
+            name=blob_name,
+            data=data,
+            length=os.path.getsize(local_file),
+            overwrite=True,
+            max_concurrency=config.BLOB_MAX_CONCURRENCY,
+        )
+
+
+def _transferir(funcion: Callable, argumentos: Iterable[Tuple]) -> list:
+    """
+    Ejecuta transferencias de blobs en paralelo con config.BLOB_TRANSFER_WORKERS hilos.
+    Si alguna transferencia falla, se propaga la primera excepción.
+
+    Args:
+        funcion (Callable): función de transferencia
+        argumentos (Iterable[Tuple]): argumentos de cada llamado
+
+    Returns:
+        list: valor devuelto por cada llamado, en el orden de los argumentos
+    """
+
+    argumentos = list(argumentos)
+    if len(argumentos) <= 1 or config.BLOB_TRANSFER_WORKERS <= 1:
+        return [funcion(*args) for args in argumentos]
+
+    with ThreadPoolExecutor(max_workers=config.BLOB_TRANSFER_WORKERS) as executor:
+        futures = [executor.submit(funcion, *args) for args in argumentos]
+        return [future.result() for future in futures]
 
 
 def download_data_from_blob_storage(
@@ -26,31 +210,277 @@ def download_data_from_blob_storage(
         list[str]: lista de los archivos que fueron bajados
     """
 
-    blob_service_client = BlobServiceClient.from_connection_string(storage_account_key)
-    container_client = blob_service_client.get_container_client(container_name)
+    container_client = get_container_client(storage_account_key, container_name)
     files = []
     if blob_name is None:
         blob_list = container_client.list_blobs()
+        transferencias = []
         for blob in blob_list:
             if blob.size > 0 and blob.name[0:6] == "input/":
                 file_name = blob.name.split("/")[1]
                 files.append(file_name)
-                local_file = local_fp.joinpath(file_name)
-                file_content = container_client.get_blob_client(blob).download_blob().readall()
-                with open(file=local_file, mode="wb") as file:
-                    file.write(file_content)
+                transferencias.append((container_client, blob.name, local_fp.joinpath(file_name)))
+        _transferir(_download_blob_to_file, transferencias)
     else:
         files.append(blob_name)
-        local_file = local_fp.joinpath(blob_name)
-        file_content = (
-            container_client.get_blob_client("input/" + blob_name).download_blob().readall()
+        _download_blob_to_file(
+            container_client, "input/" + blob_name, local_fp.joinpath(blob_name)
         )
-        with open(file=local_file, mode="wb") as file:
-            file.write(file_content)
 
     return files
 
 
+def list_input_blob_properties(storage_account_key: str, container_name: str) -> list:
+    """
+    Lista las propiedades de los blobs no vacíos de la carpeta input del container.
+    El resultado puede reutilizarse en sync_input_blobs y clean_data para listar una sola vez.
+
+    Args:
+        storage_account_key (str): clave de la cuenta de almacenamiento Azure Blob Storage
+        container_name (str): nombre del container para los datos del proyecto
+
+    Returns:
+        list: propiedades de los blobs (name, size, etag, content_settings)
+    """
+
+    container_client = get_container_client(storage_account_key, container_name)
+
+    return [
+        blob
+        for blob in container_client.list_blobs()
+        if blob.size > 0 and blob.name[0:6] == "input/"
+    ]
+
+
+def list_input_blobs(storage_account_key: str, container_name: str) -> list[str]:
+    """
+    Lista los archivos no vacíos de la carpeta input del container
+
+    Args:
+        storage_account_key (str): clave de la cuenta de almacenamiento Azure Blob Storage
+        container_name (str): nombre del container para los datos del proyecto
+
+    Returns:
+        list[str]: nombres de los archivos (sin el prefijo "input/")
+    """
+
+    return [
+        blob.name.split("/")[1]
+        for blob in list_input_blob_properties(storage_account_key, container_name)
+    ]
+
+
+def _md5_archivo(path: Path) -> str:
+    """
+    Calcula el MD5 de un archivo leyéndolo en bloques
+
+    Args:
+        path (Path): archivo local
+
+    Returns:
+        str: MD5 en hexadecimal
+    """
+
+    md5 = hashlib.md5()
+    with open(path, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(config.BLOB_CHUNK_SIZE), b""):
+            md5.update(bloque)
+    return md5.hexdigest()
+
+
+def _md5_blob(blob) -> Optional[str]:
+    """
+    MD5 del blob informado por el Blob Storage (si fue subido con content_md5)
+
+    Args:
+        blob: propiedades del blob
+
+    Returns:
+        Optional[str]: MD5 en hexadecimal o None si el blob no lo tiene
+    """
+
+    content_settings = getattr(blob, "content_settings", None)
+    content_md5 = getattr(content_settings, "content_md5", None)
+    return bytes(content_md5).hex() if content_md5 else None
+
+
+def read_manifest(manifest_fp: Path) -> Dict[str, Dict]:
+    """
+    Lee el manifiesto de sincronización (nombre de blob -> etag, size y md5)
+
+    Args:
+        manifest_fp (Path): archivo del manifiesto
+
+    Returns:
+        Dict[str, Dict]: entradas del manifiesto (vacío si no existe)
+    """
+
+    if not manifest_fp.is_file():
+        return {}
+    with open(manifest_fp, "r", encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+
+def write_manifest(manifest_fp: Path, manifest: Dict[str, Dict]):
+    """
+    Guarda el manifiesto de sincronización de forma atómica
+
+    Args:
+        manifest_fp (Path): archivo del manifiesto
+        manifest (Dict[str, Dict]): entradas del manifiesto
+    """
+
+    manifest_fp.parent.mkdir(parents=True, exist_ok=True)
+    temporal = manifest_fp.with_name(manifest_fp.name + ".tmp")
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        json.dump(manifest, archivo, indent=2, sort_keys=True)
+    os.replace(temporal, manifest_fp)
+
+
+def _archivo_igual_al_blob(path: Path, blob, entrada: Optional[Dict]) -> bool:
+    """
+    Indica si un archivo local corresponde a la versión actual del blob
+
+    Args:
+        path (Path): archivo local
+        blob: propiedades del blob
+        entrada (Optional[Dict]): entrada del manifiesto para el blob
+
+    Returns:
+        bool: True si el archivo local tiene el mismo contenido que el blob
+    """
+
+    if not path.is_file() or path.stat().st_size != blob.size:
+        return False
+    if entrada is not None and entrada.get("etag") == blob.etag:
+        return True
+    # Sin entrada (o con etag distinto) solo se confía en el MD5 del contenido
+    md5_blob = _md5_blob(blob)
+    return md5_blob is not None and md5_blob == _md5_archivo(path)
+
+
+def sync_input_blob(
+    container_client: ContainerClient,
+    blob,
+    local_fp: Path,
+    manifest: Dict[str, Dict],
+) -> bool:
+    """
+    Sincroniza un blob de input con la carpeta local actualizando el manifiesto.
+    No descarga el blob si la misma versión ya está en input o si el manifiesto
+    la marca como procesada (ver marcar_procesados).
+
+    Args:
+        container_client (ContainerClient): cliente del container
+        blob: propiedades del blob
+        local_fp (Path): carpeta local input
+        manifest (Dict[str, Dict]): manifiesto de sincronización (se modifica)
+
+    Returns:
+        bool: True si el archivo debe procesarse (está en input),
+              False si ya fue procesado
+    """
+
+    file_name = blob.name.split("/")[1]
+    entrada = manifest.get(blob.name)
+
+    # Los procesados se suben y se borran de processed: solo queda el registro en el manifiesto
+    if entrada is not None and entrada.get("procesado") and entrada.get("etag") == blob.etag:
+        return False
+
+    local_file = local_fp.joinpath(file_name)
+    if not _archivo_igual_al_blob(local_file, blob, entrada):
+        _download_blob_to_file(container_client, blob.name, local_file)
+        md5 = _md5_archivo(local_file)
+        md5_blob = _md5_blob(blob)
+        if md5_blob is not None and md5_blob != md5:
+            raise ValueError(f"El MD5 de {blob.name} no coincide con el informado por el blob.")
+    elif entrada is not None and entrada.get("etag") == blob.etag and entrada.get("md5"):
+        md5 = entrada["md5"]
+    else:
+        md5 = _md5_archivo(local_file)
+
+    manifest[blob.name] = {"etag": blob.etag, "size": blob.size, "md5": md5}
+
+    return True
+
+
+def marcar_procesados(manifest_fp: Path, files: List[str]):
+    """
+    Marca en el manifiesto los archivos de input ya procesados, así la próxima
+    sincronización no los vuelve a descargar mientras el blob no cambie
+
+    Args:
+        manifest_fp (Path): archivo del manifiesto
+        files (List[str]): nombres de los archivos procesados
+    """
+
+    manifest = read_manifest(manifest_fp)
+    for file_name in files:
+        entrada = manifest.get("input/" + file_name)
+        if entrada is not None:
+            entrada["procesado"] = True
+    write_manifest(manifest_fp, manifest)
+
+
+def sync_input_blobs(
+    storage_account_key: str,
+    container_name: str,
+    local_fp: Path,
+    blob_list: list = None,
+    manifest_fp: Path = config.BLOB_MANIFEST,
+) -> Tuple[list[str], list]:
+    """
+    Sincronización incremental de la carpeta input del container. Descarga solo los
+    blobs nuevos o modificados según el manifiesto local (etag, size y md5) y omite
+    los marcados como procesados.
+
+    Args:
+        storage_account_key (str): clave de la cuenta de almacenamiento Azure Blob Storage
+        container_name (str): nombre del container para los datos del proyecto
+        local_fp (Path): carpeta local input
+        blob_list (list, optional): listado previo de list_input_blob_properties.
+                                    Valor default es None (se lista el container).
+        manifest_fp (Path, optional): archivo del manifiesto.
+                                      Valor default es config.BLOB_MANIFEST.
+
+    Returns:
+        Tuple[list[str], list]: archivos a procesar y listado de blobs usado,
+                                para reutilizarlo en clean_data
+    """
+
+    container_client = get_container_client(storage_account_key, container_name)
+    if blob_list is None:
+        blob_list = list_input_blob_properties(storage_account_key, container_name)
+
+    manifest = read_manifest(manifest_fp)
+    try:
+        procesar = _transferir(
+            sync_input_blob,
+            [(container_client, blob, local_fp, manifest) for blob in blob_list],
+        )
+    finally:
+        write_manifest(manifest_fp, manifest)
+
+    files = [blob.name.split("/")[1] for blob, ok in zip(blob_list, procesar) if ok]
+
+    return files, blob_list
+
+
+def _upload_and_remove(container_client: ContainerClient, local_file: Path, blob_name: str):
+    """
+    Sube un archivo local y lo elimina de la carpeta local
+
+    Args:
+        container_client (ContainerClient): cliente del container
+        local_file (Path): archivo local de origen
+        blob_name (str): nombre del blob de destino
+    """
+
+    _upload_file_to_blob(container_client, local_file, blob_name)
+    os.remove(local_file)
+
+
 def upload_data_to_blob_storage(
     storage_account_key: str,
     container_name: str,
@@ -67,34 +497,32 @@ def upload_data_to_blob_storage(
         processed_fp (Path): path de la carpeta Processed
     """
 
-    blob_service_client = BlobServiceClient.from_connection_string(storage_account_key)
-    container_client = blob_service_client.get_container_client(container_name)
+    container_client = get_container_client(storage_account_key, container_name)
 
-    lista_output = [f for f in os.listdir(output_fp) if os.path.isfile(os.path.join(output_fp, f))]
-    if len(lista_output) > 0:
-        for file in lista_output:
-            path_origen = output_fp.joinpath(file)
-            path_destino = "output/" + file
+    transferencias = []
+    for carpeta, prefijo in [(output_fp, "output/"), (processed_fp, "processed/")]:
+        for file in os.listdir(carpeta):
+            if os.path.isfile(os.path.join(carpeta, file)):
+                transferencias.append((container_client, carpeta.joinpath(file), prefijo + file))
 
-            with open(path_origen, "rb") as data:
-                container_client.upload_blob(name=path_destino, data=data, overwrite=True)
+    _transferir(_upload_and_remove, transferencias)
 
-            # if is_uploaded:
-            os.remove(path_origen)
 
-    lista_ant = [
-        f for f in os.listdir(processed_fp) if os.path.isfile(os.path.join(processed_fp, f))
-    ]
-    if len(lista_ant) > 0:
-        for file in lista_ant:
-            path_origen = processed_fp.joinpath(file)
-            path_destino = "processed/" + file
+def upload_file_to_blob_storage(
+    storage_account_key: str, container_name: str, local_file: Path, blob_name: str
+):
+    """
+    Carga un único archivo local en Azure Blob Storage y lo elimina de la carpeta local
 
-            with open(path_origen, "rb") as data:
-                container_client.upload_blob(name=path_destino, data=data, overwrite=True)
+    Args:
+        storage_account_key (str): clave de la cuenta de almacenamiento Azure Blob Storage
+        container_name (str): nombre del container para los datos del proyecto
+        local_file (Path): path del archivo a subir
+        blob_name (str): nombre del blob de destino (ej.: "output/archivo.zip")
+    """
 
-            # if is_uploaded:
-            os.remove(path_origen)
+    container_client = get_container_client(storage_account_key, container_name)
+    _upload_and_remove(container_client, local_file, blob_name)
 
 
 def upload_log_to_blob_storage(storage_account_key: str, container_name: str):
@@ -106,29 +534,29 @@ def upload_log_to_blob_storage(storage_account_key: str, container_name: str):
         container_name (str): nombre del container para los datos del proyecto
     """
 
-    blob_service_client = BlobServiceClient.from_connection_string(storage_account_key)
-    container_client = blob_service_client.get_container_client(container_name)
+    container_client = get_container_client(storage_account_key, container_name)
 
     path_origen = "logs/info.log"
     path_destino = "logs/log_" + datetime.now().strftime("%Y%m%d") + ".log"
 
-    with open(path_origen, "rb") as data:
-        container_client.upload_blob(name=path_destino, data=data, overwrite=True)
+    _upload_file_to_blob(container_client, Path(path_origen), path_destino)
 
 
-def clean_data(storage_account_key: str, container_name: str):
+def clean_data(storage_account_key: str, container_name: str, blob_list: list = None):
     """
     Elimina los blobs de la carpeta input
 
     Args:
         storage_account_key (str): clave de la cuenta de almacenamiento Azure Blob Storage
         container_name (str): nombre del container para los datos del proyecto
+        blob_list (list, optional): listado de blobs ya obtenido (ej.: por sync_input_blobs).
+                                    Valor default es None (se lista el container).
     """
 
-    blob_service_client = BlobServiceClient.from_connection_string(storage_account_key)
-    container_client = blob_service_client.get_container_client(container_name)
+    container_client = get_container_client(storage_account_key, container_name)
 
-    blob_list = container_client.list_blobs()
+    if blob_list is None:
+        blob_list = container_client.list_blobs()
     blob_list_delete = [
         urlparse.quote(b.name.encode("utf8"))
         for b in blob_list
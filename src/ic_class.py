@@ -2,16 +2,161 @@
 # Creator: Agustina Maccio
 # Project name: Proyectp PHIT - Intervalos de Confianza
 
+from typing import Sequence, Tuple
+
 import numpy as np
 import pandas as pd
 import statsmodels.api as sm
+from joblib import Parallel, delayed
 from mapie.quantile_regression import MapieQuantileRegressor
 from mapie.regression import MapieRegressor
-from matplotlib import pyplot as plt
 from sklearn.linear_model import QuantileRegressor
+from sklearn.model_selection import KFold
 from statsmodels.stats.diagnostic import het_white
 
 
+class MaronnaIntervalModel:
+    """Modelo congelado de los intervalos de Maronna.
+
+    Guarda la grilla de Loess ordenada por la predicción y los residuos
+    normalizados (ti) ordenados, con una tabla de cuantiles precalculada para
+    los alphas más usados. Calcula los intervalos de millones de muestras en
+    una sola pasada vectorizada y devuelve arrays de NumPy.
+    """
+
+    # alphas de las bandas de 80%, 90% y 95%
+    ALPHAS = (0.2, 0.1, 0.05)
+
+    def __init__(self, loess, ti, alphas: Sequence[float] = ALPHAS):
+
+        loess = np.asarray(loess, dtype=np.float64)
+        orden = np.argsort(loess[:, 0], kind="stable")
+        self.x = np.ascontiguousarray(loess[orden, 0])
+        self.varianza = np.ascontiguousarray(loess[orden, 1])
+        self.ti = np.sort(np.asarray(ti, dtype=np.float64).ravel())
+        self.cuantiles = {alpha: self._calcular_cuantiles(alpha) for alpha in alphas}
+
+    def _cuantil(self, q: float) -> float:
+        """Cuantil q de ti (misma interpolación lineal que np.quantile), sobre ti ordenado"""
+
+        posicion = q * (self.ti.size - 1)
+        inferior = int(np.floor(posicion))
+        superior = min(inferior + 1, self.ti.size - 1)
+        fraccion = posicion - inferior
+
+        return self.ti[inferior] + (self.ti[superior] - self.ti[inferior]) * fraccion
+
+    def _calcular_cuantiles(self, alpha: float) -> Tuple[float, float]:
+        """Cuantiles ta y tb de ti para el intervalo de nivel alpha"""
+
+        return self._cuantil(alpha / 2), self._cuantil(1 - (alpha / 2))
+
+    def cuantiles_alpha(self, alpha: float) -> Tuple[float, float]:
+        """Devuelve ta y tb desde la tabla precalculada (o los calcula si alpha no está)"""
+
+        if alpha not in self.cuantiles:
+            self.cuantiles[alpha] = self._calcular_cuantiles(alpha)
+
+        return self.cuantiles[alpha]
+
+    def sigma(self, y_pred) -> np.ndarray:
+        """Desvío estimado por Loess para cada predicción"""
+
+        y_pred = np.asarray(y_pred, dtype=np.float64).ravel()
+
+        return np.sqrt(np.interp(y_pred, self.x, self.varianza))
+
+    def intervals(self, y_pred, alpha: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Función para calcular el intervalo de confianza
+
+        Args:
+            y_pred (np.array): Predicción del modelo.
+            alpha (float): Parámetro para ajustar el intervalo de confianza
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: cota inferior y superior
+        """
+
+        y_pred = np.asarray(y_pred, dtype=np.float64).ravel()
+        sigma_est = self.sigma(y_pred)
+        ta, tb = self.cuantiles_alpha(alpha)
+
+        return y_pred + sigma_est * ta, y_pred + sigma_est * tb
+
+    def bands(self, y_pred, alphas: Sequence[float] = ALPHAS) -> np.ndarray:
+        """Calcula varios intervalos a la vez (ej.: 80/90/95%) interpolando sigma una sola vez
+
+        Args:
+            y_pred (np.array): Predicción del modelo.
+            alphas (Sequence[float], optional): niveles de los intervalos.
+                Defaults to ALPHAS.
+
+        Returns:
+            np.ndarray: array (len(alphas), 2, n) con la cota inferior y superior
+                de cada alpha
+        """
+
+        y_pred = np.asarray(y_pred, dtype=np.float64).ravel()
+        sigma_est = self.sigma(y_pred)
+        # (n_alphas, 2, 1) * (n,) -> (n_alphas, 2, n)
+        t = np.array([self.cuantiles_alpha(alpha) for alpha in alphas]).reshape(-1, 2, 1)
+
+        return y_pred + sigma_est * t
+
+
+def _ajuste_loess(x_loess, y_loess, span: float, delta: float = 0.0) -> np.ndarray:
+    """Ajusta Loess y devuelve el suavizado en el mismo orden que x_loess.
+    Los valores no positivos se reemplazan por 1e-7 para poder normalizar.
+
+    Args:
+        x_loess (np.array): predicciones del modelo
+        y_loess (np.array): residuos al cuadrado
+        span (float [0,1]): ventana de suavizado
+        delta (float, optional): distancia dentro de la cual se interpola en
+            lugar de ajustar (ver statsmodels lowess). Defaults to 0.0.
+
+    Returns:
+        np.ndarray: residuos suavizados
+    """
+
+    smooth = sm.nonparametric.lowess(
+        y_loess, x_loess, frac=span, delta=delta, return_sorted=False
+    )
+    smooth[smooth <= 0] = 0.0000001
+
+    return smooth
+
+
+def _cobertura_span(x_loess, y_obs, span, alpha, delta, entrenamiento, prueba):
+    """Ajusta Loess en un fold de entrenamiento y evalúa el intervalo en el de prueba
+
+    Args:
+        x_loess (np.array): predicciones del modelo
+        y_obs (np.array): valores observados
+        span (float [0,1]): ventana de suavizado a evaluar
+        alpha (float): nivel de significación del intervalo
+        delta (float): distancia dentro de la cual se interpola en lugar de ajustar
+        entrenamiento (np.array): índices del fold de entrenamiento
+        prueba (np.array): índices del fold de prueba
+
+    Returns:
+        Tuple[float, float]: cobertura y ancho medio del intervalo en el fold de prueba
+    """
+
+    x_train = x_loess[entrenamiento]
+    residuos = y_obs[entrenamiento] - x_train
+    smooth = _ajuste_loess(x_train, residuos**2, span, delta)
+    modelo = MaronnaIntervalModel(
+        np.column_stack((x_train, smooth)), residuos / np.sqrt(smooth), (alpha,)
+    )
+
+    linf, lsup = modelo.intervals(x_loess[prueba], alpha)
+    y_test = y_obs[prueba]
+    cobertura = np.mean((y_test >= linf) & (y_test <= lsup))
+
+    return cobertura, np.mean(lsup - linf)
+
+
 class PredictionIntervals:
     """Clase que representa los intervalos de predicción."""
 
@@ -24,6 +169,8 @@ class PredictionIntervals:
         self.y_pred = y_pred
         self.loess = None
         self.ti = None
+        self.span = None
+        self._frozen = None
 
     def residuals(self, y_obs, y_pred):
         """_summary_
@@ -93,6 +240,8 @@ class PredictionIntervals:
             y_pred (_type_): _description_
         """
 
+        from matplotlib import pyplot as plt  # pylint: disable=import-outside-toplevel
+
         residuals = self.residuals(y_obs, y_pred)
         plt.rcParams["figure.figsize"] = [10, 5]
         plt.suptitle("Residuals vs Fitted")
@@ -138,7 +287,7 @@ class PredictionIntervals:
 
         return interval
 
-    def maronna_set_span(self, y_obs, y_pred, span, ylim=False):
+    def maronna_set_span(self, y_obs, y_pred, span, ylim=False, plot=True, delta=0.0):
         """MaronnaSetSpan usa la función Loess para ajustar los residuos del
            modelo en función de la estimación del modelo.
 
@@ -152,6 +301,13 @@ class PredictionIntervals:
             ylim (float, optional): parámetro para ajustar la escala "y" del
                                     gráfico creado con el ajuste de los
                                     residuos. Defaults to None.
+            plot (bool, optional): mostrar el gráfico del ajuste. Usar False en
+                                   procesos por lotes o en el servidor.
+                                   Defaults to True.
+            delta (float, optional): distancia dentro de la cual Loess interpola
+                                     en lugar de ajustar. Con cientos de miles de
+                                     muestras, 0.01 * rango(y_pred) acelera mucho
+                                     el ajuste. Defaults to 0.0.
         """
 
         # se crean las variables x e y para el ajuste de Loess
@@ -160,26 +316,143 @@ class PredictionIntervals:
         residuals = self.residuals(y_obs, x_loess)
         y_loess = (residuals.ravel()) ** 2
 
-        # Ajuste de Loess function
-        self.loess = sm.nonparametric.lowess(y_loess, x_loess, frac=span)
-        smooth = self.loess[:, 1]
-        smooth[smooth <= 0] = 0.0000001
+        # Ajuste de Loess function. El suavizado queda en el orden de x_loess
+        # para normalizar cada residuo con su propio sigma
+        smooth = _ajuste_loess(x_loess, y_loess, span, delta)
+        orden = np.argsort(x_loess, kind="stable")
+        self.loess = np.column_stack((x_loess[orden], smooth[orden]))
 
         # normalización residuos y calculo de ti
         sigma_est = np.sqrt(smooth)
         self.ti = residuals / sigma_est.reshape(-1, 1)
+        self._frozen = None
+
+        if not plot:
+            return
 
         # Plot Loess ajuste
+        from matplotlib import pyplot as plt  # pylint: disable=import-outside-toplevel
+
         plt.rcParams["figure.figsize"] = [10, 5]
         plt.suptitle(f"Span = {span}")
         plt.scatter(x_loess, y_loess, s=5)
-        plt.plot(x_loess, smooth, color="red")
+        plt.plot(self.loess[:, 0], self.loess[:, 1], color="red")
         plt.ylabel("Residuals")
         plt.xlabel("Fitted values")
         if ylim:
             plt.ylim((0, ylim))
         plt.show()
 
+    def maronna_select_span(
+        self,
+        y_obs,
+        y_pred,
+        spans=(0.05, 0.1, 0.2, 0.3, 0.5, 0.7),
+        alpha=0.1,
+        n_folds=5,
+        delta=None,
+        tolerancia=0.005,
+        n_jobs=-1,
+        random_state=0,
+    ) -> pd.DataFrame:
+        """Elige el span de Loess por validación cruzada y ajusta el modelo con él.
+        Cada par (span, fold) se evalúa en paralelo. Se elige el intervalo más
+        angosto entre los spans cuya cobertura está a menos de `tolerancia` de la
+        mejor cobertura (la más cercana a 1 - alpha).
+
+        Args:
+            y_obs (pd.Series o np.array): Observaciones del modelo
+            y_pred (_type_): Predicciónes del modelo
+            spans (Sequence[float], optional): spans candidatos.
+                Defaults to (0.05, 0.1, 0.2, 0.3, 0.5, 0.7).
+            alpha (float, optional): nivel del intervalo evaluado. Defaults to 0.1.
+            n_folds (int, optional): cantidad de folds. Defaults to 5.
+            delta (float, optional): delta de Loess. Defaults to None
+                                     (0.01 * rango(y_pred)).
+            tolerancia (float, optional): diferencia de cobertura aceptada.
+                                          Defaults to 0.005.
+            n_jobs (int, optional): procesos de joblib. Defaults to -1 (todos).
+            random_state (int, optional): semilla de los folds. Defaults to 0.
+
+        Returns:
+            pd.DataFrame: cobertura, error de cobertura y ancho medio por span
+        """
+
+        x_loess = np.array(y_pred, dtype=np.float64).ravel()
+        y_obs = np.array(y_obs, dtype=np.float64).ravel()
+        if delta is None:
+            delta = 0.01 * (x_loess.max() - x_loess.min())
+
+        kfold = KFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+        folds = list(kfold.split(x_loess))
+        resultados = Parallel(n_jobs=n_jobs)(
+            delayed(_cobertura_span)(x_loess, y_obs, span, alpha, delta, entrenamiento, prueba)
+            for span in spans
+            for entrenamiento, prueba in folds
+        )
+
+        resultados = np.array(resultados).reshape(len(spans), n_folds, 2).mean(axis=1)
+        scores = pd.DataFrame(
+            {"span": spans, "cobertura": resultados[:, 0], "ancho": resultados[:, 1]}
+        )
+        scores["error_cobertura"] = (scores["cobertura"] - (1 - alpha)).abs()
+
+        umbral = scores["error_cobertura"].min() + tolerancia
+        candidatos = scores[scores["error_cobertura"] <= umbral]
+        span = float(candidatos.loc[candidatos["ancho"].idxmin(), "span"])
+        self.maronna_set_span(y_obs, x_loess, span, plot=False, delta=delta)
+        self.span = span
+
+        return scores
+
+    def freeze(
+        self, alphas: Sequence[float] = MaronnaIntervalModel.ALPHAS
+    ) -> MaronnaIntervalModel:
+        """Congela el ajuste de Loess y los ti en un MaronnaIntervalModel.
+        Se calcula una sola vez y se reutiliza en cada predicción.
+
+        Args:
+            alphas (Sequence[float], optional): alphas de la tabla de cuantiles.
+                Defaults to MaronnaIntervalModel.ALPHAS.
+
+        Returns:
+            MaronnaIntervalModel: modelo de intervalos congelado
+        """
+
+        # los objetos serializados antes de agregar este atributo no lo tienen
+        if getattr(self, "_frozen", None) is None:
+            self._frozen = MaronnaIntervalModel(self.loess, self.ti, alphas)
+
+        return self._frozen
+
+    def maronna_intervals(self, y_pred, alpha) -> Tuple[np.ndarray, np.ndarray]:
+        """Función para calcular el intervalo de confianza como arrays de NumPy
+
+        Args:
+            y_pred ( np.array): Predicción del modelo a la que se calculará el
+                                intervalo de confianza.
+            alpha (float): Parámetro para ajustar el intervalo de confianza
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: intervalo de confianza inferior y superior.
+        """
+
+        return self.freeze().intervals(y_pred, alpha)
+
+    def maronna_bands(self, y_pred, alphas=MaronnaIntervalModel.ALPHAS) -> np.ndarray:
+        """Función para calcular varios intervalos de confianza a la vez
+
+        Args:
+            y_pred ( np.array): Predicción del modelo.
+            alphas (Sequence[float], optional): niveles de los intervalos
+                (ej.: 0.2, 0.1 y 0.05 para 80/90/95%).
+
+        Returns:
+            np.ndarray: array (len(alphas), 2, n) con las cotas inferior y superior.
+        """
+
+        return self.freeze().bands(y_pred, alphas)
+
     def maronna_confidence_intervals(self, y_pred, alpha):
         """Función para calcular el intervalo de confianza
 
@@ -194,19 +467,10 @@ class PredictionIntervals:
         """
 
         # se formatea y_pred
-        y_pred = np.array(y_pred).reshape(-1, 1)
-
-        # Usando el resultado de Loess calculamos el error de normalizado
-        # de la predicción
-        sigma_est = np.sqrt(np.interp(y_pred, self.loess[:, 0], self.loess[:, 1])).reshape(-1, 1)
-
-        # calculo ta y tb usando el alpha del intervalo de confianza
-        ta = np.quantile(self.ti, alpha / 2)
-        tb = np.quantile(self.ti, 1 - (alpha / 2))
+        y_pred = np.array(y_pred).ravel()
 
         # Se calculan los intervalos de confianza
-        linf = y_pred + (sigma_est * ta)
-        lsup = y_pred + (sigma_est * tb)
+        linf, lsup = self.maronna_intervals(y_pred, alpha)
         interval = pd.DataFrame(y_pred, columns=["y_pred"])
         interval["IC_INF"] = linf
         interval["IC_SUP"] = lsup
@@ -0,0 +1,344 @@
+"""almacén de trabajos en SQLite con asignación por lease y heartbeat"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import config
+from config.config import logger
+
+EN_COLA = "EN_COLA"
+PROCESANDO = "PROCESANDO"
+FINALIZADO = "FINALIZADO"
+ERROR = "ERROR"
+
+
+class LeasePerdido(RuntimeError):
+    """El trabajo dejó de estar asignado al worker (otro lo tomó o se canceló)"""
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    opciones TEXT NOT NULL,
+    creado REAL NOT NULL,
+    inicio REAL,
+    fin REAL,
+    worker TEXT,
+    lease_hasta REAL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    hechos INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    errores TEXT,
+    error TEXT
+)
+"""
+
+
+def _conectar(db: Path) -> sqlite3.Connection:
+    """
+    Abre la base de trabajos (la crea si no existe). En modo autocommit: las
+    transacciones que necesitan atomicidad se abren explícitamente.
+
+    Args:
+        db (Path): path de la base
+
+    Returns:
+        sqlite3.Connection: conexión
+    """
+
+    conexion = sqlite3.connect(str(db), timeout=30, isolation_level=None)
+    conexion.row_factory = sqlite3.Row
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute(_ESQUEMA)
+
+    return conexion
+
+
+def _a_dict(fila: sqlite3.Row) -> Dict:
+    """Convierte una fila en diccionario decodificando los campos JSON"""
+
+    trabajo = dict(fila)
+    trabajo["opciones"] = json.loads(trabajo["opciones"])
+    trabajo["errores"] = json.loads(trabajo["errores"]) if trabajo["errores"] else None
+
+    return trabajo
+
+
+def nuevo_worker() -> str:
+    """Identificador del proceso/hilo que ejecuta trabajos"""
+
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def crear(opciones: Optional[Dict] = None, db: Path = config.JOBS_DB) -> str:
+    """
+    Encola un trabajo
+
+    Args:
+        opciones (Optional[Dict], optional): opciones del lote. Valor default es None.
+        db (Path, optional): base de trabajos. Valor default es config.JOBS_DB.
+
+    Returns:
+        str: id del trabajo
+    """
+
+    trabajo_id = uuid.uuid4().hex
+    with closing(_conectar(db)) as conexion:
+        conexion.execute(
+            "INSERT INTO trabajos (id, estado, opciones, creado) VALUES (?, ?, ?, ?)",
+            (trabajo_id, EN_COLA, json.dumps(opciones or {}), time.time()),
+        )
+
+    return trabajo_id
+
+
+def tomar(
+    worker: str,
+    lease_s: int = config.JOBS_LEASE_S,
+    max_intentos: int = config.JOBS_MAX_INTENTOS,
+    concurrentes: int = config.JOBS_CONCURRENTES,
+    db: Path = config.JOBS_DB,
+) -> Optional[Dict]:
+    """
+    Asigna al worker el trabajo más antiguo disponible: uno en cola o uno cuyo lease
+    venció (su proceso dejó de dar heartbeat). No asigna nada si ya hay `concurrentes`
+    trabajos con lease vigente. Los trabajos que vencieron max_intentos veces pasan a ERROR.
+
+    Args:
+        worker (str): identificador del worker
+        lease_s (int, optional): duración del lease. Valor default es config.JOBS_LEASE_S.
+        max_intentos (int, optional): asignaciones máximas por trabajo.
+            Valor default es config.JOBS_MAX_INTENTOS.
+        concurrentes (int, optional): trabajos en ejecución simultánea.
+            Valor default es config.JOBS_CONCURRENTES.
+        db (Path, optional): base de trabajos. Valor default es config.JOBS_DB.
+
+    Returns:
+        Optional[Dict]: trabajo asignado o None
+    """
+
+    ahora = time.time()
+    with closing(_conectar(db)) as conexion:
+        # BEGIN IMMEDIATE toma el lock de escritura: dos workers no pueden tomar el mismo trabajo
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            conexion.execute(
+                """UPDATE trabajos SET estado = ?, fin = ?, error = ?
+                WHERE estado = ? AND lease_hasta < ? AND intentos >= ?""",
+                (ERROR, ahora, "Se agotaron los reintentos", PROCESANDO, ahora, max_intentos),
+            )
+            activos = conexion.execute(
+                "SELECT COUNT(*) FROM trabajos WHERE estado = ? AND lease_hasta >= ?",
+                (PROCESANDO, ahora),
+            ).fetchone()[0]
+            fila = None
+            if activos < concurrentes:
+                fila = conexion.execute(
+                    """SELECT id FROM trabajos
+                    WHERE estado = ? OR (estado = ? AND lease_hasta < ?)
+                    ORDER BY creado LIMIT 1""",
+                    (EN_COLA, PROCESANDO, ahora),
+                ).fetchone()
+            if fila is not None:
+                conexion.execute(
+                    """UPDATE trabajos SET estado = ?, worker = ?, lease_hasta = ?,
+                    inicio = COALESCE(inicio, ?), intentos = intentos + 1
+                    WHERE id = ?""",
+                    (PROCESANDO, worker, ahora + lease_s, ahora, fila["id"]),
+                )
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+
+        if fila is None:
+            return None
+        trabajo = conexion.execute("SELECT * FROM trabajos WHERE id = ?", (fila["id"],)).fetchone()
+
+    logger.info("[jobs] %s toma el trabajo %s", worker, trabajo["id"])
+    return _a_dict(trabajo)
+
+
+def heartbeat(
+    trabajo_id: str, worker: str, lease_s: int = config.JOBS_LEASE_S, db: Path = config.JOBS_DB
+) -> bool:
+    """
+    Renueva el lease de un trabajo
+
+    Returns:
+        bool: False si el trabajo ya no está asignado a este worker
+    """
+
+    with closing(_conectar(db)) as conexion:
+        cursor = conexion.execute(
+            "UPDATE trabajos SET lease_hasta = ? WHERE id = ? AND worker = ? AND estado = ?",
+            (time.time() + lease_s, trabajo_id, worker, PROCESANDO),
+        )
+
+    return cursor.rowcount == 1
+
+
+def progreso(trabajo_id: str, hechos: int, total: Optional[int], db: Path = config.JOBS_DB):
+    """
+    Registra el avance de un trabajo
+
+    Args:
+        trabajo_id (str): id del trabajo
+        hechos (int): archivos procesados
+        total (Optional[int]): archivos del lote (None si todavía no se conoce)
+        db (Path, optional): base de trabajos. Valor default es config.JOBS_DB.
+    """
+
+    with closing(_conectar(db)) as conexion:
+        conexion.execute(
+            "UPDATE trabajos SET hechos = ?, total = COALESCE(?, total) WHERE id = ?",
+            (hechos, total, trabajo_id),
+        )
+
+
+def finalizar(
+    trabajo_id: str,
+    worker: str,
+    estado: str,
+    errores: Optional[List[str]] = None,
+    error: Optional[str] = None,
+    db: Path = config.JOBS_DB,
+):
+    """
+    Cierra un trabajo. No hace nada si el trabajo ya no está asignado al worker
+    (ej.: se canceló con /kill o se reasignó por lease vencido).
+
+    Args:
+        trabajo_id (str): id del trabajo
+        worker (str): identificador del worker que lo ejecutó
+        estado (str): FINALIZADO o ERROR
+        errores (Optional[List[str]], optional): archivos con error. Valor default es None.
+        error (Optional[str], optional): traza del error del lote. Valor default es None.
+        db (Path, optional): base de trabajos. Valor default es config.JOBS_DB.
+    """
+
+    with closing(_conectar(db)) as conexion:
+        conexion.execute(
+            """UPDATE trabajos SET estado = ?, fin = ?, errores = ?, error = ?
+            WHERE id = ? AND worker = ? AND estado = ?""",
+            (
+                estado,
+                time.time(),
+                json.dumps(errores or []),
+                error,
+                trabajo_id,
+                worker,
+                PROCESANDO,
+            ),
+        )
+
+
+def cancelar_activos(motivo: str, db: Path = config.JOBS_DB) -> int:
+    """
+    Marca como ERROR los trabajos en ejecución (ej.: después de /kill)
+
+    Returns:
+        int: cantidad de trabajos cancelados
+    """
+
+    with closing(_conectar(db)) as conexion:
+        cursor = conexion.execute(
+            "UPDATE trabajos SET estado = ?, fin = ?, error = ? WHERE estado = ?",
+            (ERROR, time.time(), motivo, PROCESANDO),
+        )
+
+    return cursor.rowcount
+
+
+def obtener(trabajo_id: str, db: Path = config.JOBS_DB) -> Optional[Dict]:
+    """Estado de un trabajo (None si no existe)"""
+
+    with closing(_conectar(db)) as conexion:
+        fila = conexion.execute("SELECT * FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+
+    return _a_dict(fila) if fila is not None else None
+
+
+def resumen(db: Path = config.JOBS_DB) -> Dict:
+    """
+    Estado general de la cola
+
+    Returns:
+        Dict: status (PROCESANDO si hay trabajos con lease vigente, si no STANDBY),
+            trabajos en cola, trabajos con el lease vencido (su proceso se cayó: los
+            vuelve a tomar el próximo worker) y avance de los que están en ejecución
+    """
+
+    ahora = time.time()
+    with closing(_conectar(db)) as conexion:
+        en_cola = conexion.execute(
+            "SELECT COUNT(*) FROM trabajos WHERE estado = ?", (EN_COLA,)
+        ).fetchone()[0]
+        vencidos = conexion.execute(
+            "SELECT COUNT(*) FROM trabajos WHERE estado = ? AND lease_hasta < ?",
+            (PROCESANDO, ahora),
+        ).fetchone()[0]
+        activos = conexion.execute(
+            """SELECT id, worker, inicio, hechos, total FROM trabajos
+            WHERE estado = ? AND lease_hasta >= ? ORDER BY inicio""",
+            (PROCESANDO, ahora),
+        ).fetchall()
+
+    return {
+        "status": PROCESANDO if activos else "STANDBY",
+        "en_cola": en_cola,
+        "vencidos": vencidos,
+        "en_ejecucion": [dict(fila) for fila in activos],
+    }
+
+
+class Heartbeat:
+    """
+    Renueva el lease de un trabajo en un hilo mientras dura el bloque `with`.
+    Si el lease se pierde (otro worker tomó el trabajo o se canceló) lo registra en el
+    log y activa `perdido`: el lote lo verifica entre archivos y se interrumpe.
+    """
+
+    def __init__(
+        self,
+        trabajo_id: str,
+        worker: str,
+        lease_s: int = config.JOBS_LEASE_S,
+        db: Path = config.JOBS_DB,
+    ):
+
+        self.trabajo_id = trabajo_id
+        self.worker = worker
+        self.lease_s = lease_s
+        self.db = db
+        self.perdido = threading.Event()
+        self._fin = threading.Event()
+        self._hilo = threading.Thread(target=self._latir, name="jobs-heartbeat", daemon=True)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._fin.set()
+        self._hilo.join()
+
+    def _latir(self):
+        """Renueva el lease cada tercio de su duración"""
+
+        while not self._fin.wait(self.lease_s / 3):
+            try:
+                if not heartbeat(self.trabajo_id, self.worker, self.lease_s, self.db):
+                    logger.error("[jobs] Se perdió el lease del trabajo %s", self.trabajo_id)
+                    self.perdido.set()
+                    return
+            except sqlite3.Error as e:
+                logger.error("[jobs] Error renovando el lease de %s: %s", self.trabajo_id, e)
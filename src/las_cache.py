@@ -0,0 +1,247 @@
+"""caché de perfiles LAS ya leídos, en formato columnar (.npy por curva)"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import config
+from config.config import logger
+
+try:
+    import fcntl
+except ImportError:  # fcntl solo existe en Unix
+    fcntl = None
+
+HEADER_FILE = "header.json"
+
+
+def hash_archivo(file, chunk_size: int = 4 * 1024 * 1024) -> str:
+    """
+    Hash del contenido de un archivo. Es la clave de la caché: un perfil reenviado
+    sin cambios usa la misma entrada aunque tenga otro nombre.
+
+    Args:
+        file: path del archivo
+        chunk_size (int, optional): tamaño de lectura. Valor default es 4 MB.
+
+    Returns:
+        str: hash blake2b (20 bytes) en hexadecimal
+    """
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file, "rb") as f:
+        for bloque in iter(lambda: f.read(chunk_size), b""):
+            digest.update(bloque)
+
+    return digest.hexdigest()
+
+
+def _leer_header(entrada: Path) -> Optional[Dict]:
+    """
+    Lee el header de una entrada de la caché
+
+    Args:
+        entrada (Path): carpeta de la entrada
+
+    Returns:
+        Optional[Dict]: header o None si la entrada no existe o está incompleta
+    """
+
+    try:
+        with open(entrada.joinpath(HEADER_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _escribir_header(entrada: Path, header: Dict):
+    """
+    Escribe el header de una entrada de forma atómica
+
+    Args:
+        entrada (Path): carpeta de la entrada
+        header (Dict): header a guardar
+    """
+
+    # nombre temporal único: dos procesos pueden escribir el header de la misma entrada
+    descriptor, temporal = tempfile.mkstemp(prefix=HEADER_FILE, suffix=".tmp", dir=entrada)
+    with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+        json.dump(header, f)
+    os.replace(temporal, entrada.joinpath(HEADER_FILE))
+
+
+@contextmanager
+def _bloqueo(entrada: Path) -> Iterator[None]:
+    """
+    Bloqueo exclusivo entre procesos de una entrada (lectura-modificación-escritura
+    del header). Sin fcntl no se bloquea.
+
+    Args:
+        entrada (Path): carpeta de la entrada
+    """
+
+    if fcntl is None:
+        yield
+        return
+
+    with open(entrada.joinpath(".lock"), "a", encoding="utf-8") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def leer(
+    clave: str, columnas: Sequence[str], cache_dir: Path = config.LAS_CACHE_DIR
+) -> Optional[Tuple[Dict[str, np.ndarray], Dict]]:
+    """
+    Busca un perfil en la caché. Hay acierto si todas las columnas pedidas están
+    guardadas o se sabe que no existen en el perfil.
+
+    Args:
+        clave (str): hash del contenido del perfil
+        columnas (Sequence[str]): curvas necesarias
+        cache_dir (Path, optional): carpeta de la caché. Valor default es config.LAS_CACHE_DIR.
+
+    Returns:
+        Optional[Tuple[Dict[str, np.ndarray], Dict]]: curvas (mapeadas en memoria) y header,
+            o None si no hay acierto
+    """
+
+    entrada = cache_dir.joinpath(clave)
+    header = _leer_header(entrada)
+    if header is None:
+        return None
+    if not set(columnas) <= set(header["columnas"]) | set(header["ausentes"]):
+        return None
+
+    try:
+        curvas = {
+            c: np.load(entrada.joinpath(c + ".npy"), mmap_mode="r")
+            for c in columnas
+            if c in header["columnas"]
+        }
+    except (OSError, ValueError):
+        return None
+
+    # La fecha de modificación de la carpeta marca el último uso (LRU)
+    os.utime(entrada)
+
+    return curvas, header
+
+
+def guardar(
+    clave: str,
+    curvas: Dict[str, np.ndarray],
+    header: Dict,
+    columnas: Sequence[str],
+    cache_dir: Path = config.LAS_CACHE_DIR,
+    max_bytes: int = config.LAS_CACHE_MAX_BYTES,
+):
+    """
+    Guarda las curvas de un perfil en la caché y libera espacio si se supera max_bytes.
+    Si la entrada ya existe, se le agregan las curvas que no tenía.
+
+    Args:
+        clave (str): hash del contenido del perfil
+        curvas (Dict[str, np.ndarray]): curvas leídas
+        header (Dict): datos del header (se guarda "well")
+        columnas (Sequence[str]): curvas pedidas; las que no están en curvas se
+            registran como ausentes del perfil
+        cache_dir (Path, optional): carpeta de la caché. Valor default es config.LAS_CACHE_DIR.
+        max_bytes (int, optional): tamaño máximo de la caché.
+            Valor default es config.LAS_CACHE_MAX_BYTES.
+    """
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    entrada = cache_dir.joinpath(clave)
+    existente = _leer_header(entrada)
+
+    if existente is None:
+        # Se arma en una carpeta temporal y se renombra, para que otro proceso
+        # nunca vea una entrada a medio escribir
+        temporal = Path(tempfile.mkdtemp(prefix=".tmp_", dir=cache_dir))
+        for nombre, valores in curvas.items():
+            np.save(temporal.joinpath(nombre + ".npy"), np.asarray(valores, dtype=np.float64))
+        _escribir_header(
+            temporal,
+            {
+                "well": header.get("well", ""),
+                "columnas": list(curvas),
+                "ausentes": [c for c in columnas if c not in curvas],
+            },
+        )
+        try:
+            os.rename(temporal, entrada)
+        except OSError:
+            # otro proceso guardó la misma entrada primero
+            shutil.rmtree(temporal, ignore_errors=True)
+    else:
+        nuevas = [c for c in curvas if c not in existente["columnas"]]
+        for nombre in nuevas:
+            descriptor, temporal = tempfile.mkstemp(prefix=nombre, suffix=".tmp", dir=entrada)
+            with os.fdopen(descriptor, "wb") as f:
+                np.save(f, np.asarray(curvas[nombre], dtype=np.float64))
+            os.replace(temporal, entrada.joinpath(nombre + ".npy"))
+        # El header se vuelve a leer bajo el bloqueo: otro worker pudo agregar curvas
+        with _bloqueo(entrada):
+            existente = _leer_header(entrada) or existente
+            existente["columnas"] += [c for c in nuevas if c not in existente["columnas"]]
+            existente["ausentes"] = sorted(
+                (set(existente["ausentes"]) | {c for c in columnas if c not in curvas})
+                - set(existente["columnas"])
+            )
+            _escribir_header(entrada, existente)
+
+    liberar_espacio(cache_dir, max_bytes)
+
+
+def _tamano(entrada: Path) -> int:
+    """
+    Tamaño en bytes de una entrada
+
+    Args:
+        entrada (Path): carpeta de la entrada
+
+    Returns:
+        int: suma del tamaño de sus archivos
+    """
+
+    return sum(f.stat().st_size for f in entrada.iterdir() if f.is_file())
+
+
+def liberar_espacio(
+    cache_dir: Path = config.LAS_CACHE_DIR, max_bytes: int = config.LAS_CACHE_MAX_BYTES
+):
+    """
+    Elimina las entradas usadas hace más tiempo hasta que la caché ocupe como máximo max_bytes
+
+    Args:
+        cache_dir (Path, optional): carpeta de la caché. Valor default es config.LAS_CACHE_DIR.
+        max_bytes (int, optional): tamaño máximo de la caché.
+            Valor default es config.LAS_CACHE_MAX_BYTES.
+    """
+
+    entradas = []
+    for entrada in cache_dir.iterdir():
+        if entrada.is_dir() and not entrada.name.startswith("."):
+            try:
+                entradas.append((entrada.stat().st_mtime, _tamano(entrada), entrada))
+            except OSError:
+                continue  # eliminada por otro proceso
+
+    total = sum(tamano for _, tamano, _ in entradas)
+    for _, tamano, entrada in sorted(entradas, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        logger.info("Caché LAS: se elimina la entrada %s (%s bytes)", entrada.name, tamano)
+        shutil.rmtree(entrada, ignore_errors=True)
+        total -= tamano
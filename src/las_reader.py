@@ -0,0 +1,273 @@
+"""lectura rápida de perfiles LAS 2.0"""
+
+import mmap
+import re
+import sys
+import time
+import warnings
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Inicio de la sección de datos (~A, ~ASCII) al comienzo de una línea
+_RE_SECCION_ASCII = re.compile(rb"(?m)^[ \t]*~A")
+
+# Tamaño de los bloques de texto de ~ASCII que se convierten de una vez
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+class LASNoSoportado(ValueError):
+    """El perfil usa una característica de LAS que el lector rápido no interpreta.
+    Quien llama debe recurrir a lasio."""
+
+
+def _valor_header(linea: str) -> Tuple[str, str]:
+    """
+    Separa una línea del header LAS ("MNEM.UNIT  VALOR : DESCRIPCIÓN")
+
+    Args:
+        linea (str): línea del header
+
+    Returns:
+        Tuple[str, str]: mnemónico y valor
+    """
+
+    mnemonico, _, resto = linea.partition(".")
+    # la unidad termina en el primer espacio; el valor llega hasta el último ":"
+    partes = resto.split(None, 1) if resto[:1] not in (" ", "\t") else ["", resto]
+    valor = partes[1] if len(partes) > 1 else ""
+    if ":" in valor:
+        valor = valor[: valor.rfind(":")]
+
+    return mnemonico.strip(), valor.strip()
+
+
+def nombres_unicos(mnemonicos: Sequence[str]) -> List[str]:
+    """
+    Renombra los mnemónicos repetidos como lo hace lasio (DEPTH -> DEPTH:1, DEPTH:2)
+
+    Args:
+        mnemonicos (Sequence[str]): mnemónicos en el orden de ~Curve
+
+    Returns:
+        List[str]: mnemónicos sin repetidos
+    """
+
+    repetidos = {m for m, n in Counter(mnemonicos).items() if n > 1}
+    vistos: Counter = Counter()
+    nombres = []
+    for mnemonico in mnemonicos:
+        if mnemonico in repetidos:
+            vistos[mnemonico] += 1
+            nombres.append(f"{mnemonico}:{vistos[mnemonico]}")
+        else:
+            nombres.append(mnemonico)
+
+    return nombres
+
+
+def leer_header(header: str) -> Dict:
+    """
+    Interpreta las secciones ~Version, ~Well y ~Curve del header
+
+    Args:
+        header (str): texto del archivo anterior a la sección ~ASCII
+
+    Raises:
+        LASNoSoportado: si el perfil no es LAS 2.0 sin wrap o su NULL no es numérico
+
+    Returns:
+        Dict: version, wrap, null, well y curvas (mnemónicos en orden)
+    """
+
+    info = {"version": None, "wrap": "NO", "null": None, "well": "", "curvas": []}
+    seccion = ""
+    for linea in header.splitlines():
+        linea = linea.strip()
+        if not linea or linea.startswith("#"):
+            continue
+        if linea.startswith("~"):
+            seccion = linea[1:2].upper()
+            continue
+        if seccion not in ("V", "W", "C"):
+            continue
+
+        mnemonico, valor = _valor_header(linea)
+        if seccion == "V" and mnemonico.upper() == "VERS":
+            info["version"] = valor
+        elif seccion == "V" and mnemonico.upper() == "WRAP":
+            info["wrap"] = valor.upper()
+        elif seccion == "V" and mnemonico.upper() == "DLM" and valor.upper() != "SPACE":
+            raise LASNoSoportado(f"Delimitador no soportado: {valor}")
+        elif seccion == "W" and mnemonico.upper() == "NULL":
+            try:
+                info["null"] = float(valor) if valor else None
+            except ValueError as e:
+                raise LASNoSoportado(f"Valor NULL no numérico: {valor}") from e
+        elif seccion == "W" and mnemonico.upper() == "WELL":
+            info["well"] = valor
+        elif seccion == "C":
+            info["curvas"].append(mnemonico)
+
+    if not (info["version"] or "").startswith("2"):
+        raise LASNoSoportado(f"Versión LAS no soportada: {info['version']}")
+    if info["wrap"] != "NO":
+        raise LASNoSoportado("Perfiles con WRAP = YES no soportados")
+    if not info["curvas"]:
+        raise LASNoSoportado("El perfil no tiene sección ~Curve")
+
+    return info
+
+
+def _parsear_bloque(bloque: bytes, n_curvas: int, indices: List[int]) -> np.ndarray:
+    """
+    Convierte un bloque de líneas completas de ~ASCII en una matriz con las columnas pedidas
+
+    Args:
+        bloque (bytes): texto con filas completas
+        n_curvas (int): cantidad de curvas por fila
+        indices (List[int]): posiciones de las columnas a conservar
+
+    Raises:
+        LASNoSoportado: si el bloque tiene valores no numéricos o filas incompletas
+
+    Returns:
+        np.ndarray: matriz (filas x columnas pedidas)
+    """
+
+    with warnings.catch_warnings():
+        # numpy avisa (o falla, según la versión) si encuentra un valor no numérico
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            valores = np.fromstring(bloque, dtype=np.float64, sep=" ")
+        except (ValueError, DeprecationWarning) as e:
+            raise LASNoSoportado("La sección ~ASCII tiene valores no numéricos") from e
+
+    if valores.size % n_curvas != 0:
+        raise LASNoSoportado("La sección ~ASCII tiene filas incompletas")
+
+    return valores.reshape(-1, n_curvas)[:, indices]
+
+
+def read_las(
+    file, columns: Optional[Sequence[str]] = None, use_mmap: bool = True
+) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """
+    Lee un perfil LAS 2.0 devolviendo solo las curvas pedidas como arrays de NumPy.
+    La sección ~ASCII se convierte por bloques de CHUNK_SIZE bytes, sin crear objetos
+    de Python por fila. Los valores NULL del header se reemplazan por NaN.
+
+    Args:
+        file: path del archivo .las
+        columns (Optional[Sequence[str]], optional): curvas a leer; las que no están en el
+            perfil se ignoran. Para un mnemónico repetido (DEPTH:1, DEPTH:2 en lasio) pedir
+            DEPTH devuelve la primera aparición. Valor default es None (todas).
+        use_mmap (bool, optional): mapear el archivo en memoria. Valor default es True.
+
+    Raises:
+        LASNoSoportado: si el perfil requiere el parser completo de lasio
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], Dict]: curvas leídas y datos del header
+    """
+
+    with open(file, "rb") as f:
+        if use_mmap:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # archivo vacío
+                raise LASNoSoportado("Archivo vacío") from e
+        else:
+            buffer = f.read()
+
+    try:
+        match = _RE_SECCION_ASCII.search(buffer)
+        if match is None:
+            raise LASNoSoportado("El perfil no tiene sección ~ASCII")
+        info = leer_header(bytes(buffer[: match.start()]).decode("utf-8", errors="replace"))
+
+        nombres = nombres_unicos(info["curvas"])
+        if columns is None:
+            columns = nombres
+        # Una curva repetida (DEPTH:1, DEPTH:2) se devuelve con su nombre original
+        # tomando la primera aparición. Las curvas que no existen se ignoran.
+        origen = {}
+        for columna in columns:
+            if columna in nombres:
+                origen[columna] = nombres.index(columna)
+            elif columna + ":1" in nombres:
+                origen[columna] = nombres.index(columna + ":1")
+        columns = list(origen)
+        indices = list(origen.values())
+
+        inicio = buffer.find(b"\n", match.end())
+        inicio = len(buffer) if inicio < 0 else inicio + 1
+        bloques = []
+        while inicio < len(buffer):
+            fin = buffer.find(b"\n", min(inicio + CHUNK_SIZE, len(buffer)))
+            fin = len(buffer) if fin < 0 else fin + 1
+            bloques.append(_parsear_bloque(buffer[inicio:fin], len(nombres), indices))
+            inicio = fin
+    finally:
+        if use_mmap:
+            buffer.close()
+
+    matriz = np.concatenate(bloques) if bloques else np.empty((0, len(indices)))
+    if info["null"] is not None:
+        matriz[matriz == info["null"]] = np.nan
+
+    curvas = {c: np.ascontiguousarray(matriz[:, i]) for i, c in enumerate(columns)}
+
+    return curvas, info
+
+
+def comparar_con_lasio(
+    file, columns: Optional[Sequence[str]] = None, repeticiones: int = 3
+) -> Dict:
+    """
+    Compara tiempos y resultados del lector rápido contra lasio.read + las.df()
+
+    Args:
+        file: path del archivo .las
+        columns (Optional[Sequence[str]], optional): curvas a leer. Valor default es None (todas).
+        repeticiones (int, optional): cantidad de lecturas por lector. Valor default es 3.
+
+    Returns:
+        Dict: mejor tiempo de cada lector (s), aceleración y si los valores coinciden
+    """
+
+    import lasio  # pylint: disable=import-outside-toplevel
+
+    t_rapido, t_lasio = [], []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        curvas, _ = read_las(file, columns)
+        t_rapido.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        df = lasio.read(file).df().reset_index()
+        t_lasio.append(time.perf_counter() - t0)
+
+    # read_las devuelve una curva repetida con su nombre original (primera aparición);
+    # lasio la nombra DEPTH:1, DEPTH:2 (ver nombres_unicos)
+    en_lasio = {c: c if c in df.columns else c + ":1" for c in curvas}
+    iguales = all(
+        en_lasio[c] in df.columns
+        and np.allclose(curvas[c], df[en_lasio[c]].to_numpy(dtype=np.float64), equal_nan=True)
+        for c in curvas
+    )
+
+    return {
+        "rapido_s": min(t_rapido),
+        "lasio_s": min(t_lasio),
+        "aceleracion": min(t_lasio) / min(t_rapido),
+        "iguales": iguales,
+    }
+
+
+if __name__ == "__main__":
+    # python src/las_reader.py perfil1.las [perfil2.las ...]
+    for archivo in sys.argv[1:]:
+        print(Path(archivo).name, comparar_con_lasio(archivo))
@@ -0,0 +1,169 @@
+"""escritura rápida de perfiles LAS 2.0"""
+
+from contextlib import nullcontext
+from datetime import datetime
+from typing import List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Filas de ~ASCII que se formatean de una vez
+CHUNK_ROWS = 100_000
+
+# Formato de cada valor (el mismo que usa lasio por defecto)
+FORMATO = "%10.5f"
+
+NULL = -999.0
+
+# Campos de ~Well en el orden en que los escribe lasio: mnemónico, unidad, descripción
+_CAMPOS_WELL = (
+    ("STRT", "m", "START DEPTH"),
+    ("STOP", "m", "STOP DEPTH"),
+    ("STEP", "m", "STEP"),
+    ("NULL", "", "NULL VALUE"),
+    ("COMP", "", "COMPANY"),
+    ("WELL", "", "WELL"),
+    ("FLD", "", "FIELD"),
+    ("LOC", "", "LOCATION"),
+    ("PROV", "", "PROVINCE"),
+    ("CNTY", "", "COUNTY"),
+    ("STAT", "", "STATE"),
+    ("CTRY", "", "COUNTRY"),
+    ("SRVC", "", "SERVICE COMPANY"),
+    ("DATE", "", "DATE"),
+    ("UWI", "", "UNIQUE WELL ID"),
+    ("API", "", "API NUMBER"),
+)
+
+
+def _titulo(seccion: str) -> str:
+    """Línea de inicio de sección (ej.: "~Well ------")"""
+
+    return f"~{seccion} ".ljust(60, "-")
+
+
+def _seccion(items: Sequence[Tuple[str, str, str, str]]) -> List[str]:
+    """
+    Formatea las líneas de una sección del header alineadas como lo hace lasio
+
+    Args:
+        items (Sequence[Tuple[str, str, str, str]]): mnemónico, unidad, valor y descripción
+
+    Returns:
+        List[str]: líneas "MNEM.UNIT  VALOR : DESCRIPCIÓN"
+    """
+
+    ancho_mnemonico = max(len(m) for m, _, _, _ in items)
+    izquierdas = [f"{m:<{ancho_mnemonico}}.{u}" for m, u, _, _ in items]
+    ancho_izquierda = max(len(i) for i in izquierdas)
+    ancho_valor = max(len(v) for _, _, v, _ in items)
+
+    return [
+        f"{izq:<{ancho_izquierda}} {v:>{ancho_valor}} : {d}"
+        for izq, (_, _, v, d) in zip(izquierdas, items)
+    ]
+
+
+def _step(profundidad: np.ndarray) -> float:
+    """Paso de profundidad si es constante, 0 si no (como lasio)"""
+
+    if profundidad.size < 2:
+        return 0.0
+    pasos = np.diff(profundidad)
+
+    return float(pasos[0]) if np.allclose(pasos, pasos[0]) else 0.0
+
+
+def header_las(
+    nombres: Sequence[str], profundidad: np.ndarray, well: str, fecha: str, null: float = NULL
+) -> str:
+    """
+    Arma el header LAS 2.0 (~Version, ~Well, ~Curve, ~Params, ~Other y la línea ~ASCII)
+
+    Args:
+        nombres (Sequence[str]): mnemónicos de las curvas; la primera es la profundidad
+        profundidad (np.ndarray): valores de la primera curva
+        well (str): nombre del pozo
+        fecha (str): fecha del campo DATE
+        null (float, optional): valor NULL. Valor default es NULL.
+
+    Returns:
+        str: header completo terminado en salto de línea
+    """
+
+    strt, stop = (profundidad[0], profundidad[-1]) if profundidad.size else (np.nan, np.nan)
+    valores = {
+        "STRT": f"{strt:.5f}",
+        "STOP": f"{stop:.5f}",
+        "STEP": f"{_step(profundidad):.5f}",
+        "NULL": str(float(null)),
+        "WELL": well,
+        "DATE": fecha,
+    }
+
+    lineas = [_titulo("Version")]
+    lineas += _seccion(
+        [
+            ("VERS", "", "2.0", "CWLS log ASCII Standard -VERSION 2.0"),
+            ("WRAP", "", "NO", "One line per depth step"),
+            ("DLM", "", "SPACE", "Column Data Section Delimiter"),
+        ]
+    )
+    lineas.append(_titulo("Well"))
+    lineas += _seccion([(m, u, valores.get(m, ""), d) for m, u, d in _CAMPOS_WELL])
+    lineas.append(_titulo("Curve Information"))
+    lineas += _seccion([(n, "m" if i == 0 else "", "", "") for i, n in enumerate(nombres)])
+    lineas.append(_titulo("Params"))
+    lineas.append(_titulo("Other"))
+    ancho = len(FORMATO % 0.0)
+    lineas.append(
+        "~ASCII " + " ".join([nombres[0]] + [f"{n:>{ancho}}" for n in nombres[1:]])
+    )
+
+    return "\n".join(lineas) + "\n"
+
+
+def write_las(
+    file,
+    curvas: Mapping[str, Sequence[float]],
+    well: str,
+    fecha: Optional[str] = None,
+    null: float = NULL,
+    chunk_rows: int = CHUNK_ROWS,
+):
+    """
+    Escribe un perfil LAS 2.0 sin armar un lasio.LASFile. La sección ~ASCII se formatea
+    por bloques de chunk_rows filas con una sola operación de formato por bloque, así el
+    texto completo nunca está en memoria. Los NaN se escriben como null.
+
+    Args:
+        file: path del archivo .las o stream de texto abierto (ej.: io.StringIO)
+        curvas (Mapping[str, Sequence[float]]): curvas en orden (ej.: un DataFrame);
+            la primera es la profundidad
+        well (str): nombre del pozo
+        fecha (Optional[str], optional): fecha del campo DATE. Valor default es None (hoy).
+        null (float, optional): valor NULL. Valor default es NULL.
+        chunk_rows (int, optional): filas por bloque. Valor default es CHUNK_ROWS.
+    """
+
+    nombres = [str(n) for n in curvas]
+    columnas = [np.asarray(curvas[n], dtype=np.float64) for n in curvas]
+    n_filas = len(columnas[0]) if columnas else 0
+    if fecha is None:
+        fecha = datetime.today().strftime("%d/%m/%Y")
+
+    formato_fila = " " + " ".join([FORMATO] * len(columnas)) + "\n"
+    # lasio escribe los NaN como el valor null sin formatear (ej.: "-999.0")
+    nan = FORMATO % np.nan
+    nan_null = str(float(null)).rjust(len(nan))
+
+    if hasattr(file, "write"):
+        contexto = nullcontext(file)
+    else:
+        contexto = open(file, "w", encoding="utf-8", newline="\n")
+
+    with contexto as f:
+        f.write(header_las(nombres, columnas[0] if columnas else np.empty(0), well, fecha, null))
+        for inicio in range(0, n_filas, chunk_rows):
+            bloque = np.column_stack([c[inicio : inicio + chunk_rows] for c in columnas])
+            texto = (formato_fila * len(bloque)) % tuple(bloque.ravel().tolist())
+            f.write(texto.replace(nan, nan_null))
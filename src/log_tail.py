@@ -0,0 +1,224 @@
+"""lectura incremental del log (por offset y en stream) filtrable por trabajo"""
+
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from config import config
+
+LOG_FILE = Path(config.LOGS_DIR, "info.log")
+
+# Bytes máximos por lectura: un cliente atrasado recibe el log en varias respuestas
+LIMITE = 1024**2
+
+# Primera línea de cada registro del formato "detailed" de config.logging_config
+_ENCABEZADO = re.compile(r"^(DEBUG|INFO|WARNING|ERROR|CRITICAL) \d{4}-\d{2}-\d{2} ")
+
+
+class FiltroRegistros:
+    """
+    Deja pasar solo los registros de un trabajo. Un registro ocupa varias líneas (encabezado,
+    mensaje y traza): se decide con el encabezado y se recuerda entre llamadas, así el
+    filtro funciona sobre bloques que cortan un registro al medio.
+    """
+
+    def __init__(self, trabajo: str, incluir: bool = False):
+
+        self.marca = f"[trabajo={trabajo}]"
+        # Si el registro en curso es del trabajo. Sin estado previo, las líneas anteriores
+        # al primer encabezado son de un registro que no se vio entero
+        self.incluir = incluir
+
+    def aplicar(self, texto: str) -> str:
+        """
+        Filtra un bloque de líneas completas
+
+        Args:
+            texto (str): líneas del log
+
+        Returns:
+            str: líneas de los registros del trabajo
+        """
+
+        salida = []
+        for linea in texto.splitlines(keepends=True):
+            if _ENCABEZADO.match(linea):
+                self.incluir = self.marca in linea
+            if self.incluir:
+                salida.append(linea)
+
+        return "".join(salida)
+
+
+def _resto_de_linea(f, limite: int) -> bytes:
+    """Lee desde la posición actual hasta el próximo salto de línea (inclusive) o el final"""
+
+    resto = b""
+    while True:
+        bloque = f.read(limite)
+        corte = bloque.find(b"\n") + 1
+        if corte > 0:
+            # se deja el archivo al final de la línea
+            f.seek(corte - len(bloque), os.SEEK_CUR)
+            return resto + bloque[:corte]
+        resto += bloque
+        if not bloque:
+            return resto
+
+
+def leer_desde(
+    since: Optional[int] = None,
+    limite: int = LIMITE,
+    trabajo: Optional[str] = None,
+    inodo: Optional[int] = None,
+    path: Path = LOG_FILE,
+    incluir: bool = False,
+) -> Dict:
+    """
+    Lee el log a partir de un offset en bytes, sin cargar el archivo completo.
+    La lectura termina en un salto de línea, así el offset devuelto siempre
+    apunta al inicio de una línea (una línea más larga que limite se devuelve completa).
+
+    Args:
+        since (Optional[int], optional): offset devuelto por la lectura anterior.
+            Valor default es None (los últimos `limite` bytes).
+        limite (int, optional): bytes máximos a leer. Valor default es LIMITE.
+        trabajo (Optional[str], optional): devuelve solo los registros de este trabajo.
+            Valor default es None.
+        inodo (Optional[int], optional): inodo devuelto por la lectura anterior; si el
+            archivo cambió (rotación) se lee desde el inicio. Valor default es None.
+        path (Path, optional): archivo de log. Valor default es LOG_FILE.
+        incluir (bool, optional): `incluir` devuelto por la lectura anterior con el mismo
+            trabajo: si el registro cortado en el offset es del trabajo. Valor default es False.
+
+    Returns:
+        Dict: logger (texto), offset para la próxima lectura, tamano del archivo, inodo,
+            rotado (si se volvió a leer desde el inicio), completo (si se llegó al final)
+            e incluir (estado del filtro por trabajo para la próxima lectura)
+    """
+
+    with open(path, "rb") as f:
+        estado = os.fstat(f.fileno())
+        rotado = since is not None and (
+            since > estado.st_size or (inodo is not None and inodo != estado.st_ino)
+        )
+        if since is None:
+            inicio = max(0, estado.st_size - limite)
+            if inicio > 0:
+                # la cola empieza en la primera línea completa
+                f.seek(inicio - 1)
+                inicio += len(_resto_de_linea(f, limite)) - 1
+            # no hay estado previo del filtro
+            incluir = False
+        else:
+            inicio = 0 if rotado else since
+            incluir = incluir and not rotado
+        f.seek(inicio)
+        datos = f.read(limite)
+
+        if inicio + len(datos) < estado.st_size:
+            corte = datos.rfind(b"\n") + 1
+            if corte > 0:
+                datos = datos[:corte]
+            else:
+                datos += _resto_de_linea(f, limite)
+
+    offset = inicio + len(datos)
+    texto = datos.decode("utf-8", errors="replace")
+    if trabajo:
+        filtro = FiltroRegistros(trabajo, incluir)
+        texto = filtro.aplicar(texto)
+        incluir = filtro.incluir
+
+    return {
+        "logger": texto,
+        "offset": offset,
+        "tamano": estado.st_size,
+        "inodo": estado.st_ino,
+        "rotado": rotado,
+        "completo": offset >= estado.st_size,
+        "incluir": incluir,
+    }
+
+
+def seguir(
+    since: Optional[int] = None,
+    trabajo: Optional[str] = None,
+    path: Path = LOG_FILE,
+    intervalo: float = 0.5,
+    latido: float = 15.0,
+    limite: int = LIMITE,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Sigue el log (como `tail -f`): devuelve las líneas nuevas a medida que se escriben.
+    Si el archivo rota, sigue desde el inicio del archivo nuevo.
+
+    Args:
+        since (Optional[int], optional): offset desde donde leer.
+            Valor default es None (solo lo que se escriba de ahora en más).
+        trabajo (Optional[str], optional): devuelve solo los registros de este trabajo.
+            Valor default es None.
+        path (Path, optional): archivo de log. Valor default es LOG_FILE.
+        intervalo (float, optional): segundos entre consultas sin datos nuevos.
+            Valor default es 0.5.
+        latido (float, optional): segundos sin datos tras los que se devuelve un texto
+            vacío (permite mantener viva la conexión). Valor default es 15.0.
+        limite (int, optional): bytes máximos por lectura. Valor default es LIMITE.
+
+    Yields:
+        Iterator[Tuple[int, str]]: offset al final de las líneas devueltas y las líneas
+    """
+
+    filtro = FiltroRegistros(trabajo) if trabajo else None
+    f = None
+    offset = since
+    pendiente = b""
+    ultimo = time.monotonic()
+    try:
+        while True:
+            if f is None:
+                try:
+                    f = open(path, "rb")
+                except OSError:
+                    time.sleep(intervalo)
+                    continue
+                estado = os.fstat(f.fileno())
+                offset = estado.st_size if offset is None or offset > estado.st_size else offset
+                f.seek(offset)
+                pendiente = b""
+
+            datos = f.read(limite)
+            if datos:
+                # solo se devuelven líneas completas; el resto espera a la próxima lectura
+                datos = pendiente + datos
+                corte = datos.rfind(b"\n") + 1
+                pendiente = datos[corte:]
+                offset = f.tell() - len(pendiente)
+                texto = datos[:corte].decode("utf-8", errors="replace")
+                if filtro is not None:
+                    texto = filtro.aplicar(texto)
+                if texto:
+                    ultimo = time.monotonic()
+                    yield offset, texto
+                continue
+
+            # Sin datos nuevos: si el archivo rotó se abre el nuevo desde el inicio
+            try:
+                actual = os.stat(path)
+            except OSError:
+                actual = None
+            if actual is None or actual.st_ino != estado.st_ino or actual.st_size < f.tell():
+                f.close()
+                f = None
+                offset = 0
+                continue
+
+            if time.monotonic() - ultimo >= latido:
+                ultimo = time.monotonic()
+                yield offset, ""
+            time.sleep(intervalo)
+    finally:
+        if f is not None:
+            f.close()
@@ -3,22 +3,27 @@
 import logging
 import os
 import pickle
-import sys
-from typing import Dict
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 import joblib
 import lasio
+import numpy as np
 import pandas as pd
 
 import ic_class
+import las_cache
+import las_reader
 import predict as pred
+import salidas
 from config import config
 from config.config import logger
 
 
-def cargo_las(file: str) -> pd.DataFrame:
+def _cargo_las_lasio(file: str) -> pd.DataFrame:
     """
-    Genera un dataframe a partir de un archivo con formato las
+    Genera un dataframe con todas las curvas de un archivo .las usando lasio
 
     Args:
         file (str): archivo .las a cargar en un dataframe
@@ -55,23 +60,150 @@ def cargo_las(file: str) -> pd.DataFrame:
     return df_out
 
 
+def _leer_curvas(file: str, columnas: List[str]) -> Tuple[Dict, Dict]:
+    """
+    Lee las curvas pedidas con el lector rápido (las_reader) o, si el perfil
+    no es soportado por este, con lasio
+
+    Args:
+        file (str): archivo .las
+        columnas (List[str]): curvas necesarias
+
+    Returns:
+        Tuple[Dict, Dict]: curvas (arrays de NumPy) y header con el nombre del pozo
+    """
+
+    try:
+        return las_reader.read_las(file, columnas)
+    except las_reader.LASNoSoportado as e:
+        logger.info("Lectura con lasio: %s", e)
+
+    df_las = _cargo_las_lasio(file)
+    curvas = {c: df_las[c].to_numpy(dtype=float) for c in columnas if c in df_las.columns}
+    well = df_las["WELL"].iloc[0] if len(df_las) > 0 else ""
+
+    return curvas, {"well": well}
+
+
+def cargo_las(file: str, columnas: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Genera un dataframe a partir de un archivo con formato las.
+    Si se indican las columnas, se leen solo esas curvas: primero se buscan en la
+    caché de perfiles (las_cache, por hash del contenido) y, si no están, se leen
+    con el lector rápido o con lasio y se guardan en la caché.
+
+    Args:
+        file (str): archivo .las a cargar en un dataframe
+        columnas (Optional[List[str]], optional): curvas necesarias. Valor default es None
+            (se leen todas con lasio).
+
+    Returns:
+        pd.DataFrame: dataframe con el contenido del .las
+    """
+
+    if columnas is None:
+        return _cargo_las_lasio(file)
+
+    cacheado = None
+    if config.LAS_CACHE:
+        clave = las_cache.hash_archivo(file)
+        cacheado = las_cache.leer(clave, columnas)
+
+    if cacheado is not None:
+        logger.info("Perfil %s leído desde la caché", Path(file).name)
+        curvas, header = cacheado
+    else:
+        curvas, header = _leer_curvas(file, columnas)
+        if config.LAS_CACHE:
+            las_cache.guardar(clave, curvas, header, columnas)
+
+    # El largo se indica explícitamente: sin ninguna de las curvas pedidas queda un
+    # DataFrame vacío que igual tiene la columna WELL
+    filas = len(next(iter(curvas.values()))) if curvas else 0
+    df_out = pd.DataFrame(
+        {c: np.asarray(v) for c, v in curvas.items()}, index=pd.RangeIndex(filas)
+    )
+    # contenido de WELL en el header del .las
+    df_out["WELL"] = header["well"]
+
+    return df_out
+
+
+# Caché de artefactos a nivel de proceso: ruta -> (firma en disco, objeto cargado)
+_ARTIFACTS_CACHE: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
+
+def _firma_artefacto(fp: Path) -> Tuple[int, int]:
+    """
+    Firma de un artefacto en disco. Cambia cuando el archivo se reemplaza o se modifica.
+
+    Args:
+        fp (Path): ruta del artefacto
+
+    Returns:
+        Tuple[int, int]: fecha de modificación (ns) y tamaño en bytes
+    """
+
+    stat = os.stat(fp)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _load_pickle(fp: Path) -> Any:
+    """
+    Deserializa un archivo pickle
+
+    Args:
+        fp (Path): ruta del archivo
+
+    Returns:
+        Any: objeto deserializado
+    """
+
+    with open(fp, "rb") as f:
+        return pickle.load(f)
+
+
+def _cargar_artefacto(fp: Path, loader: Callable[[Path], Any]) -> Any:
+    """
+    Devuelve el artefacto desde la caché del proceso. Solo se lee de disco
+    la primera vez o cuando cambió su firma (fecha de modificación o tamaño).
+
+    Args:
+        fp (Path): ruta del artefacto
+        loader (Callable[[Path], Any]): función que carga el artefacto desde disco
+
+    Returns:
+        Any: artefacto cargado
+    """
+
+    firma = _firma_artefacto(fp)
+    cacheado = _ARTIFACTS_CACHE.get(str(fp))
+    if cacheado is not None and cacheado[0] == firma:
+        logger.debug("Artefacto %s obtenido de la caché", fp.name)
+        return cacheado[1]
+
+    artefacto = loader(fp)
+    _ARTIFACTS_CACHE[str(fp)] = (firma, artefacto)
+    logger.info("Carga artefacto %s", fp.name)
+
+    return artefacto
+
+
 def load_artifacts() -> Dict:
     """
-    Cargar artefactos para la predicción.
+    Cargar artefactos para la predicción. Los artefactos se mantienen en una caché
+    a nivel de proceso y se vuelven a leer de disco solo si el archivo cambió.
 
     Returns:
         Dict: artefactos de ejecución.
     """
 
     artifacts_dir = config.MODELS_DIR
-    logger.info("artifacts dir: %s", artifacts_dir)
+    logger.debug("artifacts dir: %s", artifacts_dir)
     model_fp = artifacts_dir.joinpath(config.MODELO)
     ic_class_fp = artifacts_dir.joinpath(config.IC_CLASS)
-    model = joblib.load(model_fp)
-    logger.info("Carga modelo %s", config.MODELO)
-    with open(ic_class_fp, "rb") as f:
-        ic_class_predict: ic_class = pickle.load(f)
-    logger.info("Carga modelo ic_class %s", config.IC_CLASS)
+    model = _cargar_artefacto(model_fp, joblib.load)
+    ic_class_predict: ic_class = _cargar_artefacto(ic_class_fp, _load_pickle)
 
     return {
         "model": model,
@@ -79,6 +211,49 @@ def load_artifacts() -> Dict:
     }
 
 
+def load_modelos_minerales(columnas: Sequence[str], ds_logger: logging.Logger = logger) -> Dict:
+    """
+    Carga solo los modelos de mineralogía de config.MINERALES que el perfil puede
+    alimentar (todas sus features están en columnas). Usa la caché de artefactos.
+    Un modelo que no se puede cargar se omite con un warning: nunca bloquea las
+    predicciones de TOC.
+
+    Args:
+        columnas (Sequence[str]): curvas disponibles en el perfil
+        ds_logger (logging.Logger, optional): logger. Valor default es logger.
+
+    Returns:
+        Dict: mineral -> modelo (model_with_IC.ModelwithMaronnaIC)
+    """
+
+    disponibles = set(columnas)
+    modelos = {}
+    for mineral in config.MINERALES:
+        if mineral not in config.MODELOS_MINERALES:
+            ds_logger.warning("No hay un modelo registrado para %s", mineral)
+            continue
+
+        ok_features = set(config.MODEL_FEATURES[mineral]).issubset(disponibles)
+        ds_logger.info(
+            "¿Están las columnas %s para el modelo %s?: %s",
+            config.MODEL_FEATURES[mineral],
+            mineral,
+            str(ok_features),
+        )
+        if not ok_features:
+            continue
+
+        inicio = time.perf_counter()
+        try:
+            modelos[mineral] = _cargar_artefacto(config.MODELOS_MINERALES[mineral], joblib.load)
+        except Exception as e:  # pylint: disable=broad-except
+            ds_logger.warning("No se pudo cargar el modelo %s, se omite: %s", mineral, e)
+            continue
+        ds_logger.info("Modelo %s cargado en %.2f s", mineral, time.perf_counter() - inicio)
+
+    return modelos
+
+
 def inicializar_logger(logfile: str) -> logging.Logger:
     """
     Inicializa el logging interno de DS
@@ -123,6 +298,10 @@ def predict(archivo: str):
 
     Args:
         archivo (str): nombre del archivo
+
+    Raises:
+        ValueError: si no se puede leer el perfil o no tiene filas con ninguna de las
+            curvas de config.LAS_COLUMNAS (se mueve a processed como ERROR_LECTURA_)
     """
 
     artifacts = load_artifacts()
@@ -132,81 +311,79 @@ def predict(archivo: str):
     logname = archivo[:-4] + ".log"
     logfile = config.DATA_OUTPUT_DIR.joinpath(archivo).joinpath(logname)
     ds_logger = inicializar_logger(logfile=logfile)
-    ds_logger.info("INICIA PROCESO: %s", archivo)
-
-    ds_logger.info("Lectura de datos desde el perfil %s", archivo)
-    input_fp = config.DATA_INPUT_DIR.joinpath(archivo)
     try:
-        data = cargo_las(input_fp)
-    except ValueError as e:
-        ds_logger.critical("No se puede abrir el perfil %s", archivo)
-        ds_logger.critical(e)
-        ds_logger.info("No se puede ejecutar los modelos de predicción de TOC.")
-        ds_logger.info("Moviendo archivo de la carpeta input a processed...")
-        output_fp = config.DATA_PROCESSED_DIR.joinpath("/ERROR_LECTURA_" + archivo)
-        os.rename(input_fp, output_fp)
-        ds_logger.info("FIN PROCESO: %s", archivo)
-        sys.exit(1)
-
-    well = data["WELL"][0]
-    # Predice model1?
-    ok_model1 = set(config.MODEL_TOC_GPR_DENSIDAD).issubset(set(data.columns))
-    ds_logger.info(
-        "¿Están las columnas de profundidad y densidad (DEPTH, RHOZ)?: %s", str(ok_model1)
-    )
-
-    # Predice modelo Cuervo?
-    ok_model_cuervo = set(config.MODEL_TOC_CUERVO).issubset(set(data.columns))
-    ds_logger.info(
-        "¿Están la columna de densidad, resistividad y sónico (DEPTH, RHOZ, AT90 y DTCO)?: %s",
-        str(ok_model_cuervo),
-    )
-
-    # WARNING por rangos fuera de lo conocido por el modelo
-
-    df_coe = data[config.MODEL_TOC_GPR_DENSIDAD]
-    df_coe = df_coe[df_coe > 0].dropna().reset_index(drop=True)
-    if ok_model1 & ok_model_cuervo:
-        df_cuervo = data[config.MODEL_TOC_CUERVO]
-        df_cuervo = df_cuervo[df_cuervo > 0].dropna().reset_index(drop=True)
-
-        pred.predict_model(
-            archivo=archivo,
-            artifacts=artifacts,
-            output_dir=config.DATA_OUTPUT_DIR,
-            objetivo=config.OBJETIVO,
-            data=df_coe,
-            well=well,
-            ejecuta_cuervo=True,
-            df_cuervo=df_cuervo,
+        ds_logger.info("INICIA PROCESO: %s", archivo)
+
+        ds_logger.info("Lectura de datos desde el perfil %s", archivo)
+        input_fp = config.DATA_INPUT_DIR.joinpath(archivo)
+        try:
+            data = cargo_las(input_fp, columnas=config.LAS_COLUMNAS)
+            if data.empty:
+                raise ValueError(
+                    f"El perfil no tiene filas con ninguna de las curvas {config.LAS_COLUMNAS}"
+                )
+        except ValueError as e:
+            ds_logger.critical("No se puede abrir el perfil %s", archivo)
+            ds_logger.critical(e)
+            ds_logger.info("No se puede ejecutar los modelos de predicción de TOC.")
+            ds_logger.info("Moviendo archivo de la carpeta input a processed...")
+            output_fp = config.DATA_PROCESSED_DIR.joinpath("/ERROR_LECTURA_" + archivo)
+            os.rename(input_fp, output_fp)
+            ds_logger.info("FIN PROCESO: %s", archivo)
+            raise
+
+        well = data["WELL"].iloc[0]
+        # Predice model1?
+        ok_model1 = set(config.MODEL_TOC_GPR_DENSIDAD).issubset(set(data.columns))
+        ds_logger.info(
+            "¿Están las columnas de profundidad y densidad (DEPTH, RHOZ)?: %s", str(ok_model1)
         )
 
-    elif ok_model1:
-        pred.predict_model(
-            archivo=archivo,
-            artifacts=artifacts,
-            output_dir=config.DATA_OUTPUT_DIR,
-            objetivo=config.OBJETIVO,
-            data=df_coe,
-            well=well,
-            ejecuta_cuervo=False,
-            df_cuervo=pd.DataFrame(),
-        )
-    else:
-        ds_logger.critical(
-            "No se encuentran las columnas requeridas para la predicción de los modelos."
+        # Predice modelo Cuervo?
+        ok_model_cuervo = set(config.MODEL_TOC_CUERVO).issubset(set(data.columns))
+        ds_logger.info(
+            "¿Están la columna de densidad, resistividad y sónico "
+            "(DEPTH, RHOZ, AT90 y DTCO)?: %s",
+            str(ok_model_cuervo),
         )
-        ds_logger.info("No se puede ejecutar los modelos de predicción de TOC.")
-        ds_logger.info("Moviendo archivo de la carpeta input a processed...")
-        output_fp = config.DATA_PROCESSED_DIR.joinpath("/ERROR_LECTURA_" + archivo)
-        os.rename(input_fp, output_fp)
-        ds_logger.info("FIN PROCESO: %s", archivo)
 
-        return
+        # WARNING por rangos fuera de lo conocido por el modelo
+
+        if ok_model1:
+            # COE y Cuervo se evalúan sobre las mismas curvas, sin filtrar copias por modelo
+            pred.predict_model(
+                archivo=archivo,
+                artifacts=artifacts,
+                output_dir=config.DATA_OUTPUT_DIR,
+                objetivo=config.OBJETIVO,
+                data=data,
+                well=well,
+                ejecuta_cuervo=ok_model_cuervo,
+                columnas_coe=config.MODEL_TOC_GPR_DENSIDAD,
+                columnas_cuervo=config.MODEL_TOC_CUERVO,
+                chunk_size=config.PREDICT_CHUNK_SIZE,
+                n_jobs=config.PREDICT_N_JOBS,
+                formatos=salidas.parsear_formatos(config.FORMATOS_SALIDA),
+                modelos_minerales=load_modelos_minerales(data.columns, ds_logger),
+                features_minerales=config.MODEL_FEATURES,
+            )
+        else:
+            ds_logger.critical(
+                "No se encuentran las columnas requeridas para la predicción de los modelos."
+            )
+            ds_logger.info("No se puede ejecutar los modelos de predicción de TOC.")
+            ds_logger.info("Moviendo archivo de la carpeta input a processed...")
+            output_fp = config.DATA_PROCESSED_DIR.joinpath("/ERROR_LECTURA_" + archivo)
+            os.rename(input_fp, output_fp)
+            ds_logger.info("FIN PROCESO: %s", archivo)
+
+            return
 
-    ds_logger.info("Moviendo archivo de la carpeta input a processed...")
-    output_fp = config.DATA_PROCESSED_DIR.joinpath(archivo)
-    os.rename(input_fp, output_fp)
+        ds_logger.info("Moviendo archivo de la carpeta input a processed...")
+        output_fp = config.DATA_PROCESSED_DIR.joinpath(archivo)
+        os.rename(input_fp, output_fp)
 
-    ds_logger.info("FIN PROCESO: %s", archivo)
-    finalizar_logger(ds_logger=ds_logger)
+        ds_logger.info("FIN PROCESO: %s", archivo)
+    finally:
+        # el handler del .log se cierra siempre, así no recibe los registros de otro archivo
+        finalizar_logger(ds_logger=ds_logger)
@@ -1,32 +1,33 @@
 """utilidades de inferencia"""
 
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Mapping, Optional, Sequence, Tuple
 
-import lasio
 import numpy as np
 import pandas as pd
 
+import ic_class
+import las_writer
+import salidas
 
-def write_las_file(file_name: Path, well: str, data: pd.DataFrame) -> None:
+
+def write_las_file(file_name: Path, well: str, data: Mapping[str, np.ndarray]) -> None:
     """
-    Guarda un dataframe como archivo .las
+    Guarda un dataframe (o diccionario de curvas) como archivo .las
 
     Args:
         file_name (str): nombre del archivo .las
         well (str): nombre del pozo
-        data (pd.DataFrame): dataframe con el contenido del archivo las
+        data (Mapping[str, np.ndarray]): dataframe o diccionario con el contenido del archivo las
     """
 
-    las = lasio.LASFile()
-    las.well.WELL = well
-    las.well.DATE = datetime.today().strftime("%d/%m/%Y")
-    las.well.NULL = -999.0000
-    for mnemonic in data.columns:
-        las.append_curve(mnemonic, data[mnemonic])
-    las.write(str(file_name), version=2, mnemonics_header=True, data_section_header="~ASCII")
+    las_writer.write_las(
+        file_name, data, well=well, fecha=datetime.today().strftime("%d/%m/%Y"), null=-999.0000
+    )
 
 
 def cuervo_model(df: pd.DataFrame) -> float:
@@ -34,7 +35,7 @@ def cuervo_model(df: pd.DataFrame) -> float:
     Calcula TOC_Cuervo
 
     Args:
-        df (pd.DataFrame): dataframe que contiene los features de cuervo
+        df (pd.DataFrame): dataframe (o diccionario de arrays) que contiene los features de cuervo
 
     Returns:
         float: valor para la predicción TOC_Cuervo
@@ -43,15 +44,247 @@ def cuervo_model(df: pd.DataFrame) -> float:
     return 100 * (-0.472 + (1.12 / X_rhoz) + 0.0072 * np.log10(X_at90) + 0.00048 * X_dtco)
 
 
+def predict_por_bloques(
+    model, X: pd.DataFrame, chunk_size: int = 0, n_jobs: int = 1
+) -> np.ndarray:
+    """
+    Predice por bloques de chunk_size filas escribiendo en un array preasignado, para que
+    la memoria del predictor (ej.: matrices de kernel de un GPR) no crezca con el largo
+    del perfil. El pico de memoria es proporcional a chunk_size * n_jobs.
+
+    Args:
+        model: modelo con método predict
+        X (pd.DataFrame): features
+        chunk_size (int, optional): filas por bloque. Valor default es 0 (sin bloques).
+        n_jobs (int, optional): bloques que se predicen a la vez en hilos. Valor default es 1.
+
+    Returns:
+        np.ndarray: predicción
+    """
+
+    n = len(X)
+    if chunk_size <= 0 or n <= chunk_size:
+        return np.asarray(model.predict(X)).ravel()
+
+    pred_y = np.empty(n, dtype=np.float64)
+
+    def predecir_bloque(inicio: int):
+        fin = min(inicio + chunk_size, n)
+        pred_y[inicio:fin] = np.asarray(model.predict(X.iloc[inicio:fin])).ravel()
+
+    inicios = range(0, n, chunk_size)
+    if n_jobs > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            # list() propaga la primera excepción de un bloque
+            list(executor.map(predecir_bloque, inicios))
+    else:
+        for inicio in inicios:
+            predecir_bloque(inicio)
+
+    return pred_y
+
+
+def mascara_positivos(
+    data, columnas: Sequence[str], mascara: np.ndarray = None, incluye_cero: bool = False
+) -> np.ndarray:
+    """
+    Filas en las que todas las columnas son positivas (los NaN quedan afuera)
+
+    Args:
+        data: dataframe o diccionario de curvas
+        columnas (Sequence[str]): columnas a evaluar
+        mascara (np.ndarray, optional): máscara previa a refinar. Valor default es None.
+        incluye_cero (bool, optional): aceptar también ceros. Valor default es False.
+
+    Returns:
+        np.ndarray: máscara booleana
+    """
+
+    for columna in columnas:
+        valores = np.asarray(data[columna], dtype=np.float64)
+        positivos = valores >= 0 if incluye_cero else valores > 0
+        mascara = positivos if mascara is None else mascara & positivos
+
+    return mascara
+
+
+def evaluar_modelos(
+    artifacts: Dict,
+    data,
+    objetivo: str = "TOC",
+    columnas_coe: Sequence[str] = ("DEPTH", "RHOZ"),
+    columnas_cuervo: Sequence[str] = ("DEPTH", "RHOZ", "AT90", "DTCO"),
+    ejecuta_cuervo: bool = False,
+    chunk_size: int = 0,
+    n_jobs: int = 1,
+) -> Tuple[Dict[str, np.ndarray], Optional[Dict[str, np.ndarray]]]:
+    """
+    Evalúa el modelo COE y, si corresponde, el modelo Cuervo en una sola pasada sobre las
+    curvas leídas. Se calcula una única máscara de valores positivos (la de Cuervo refina la
+    de COE) y cada columna de salida se arma directamente como array, sin copias
+    intermedias del perfil completo.
+
+    Args:
+        artifacts (Dict): diccionario con los artefactos del modelo
+        data: dataframe o diccionario con las curvas del perfil
+        objetivo (str, optional): prefijo de las columnas target. Valor default es "TOC".
+        columnas_coe (Sequence[str], optional): curvas del modelo COE (la primera es la
+            profundidad). Valor default es ("DEPTH", "RHOZ").
+        columnas_cuervo (Sequence[str], optional): curvas del modelo Cuervo. \
+            Valor default es ("DEPTH", "RHOZ", "AT90", "DTCO").
+        ejecuta_cuervo (bool, optional): evaluar también Cuervo. Valor default es False.
+        chunk_size (int, optional): filas por bloque de predicción. \
+            Valor default es 0 (sin bloques).
+        n_jobs (int, optional): bloques que se predicen a la vez. Valor default es 1.
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], Optional[Dict[str, np.ndarray]]]: columnas de salida
+            de COE y de Cuervo (None si no se ejecuta)
+    """
+
+    loggers = logging.getLogger("DS_log.predict")
+    fited_model = artifacts["model"]
+    ic_class_predict = artifacts["ic_class"]
+
+    mascara_coe = mascara_positivos(data, columnas_coe)
+    salida_coe = {c: np.asarray(data[c], dtype=np.float64)[mascara_coe] for c in columnas_coe}
+
+    # Prediccion
+    loggers.info("Ejecutando predicción del modelo TOC_COE...")
+    inicio = time.perf_counter()
+    # El predictor no necesita DEPTH
+    features = pd.DataFrame({c: salida_coe[c] for c in columnas_coe[1:]}, copy=False)
+    pred_y = predict_por_bloques(fited_model, features, chunk_size=chunk_size, n_jobs=n_jobs)
+    del features
+
+    loggers.info("Ejecutando predicción del intervalo de confianza (ic_class)...")
+    cota_inferior, cota_superior = ic_class_predict.maronna_intervals(y_pred=pred_y, alpha=0.1)
+    np.maximum(cota_inferior, 0, out=cota_inferior)
+    np.maximum(cota_superior, 0, out=cota_superior)
+    pred_y[pred_y < 0] = -999.0000
+
+    salida_coe[objetivo + "_COE"] = pred_y
+    salida_coe[objetivo + "_COE_cota_inferior"] = cota_inferior
+    salida_coe[objetivo + "_COE_cota_superior"] = cota_superior
+    loggers.info(
+        "Modelo TOC_COE: %s filas en %.2f s", len(pred_y), time.perf_counter() - inicio
+    )
+
+    if not ejecuta_cuervo:
+        return salida_coe, None
+
+    loggers.info("Ejecutando predicción del modelo TOC_Cuervo...")
+    inicio = time.perf_counter()
+    extra = [c for c in columnas_cuervo if c not in columnas_coe]
+    mascara_cuervo = mascara_positivos(data, extra, mascara_coe.copy())
+    salida_cuervo = {
+        c: np.asarray(data[c], dtype=np.float64)[mascara_cuervo] for c in columnas_cuervo
+    }
+    y_cuervo = np.asarray(cuervo_model(salida_cuervo), dtype=np.float64)
+    y_cuervo[y_cuervo < 0] = 0
+    salida_cuervo["TOC_Cuervo"] = y_cuervo
+    loggers.info(
+        "Modelo TOC_Cuervo: %s filas en %.2f s", len(y_cuervo), time.perf_counter() - inicio
+    )
+
+    return salida_coe, salida_cuervo
+
+
+def _intervalos_mineral(modelo) -> ic_class.MaronnaIntervalModel:
+    """Modelo de intervalos congelado de un ModelwithMaronnaIC (se calcula una vez por modelo)"""
+
+    intervalos = getattr(modelo, "_frozen", None)
+    if intervalos is None:
+        intervalos = ic_class.MaronnaIntervalModel(modelo.loess, modelo.ti, (modelo.alpha,))
+        modelo._frozen = intervalos  # pylint: disable=protected-access
+
+    return intervalos
+
+
+def evaluar_minerales(
+    modelos: Dict,
+    data,
+    features: Dict[str, Sequence[str]],
+    chunk_size: int = 0,
+    n_jobs: int = 1,
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Evalúa los modelos de mineralogía (ModelwithMaronnaIC) sobre las curvas ya leídas.
+    Las máscaras de filas válidas (DEPTH positivo y features no negativas) se calculan
+    una vez por conjunto de features y se comparten entre modelos. Un modelo que falla
+    se omite con un warning, sin afectar al resto.
+
+    Args:
+        modelos (Dict): mineral -> modelo cargado
+        data: dataframe o diccionario con las curvas del perfil
+        features (Dict[str, Sequence[str]]): mineral -> features en el orden del modelo
+        chunk_size (int, optional): filas por bloque de predicción. \
+            Valor default es 0 (sin bloques).
+        n_jobs (int, optional): bloques que se predicen a la vez. Valor default es 1.
+
+    Returns:
+        Dict[str, Dict[str, np.ndarray]]: mineral -> columnas de salida
+            (DEPTH, features, MINERAL, MINERAL_INF y MINERAL_SUP)
+    """
+
+    loggers = logging.getLogger("DS_log.predict")
+    mascaras: Dict[frozenset, np.ndarray] = {}
+    resultados = {}
+    for mineral, modelo in modelos.items():
+        loggers.info("Ejecutando predicción del modelo %s...", mineral)
+        inicio = time.perf_counter()
+
+        try:
+            columnas = list(features[mineral])
+            clave = frozenset(columnas)
+            if clave not in mascaras:
+                mascaras[clave] = mascara_positivos(
+                    data, columnas, mascara_positivos(data, ["DEPTH"]), incluye_cero=True
+                )
+            mascara = mascaras[clave]
+
+            salida = {
+                c: np.asarray(data[c], dtype=np.float64)[mascara] for c in ["DEPTH"] + columnas
+            }
+            X = pd.DataFrame({c: salida[c] for c in columnas}, copy=False)
+            pred_y = predict_por_bloques(modelo.model, X, chunk_size=chunk_size, n_jobs=n_jobs)
+            del X
+
+            intervalos = _intervalos_mineral(modelo)
+            cota_inferior, cota_superior = intervalos.intervals(pred_y, modelo.alpha)
+        except Exception as e:  # pylint: disable=broad-except
+            loggers.warning("Falló la predicción del modelo %s, se omite: %s", mineral, e)
+            continue
+
+        for valores in (pred_y, cota_inferior, cota_superior):
+            np.maximum(valores, 0, out=valores)
+        salida[mineral] = pred_y
+        salida[mineral + "_INF"] = cota_inferior
+        salida[mineral + "_SUP"] = cota_superior
+        resultados[mineral] = salida
+
+        loggers.info(
+            "Modelo %s: %s filas en %.2f s", mineral, len(pred_y), time.perf_counter() - inicio
+        )
+
+    return resultados
+
+
 def predict_model(
     archivo: str,
     artifacts: Dict,
-    data: pd.DataFrame,
+    data,
     output_dir: Path,
     objetivo: str = "TOC",
     well: str = "Pozo_UNK",
     ejecuta_cuervo: bool = False,
-    df_cuervo: pd.DataFrame = pd.DataFrame,
+    columnas_coe: Sequence[str] = ("DEPTH", "RHOZ"),
+    columnas_cuervo: Sequence[str] = ("DEPTH", "RHOZ", "AT90", "DTCO"),
+    chunk_size: int = 0,
+    n_jobs: int = 1,
+    formatos: Sequence[str] = ("xlsx",),
+    modelos_minerales: Optional[Dict] = None,
+    features_minerales: Optional[Dict[str, Sequence[str]]] = None,
 ):
     """
     Predecir los perfiles sinteticos
@@ -59,14 +292,25 @@ def predict_model(
     Args:
         archivo (str): archivo .las
         artifacts (Dict): diccionario con los artefactos del modelo
+        data: curvas del perfil (dataframe o diccionario de arrays), sin filtrar
         output_dir (str, optional): carpeta de salida. Valor default es "output".
         objetivo (str, optional): prefijo utilizado en las columnas target. Valor default es "TOC".
-        data (pd.DataFrame, optional): dataframe COE ["DEPTH", "RHOZ"]. Valor default es None.
         well (str, optional): nombre del pozo. Valor default es "Pozo_UNK".
         ejecuta_cuervo (bool, optional): si ejecutar también la predicción Cuervo. \
             Valor default es False.
-        df_cuervo (pd.DataFrame, optional): dataframe Cuervo ["DEPTH", "RHOZ", "AT90", "DTCO"]. \
-            Valor default es pd.DataFrame.
+        columnas_coe (Sequence[str], optional): curvas del modelo COE. \
+            Valor default es ("DEPTH", "RHOZ").
+        columnas_cuervo (Sequence[str], optional): curvas del modelo Cuervo. \
+            Valor default es ("DEPTH", "RHOZ", "AT90", "DTCO").
+        chunk_size (int, optional): filas por bloque de predicción. \
+            Valor default es 0 (sin bloques).
+        n_jobs (int, optional): bloques que se predicen a la vez. Valor default es 1.
+        formatos (Sequence[str], optional): formatos de las tablas de salida \
+            ("parquet", "csv", "xlsx"). Valor default es ("xlsx",).
+        modelos_minerales (Optional[Dict], optional): modelos de mineralogía aplicables \
+            al perfil (mineral -> modelo). Valor default es None.
+        features_minerales (Optional[Dict[str, Sequence[str]]], optional): features de \
+            cada modelo de mineralogía. Valor default es None.
     """
 
     # nombre para guardar
@@ -76,69 +320,43 @@ def predict_model(
     loggers = logging.getLogger(lognames)
 
     loggers.info("COMIENZA el proceso de predicción")
-    fited_model = artifacts["model"]
-    ic_class_predict = artifacts["ic_class"]
+    if ejecuta_cuervo:
+        loggers.info("Se evalúan en una sola pasada los modelos TOC_COE y TOC_Cuervo.")
+    salida_coe, salida_cuervo = evaluar_modelos(
+        artifacts,
+        data,
+        objetivo=objetivo,
+        columnas_coe=columnas_coe,
+        columnas_cuervo=columnas_cuervo,
+        ejecuta_cuervo=ejecuta_cuervo,
+        chunk_size=chunk_size,
+        n_jobs=n_jobs,
+    )
+    resultados = [("TOC_COE", salida_coe), ("TOC_Cuervo", salida_cuervo)]
+    if modelos_minerales:
+        minerales = evaluar_minerales(
+            modelos_minerales, data, features_minerales, chunk_size=chunk_size, n_jobs=n_jobs
+        )
+        resultados += list(minerales.items())
 
-    # Prediccion
-    loggers.info("Ejecutando predicción del modelo TOC_COE...")
-    # El predictor no necesita DEPTH
-    pred_y = fited_model.predict(data.loc[:, data.columns != "DEPTH"])
+    # Las tablas xlsx se escriben en otro hilo, solapadas con los .las; al salir del with
+    # se espera a que terminen (el archivo no se comprime hasta entonces)
+    with salidas.EscritorSalidas(formatos, loggers) as escritor:
+        for modelo, columnas in resultados:
+            if columnas is None:
+                continue
 
-    loggers.info("Ejecutando predicción del intervalo de confianza (ic_class)...")
-    int_confianza = ic_class_predict.maronna_confidence_intervals(y_pred=pred_y, alpha=0.1)
-    int_confianza[int_confianza < 0] = 0
-
-    # Escribo la salida
-    archivo_xls = name + "_TOC_COE.xlsx"
-    path_salida_xls = output_dir.joinpath(archivo).joinpath(archivo_xls)
-    loggers.info("Escribiendo Excel de salida (XLSX) %s", archivo_xls)
-    df_result = pd.concat(
-        [
-            data,
-            pd.DataFrame(pred_y, columns=[objetivo + "_COE"]),
-            pd.DataFrame(
-                int_confianza[["IC_INF", "IC_SUP"]].values,
-                columns=[
-                    objetivo + "_COE_cota_inferior",
-                    objetivo + "_COE_cota_superior",
-                ],
-            ),
-        ],
-        axis=1,
-    )
+            # Escribo las tablas de salida
+            path_salida = output_dir.joinpath(archivo).joinpath(f"{name}_{modelo}")
+            loggers.info(
+                "Escribiendo tablas de salida (%s) %s", ", ".join(formatos), path_salida.name
+            )
+            escritor.escribir(pd.DataFrame(columnas, copy=False), path_salida)
 
-    df_result[df_result < 0] = -999.0000
-    df_result.to_excel(path_salida_xls, index=False)
+            # Escribo .las
+            archivo_las = f"{name}_{modelo}.las"
+            path_salida_las = output_dir.joinpath(archivo).joinpath(archivo_las)
+            loggers.info("Escribiendo perfil de salida (LAS) %s", archivo_las)
+            write_las_file(file_name=path_salida_las, well=well, data=columnas)
 
-    # Escribo .las
-    archivo_las = name + "_TOC_COE.las"
-    path_salida_las = output_dir.joinpath(archivo).joinpath(archivo_las)
-    loggers.info("Escribiendo perfil de salida (LAS) %s", archivo_las)
-    write_las_file(file_name=path_salida_las, well=well, data=df_result)
     loggers.info("FINALIZA proceso predicción")
-
-    # prediccion de cuervo
-    if ejecuta_cuervo:
-        loggers.info("COMIENZA el proceso de predicción del modelo TOC_Cuervo.")
-        loggers.info("Ejecutando predicción del modelo TOC_Cuervo...")
-        y_cuervo = cuervo_model(df_cuervo.dropna())
-        df_result = pd.concat(
-            [
-                df_cuervo,
-                pd.DataFrame(y_cuervo, columns=["TOC_Cuervo"]),
-            ],
-            axis=1,
-        )
-        # Escribo la salida excel
-        archivo_xls = name + "_TOC_Cuervo.xlsx"
-        path_salida_xls = output_dir.joinpath(archivo).joinpath(archivo_xls)
-        loggers.info("Escribiendo Excel de salida (XLSX) %s", archivo_xls)
-        df_result[df_result < 0] = 0
-        df_result.to_excel(path_salida_xls, index=False)
-
-        # Escribo salida .las
-        archivo_las = name + "_TOC_Cuervo.las"
-        path_salida_las = output_dir.joinpath(archivo).joinpath(archivo_las)
-        loggers.info("Escribiendo perfil de salida (LAS) %s", archivo_las)
-        write_las_file(file_name=path_salida_las, well=well, data=df_result)
-        loggers.info("FINALIZA proceso predicción del modelo TOC_Cuervo.")
@@ -0,0 +1,149 @@
+"""escritura de los resultados tabulares en los formatos de salida pedidos"""
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import pandas as pd
+
+from config.config import logger
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:  # pyarrow es opcional
+    pa = None
+
+
+def _escribir_parquet(df: pd.DataFrame, path: Path):
+    """Guarda el dataframe en formato Parquet (requiere pyarrow)"""
+
+    df.to_parquet(path, index=False)
+
+
+def _escribir_csv(df: pd.DataFrame, path: Path):
+    """Guarda el dataframe en CSV, con el escritor de pyarrow si está instalado"""
+
+    if pa is not None:
+        pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), str(path))
+    else:
+        df.to_csv(path, index=False)
+
+
+def _escribir_xlsx(df: pd.DataFrame, path: Path):
+    """Guarda el dataframe en Excel (openpyxl, lento para perfiles largos)"""
+
+    df.to_excel(path, index=False)
+
+
+# formato -> (extensión, función de escritura)
+ESCRITORES: Dict[str, Tuple[str, Callable[[pd.DataFrame, Path], None]]] = {
+    "parquet": (".parquet", _escribir_parquet),
+    "csv": (".csv", _escribir_csv),
+    "xlsx": (".xlsx", _escribir_xlsx),
+}
+
+# Formatos que se escriben en un hilo aparte, en paralelo con el resto de las salidas del
+# mismo archivo (siguen en su camino crítico: el archivo se comprime cuando terminan)
+FORMATOS_DIFERIDOS = ("xlsx",)
+
+
+def parsear_formatos(valor: str) -> List[str]:
+    """
+    Interpreta una lista de formatos separados por coma (ej.: "csv,xlsx")
+
+    Args:
+        valor (str): formatos pedidos
+
+    Returns:
+        List[str]: formatos válidos, sin repetidos y en el orden pedido
+    """
+
+    formatos = []
+    for formato in valor.split(","):
+        formato = formato.strip().lower()
+        if not formato:
+            continue
+        if formato not in ESCRITORES:
+            logger.warning("Formato de salida desconocido: %s (se ignora)", formato)
+        elif formato == "parquet" and pa is None:
+            logger.warning("El formato parquet requiere pyarrow (se ignora)")
+        elif formato not in formatos:
+            formatos.append(formato)
+
+    return formatos
+
+
+def _escribir(formato: str, df: pd.DataFrame, path: Path, loggers) -> Dict:
+    """
+    Escribe un formato y registra bytes y tiempo de escritura
+
+    Returns:
+        Dict: formato, archivo, bytes y duracion (s)
+    """
+
+    inicio = time.perf_counter()
+    ESCRITORES[formato][1](df, path)
+    duracion = time.perf_counter() - inicio
+    tamano = path.stat().st_size
+    loggers.info("Salida %s escrita: %s (%s bytes, %.2f s)", formato, path.name, tamano, duracion)
+
+    return {"formato": formato, "archivo": path.name, "bytes": tamano, "duracion": duracion}
+
+
+class EscritorSalidas:
+    """
+    Escribe los resultados en los formatos pedidos. Los formatos diferidos (xlsx) se
+    escriben en un hilo aparte, solapados con las demás tablas y los .las del archivo;
+    al salir del bloque `with` se espera a que terminen, así el directorio de salida
+    queda completo antes de comprimirlo. El archivo no se comprime ni se sube hasta
+    que termina el xlsx más lento.
+    """
+
+    def __init__(self, formatos: Sequence[str], loggers=logger):
+
+        self.formatos = list(formatos)
+        self.loggers = loggers
+        self.metricas: List[Dict] = []
+        self._executor = None
+        self._pendientes: List[Future] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def escribir(self, df: pd.DataFrame, path_base: Path):
+        """
+        Escribe el dataframe en cada formato. El dataframe no debe modificarse
+        después de esta llamada: los formatos diferidos lo leen desde otro hilo.
+
+        Args:
+            df (pd.DataFrame): resultados
+            path_base (Path): path de salida sin extensión
+        """
+
+        for formato in self.formatos:
+            path = path_base.with_name(path_base.name + ESCRITORES[formato][0])
+            if formato in FORMATOS_DIFERIDOS:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1)
+                self._pendientes.append(
+                    self._executor.submit(_escribir, formato, df, path, self.loggers)
+                )
+            else:
+                self.metricas.append(_escribir(formato, df, path, self.loggers))
+
+    def cerrar(self):
+        """Espera las escrituras diferidas (propaga el primer error)"""
+
+        try:
+            for pendiente in self._pendientes:
+                self.metricas.append(pendiente.result())
+        finally:
+            self._pendientes = []
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
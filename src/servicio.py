@@ -0,0 +1,171 @@
+"""servicio de predicción en proceso: artefactos precargados y cola de trabajos"""
+
+import io
+import json
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+import las_writer
+import predict as pred
+from config import config
+from config.config import logger
+from main import cargo_las, load_artifacts, load_modelos_minerales
+from src import batch
+from src import jobs
+
+# Formatos de respuesta de /predict -> tipo MIME
+FORMATOS_PREDICT = {
+    "json": "application/json",
+    "las": "text/plain",
+    "parquet": "application/octet-stream",
+}
+
+
+def predecir_perfil(
+    fp: Path, formato: str = "json", modelo: str = "TOC_COE"
+) -> Tuple[bytes, str]:
+    """
+    Predice un perfil en memoria con los artefactos ya cargados en el proceso, sin pasar
+    por el Blob Storage ni por las carpetas input/output.
+
+    Args:
+        fp (Path): path del archivo .las
+        formato (str, optional): "json" (todos los modelos), "las" o "parquet" (solo
+            el modelo pedido). Valor default es "json".
+        modelo (str, optional): resultado a devolver en "las" o "parquet" (TOC_COE,
+            TOC_Cuervo o un mineral). Valor default es "TOC_COE".
+
+    Raises:
+        ValueError: si el formato no existe, el perfil no se puede leer o no tiene las
+            curvas del modelo pedido
+
+    Returns:
+        Tuple[bytes, str]: contenido de la respuesta y tipo MIME
+    """
+
+    if formato not in FORMATOS_PREDICT:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    artifacts = load_artifacts()
+    data = cargo_las(fp, columnas=config.LAS_COLUMNAS)
+    if data.empty:
+        raise ValueError("El perfil no tiene filas con las curvas requeridas")
+    well = data["WELL"].iloc[0]
+    if not set(config.MODEL_TOC_GPR_DENSIDAD).issubset(set(data.columns)):
+        raise ValueError("No se encuentran las columnas requeridas para la predicción de TOC")
+
+    salida_coe, salida_cuervo = pred.evaluar_modelos(
+        artifacts,
+        data,
+        objetivo=config.OBJETIVO,
+        columnas_coe=config.MODEL_TOC_GPR_DENSIDAD,
+        columnas_cuervo=config.MODEL_TOC_CUERVO,
+        ejecuta_cuervo=set(config.MODEL_TOC_CUERVO).issubset(set(data.columns)),
+        chunk_size=config.PREDICT_CHUNK_SIZE,
+        n_jobs=config.PREDICT_N_JOBS,
+    )
+    resultados = {"TOC_COE": salida_coe, "TOC_Cuervo": salida_cuervo}
+    resultados.update(
+        pred.evaluar_minerales(
+            load_modelos_minerales(data.columns),
+            data,
+            config.MODEL_FEATURES,
+            chunk_size=config.PREDICT_CHUNK_SIZE,
+            n_jobs=config.PREDICT_N_JOBS,
+        )
+    )
+    resultados = {m: columnas for m, columnas in resultados.items() if columnas is not None}
+
+    if formato == "json":
+        contenido = {
+            "well": well,
+            "resultados": {
+                m: {c: valores.tolist() for c, valores in columnas.items()}
+                for m, columnas in resultados.items()
+            },
+        }
+        return json.dumps(contenido).encode("utf-8"), FORMATOS_PREDICT[formato]
+
+    if modelo not in resultados:
+        raise ValueError(f"El perfil no tiene resultados para el modelo {modelo}")
+
+    if formato == "las":
+        buffer = io.StringIO()
+        las_writer.write_las(buffer, resultados[modelo], well=well)
+        return buffer.getvalue().encode("utf-8"), FORMATOS_PREDICT[formato]
+
+    buffer = io.BytesIO()
+    pd.DataFrame(resultados[modelo], copy=False).to_parquet(buffer, index=False)
+    return buffer.getvalue(), FORMATOS_PREDICT[formato]
+
+
+class ServicioPrediccion:
+    """
+    Ejecuta los trabajos de la cola (src/jobs.py) dentro del proceso de la API. Los
+    artefactos se cargan una sola vez al iniciar. Un único hilo toma los trabajos: las
+    opciones de cada uno se aplican sobre config, que es global al proceso. Los archivos
+    se predicen de a uno: no se hace fork de la API, que tiene hilos de Flask con locks
+    (logging, SQLite) tomados. Para predecir en paralelo usar MODO_API=subproceso.
+    """
+
+    def __init__(self, intervalo: float = 5.0):
+
+        self.intervalo = intervalo
+        self.worker = jobs.nuevo_worker()
+        self._aviso = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        """Precarga los artefactos y arranca el hilo que atiende la cola"""
+
+        if self._hilo is not None:
+            return
+
+        inicio = time.perf_counter()
+        load_artifacts()
+        load_modelos_minerales(config.LAS_COLUMNAS)
+        logger.info("[servicio] Artefactos precargados en %.1f s", time.perf_counter() - inicio)
+
+        self._hilo = threading.Thread(
+            target=self._atender, name="servicio-prediccion", daemon=True
+        )
+        self._hilo.start()
+
+    def encolar(self, opciones: Optional[Dict[str, str]] = None) -> str:
+        """
+        Encola un lote
+
+        Args:
+            opciones (Optional[Dict[str, str]], optional): opciones de batch.OPCIONES para
+                este lote (las vacías se ignoran). Valor default es None.
+
+        Returns:
+            str: id del trabajo
+        """
+
+        opciones = {k: v for k, v in (opciones or {}).items() if k in batch.OPCIONES and v}
+        trabajo_id = jobs.crear(opciones)
+        logger.info("[servicio] Trabajo %s encolado (%s)", trabajo_id, opciones)
+        self._aviso.set()
+
+        return trabajo_id
+
+    def _atender(self):
+        """
+        Hilo que ejecuta los trabajos de la cola de a uno. Además del aviso de encolar,
+        consulta la cola cada `intervalo` segundos para tomar trabajos encolados por otros
+        procesos o con el lease vencido.
+        """
+
+        while True:
+            self._aviso.wait(self.intervalo)
+            self._aviso.clear()
+            try:
+                batch.atender_trabajos(self.worker, procesos=False)
+            except Exception:  # pylint: disable=broad-except
+                logger.error("[servicio] Error inesperado:\n%s", traceback.format_exc())